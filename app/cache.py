@@ -0,0 +1,347 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from app.constants import (
+    CACHE_MAX_BYTES,
+    CACHE_PATH,
+    CACHE_SIZE_SYNC_WRITES,
+    CACHE_STALE_SECONDS,
+    CACHE_TTL_SECONDS,
+    DATA_SOURCES,
+)
+from app.errors import CacheError
+from app.logger import create_logger
+
+logger = create_logger(__name__)
+
+CacheValueType = Union[bytes, dict, list]
+
+# value kinds stored in the cache
+KIND_BYTES = "bytes"  # raw CSV data from DICE, BioGPS
+KIND_JSON = "json"  # JSON data from The Human Protein Atlas, MyGene.info
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    source TEXT NOT NULL,
+    version TEXT NOT NULL,
+    query TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (source, version, query)
+);
+CREATE INDEX IF NOT EXISTS idx_results_accessed_at ON results (accessed_at);
+"""
+
+# columns added after the first release of the cache: (name, type)
+MIGRATION_COLUMNS = [("etag", "TEXT"), ("last_modified", "TEXT")]
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """
+    Cached value with HTTP validators (ETag, Last-Modified) of the response.
+
+    An expired entry is kept for `stale_seconds` after expiry to be revalidated
+    or served while revalidating (stale-while-revalidate).
+    """
+
+    value: "CacheValueType"
+    expires_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query for cache key: "  IL2RA  " -> "IL2RA" """
+    # note: DICE is case sensitive, so don't change case here
+    return " ".join(query.split())
+
+
+def get_source_version(source: str) -> str:
+    """Get version of data source from DATA_SOURCES (e.g. "v23.0")"""
+    for db in DATA_SOURCES:
+        if db.get("name") == source:
+            return db.get("version", "Unknown")
+
+    return "Unknown"
+
+
+def encode_value(value: CacheValueType) -> tuple[str, bytes]:
+    if isinstance(value, bytes):
+        return KIND_BYTES, zlib.compress(value)
+
+    data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return KIND_JSON, zlib.compress(data.encode("utf-8"))
+
+
+def decode_value(kind: str, value: bytes) -> CacheValueType:
+    data = zlib.decompress(value)
+    if kind == KIND_BYTES:
+        return data
+
+    return json.loads(data)
+
+
+class ResultCache:
+    """
+    Disk-backed cache of search results on SQLite.
+
+    - key: (data source, version of data source, normalized query)
+    - value: zlib-compressed raw CSV bytes or JSON
+    - entries expire after TTL and are kept for `stale_seconds` after expiry
+      to be revalidated, and the least recently used entries are evicted
+      when the total size exceeds max_bytes
+
+    SQLite in WAL mode allows several Streamlit worker processes on the same host
+    to share one cache file, so warm caches survive restarts and deploys.
+
+    The total size is tracked in process to avoid summing up sizes of all entries on every write,
+    and synced with the cache file when it exceeds max_bytes or every `sync_writes` writes.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        max_bytes: int = CACHE_MAX_BYTES,
+        stale_seconds: float = CACHE_STALE_SECONDS,
+        sync_writes: int = CACHE_SIZE_SYNC_WRITES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self.sync_writes = sync_writes
+
+        # total size of entries in the cache file, None until synced with the file
+        self._size_bytes: Optional[int] = None
+        self._writes = 0
+        self._size_lock = threading.Lock()
+
+        # sqlite3.Connection can't be shared between threads by default
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+
+        try:
+            dirname = os.path.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+        except (sqlite3.Error, OSError) as e:
+            # e.g. the directory is not writable, or a component of the path is a file
+            raise CacheError(f"Failed to open cache database {self.path}: {e}") from e
+
+        self._local.conn = conn
+
+        return conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+        for name, type_ in MIGRATION_COLUMNS:
+            if name not in columns:
+                conn.execute(f"ALTER TABLE results ADD COLUMN {name} {type_}")
+
+    def get(self, source: str, query: str) -> Optional[CacheValueType]:
+        """Get cached value, or None if not cached or expired."""
+
+        entry = self.get_entry(source, query)
+        if entry is None or not entry.fresh:
+            return None
+
+        return entry.value
+
+    def get_entry(self, source: str, query: str) -> Optional[CacheEntry]:
+        """Get cached entry including stale one, or None if not cached."""
+
+        key = (source, get_source_version(source), normalize_query(query))
+        now = time.time()
+
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT kind, value, expires_at, etag, last_modified FROM results WHERE source = ? AND version = ? AND query = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+
+            kind, value, expires_at, etag, last_modified = row
+            if expires_at + self.stale_seconds <= now:
+                conn.execute(
+                    "DELETE FROM results WHERE source = ? AND version = ? AND query = ?",
+                    key,
+                )
+                return None
+
+            try:
+                decoded = decode_value(kind, value)
+            except (zlib.error, ValueError) as e:
+                # corrupt entry: remove it and treat as not cached
+                logger.warning(f"removed corrupt cache of {key}: {e}")
+                conn.execute(
+                    "DELETE FROM results WHERE source = ? AND version = ? AND query = ?",
+                    key,
+                )
+                return None
+
+            conn.execute(
+                "UPDATE results SET accessed_at = ? WHERE source = ? AND version = ? AND query = ?",
+                (now, *key),
+            )
+        except sqlite3.Error as e:
+            raise CacheError(f"Failed to get cache of {key}: {e}") from e
+
+        return CacheEntry(decoded, expires_at, etag, last_modified)
+
+    def set(
+        self,
+        source: str,
+        query: str,
+        value: CacheValueType,
+        ttl_seconds: Optional[float] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        """
+        Store value with HTTP validators of the response if any,
+        and evict least recently used entries if the cache is full.
+        """
+
+        key = (source, get_source_version(source), normalize_query(query))
+        kind, encoded = encode_value(value)
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+
+        try:
+            conn = self._connect()
+            old = conn.execute(
+                "SELECT size FROM results WHERE source = ? AND version = ? AND query = ?",
+                key,
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(source, version, query, kind, value, size, created_at, expires_at, accessed_at, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    *key,
+                    kind,
+                    encoded,
+                    len(encoded),
+                    now,
+                    expires_at,
+                    now,
+                    etag,
+                    last_modified,
+                ),
+            )
+            self._track_size(conn, len(encoded) - (old[0] if old else 0))
+        except sqlite3.Error as e:
+            raise CacheError(f"Failed to set cache of {key}: {e}") from e
+
+    def touch(self, source: str, query: str, ttl_seconds: Optional[float] = None):
+        """Extend the expiry of the entry, e.g. when the response is not modified (HTTP 304)."""
+
+        key = (source, get_source_version(source), normalize_query(query))
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+
+        try:
+            self._connect().execute(
+                "UPDATE results SET expires_at = ?, accessed_at = ? WHERE source = ? AND version = ? AND query = ?",
+                (expires_at, now, *key),
+            )
+        except sqlite3.Error as e:
+            raise CacheError(f"Failed to touch cache of {key}: {e}") from e
+
+    def _track_size(self, conn: sqlite3.Connection, delta: int):
+        """add size of a write to the total, and evict entries if the cache may be full"""
+
+        with self._size_lock:
+            self._writes += 1
+            if self._size_bytes is not None:
+                self._size_bytes += delta
+                if (
+                    self._size_bytes <= self.max_bytes
+                    and self._writes % self.sync_writes != 0
+                ):
+                    return
+
+            self._size_bytes = self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        """evict entries if the cache is full, and return the total size after eviction"""
+
+        # remove entries stale for too long first, then least recently used ones
+        conn.execute(
+            "DELETE FROM results WHERE expires_at + ? <= ?",
+            (self.stale_seconds, time.time()),
+        )
+
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()
+        if total <= self.max_bytes:
+            return total
+
+        rows = conn.execute(
+            "SELECT rowid, size FROM results ORDER BY accessed_at ASC"
+        ).fetchall()
+        rowids = []
+        for rowid, size in rows:
+            if total <= self.max_bytes:
+                break
+            rowids.append((rowid,))
+            total -= size
+
+        conn.executemany("DELETE FROM results WHERE rowid = ?", rowids)
+        logger.info(f"evicted {len(rowids)} entries from cache {self.path}")
+
+        return total
+
+    def clear(self):
+        try:
+            self._connect().execute("DELETE FROM results")
+        except sqlite3.Error as e:
+            raise CacheError(f"Failed to clear cache: {e}") from e
+
+        with self._size_lock:
+            self._size_bytes = 0
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache:
+    """Return the process-wide ResultCache."""
+
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+
+        return _cache
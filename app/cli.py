@@ -0,0 +1,140 @@
+"""
+Headless CLI to search a gene panel and write tidy long-format expression tables.
+
+Usage:
+    gene-searcher genes.txt -o expression.parquet
+    gene-searcher genes.txt -o expression.arrow --format arrow --biogps-datasets GSE1133
+
+note: this module must not import Streamlit so that it can run in batch jobs.
+"""
+
+import argparse
+import sys
+import time
+from typing import Optional
+
+from app.errors import ExportError
+from app.export import (
+    EXPORT_FORMAT_PARQUET,
+    EXPORT_FORMATS,
+    ChunkedTableWriter,
+    tidy_batch_result,
+)
+from app.logger import create_logger
+from app.search.batch import search_batch_sync
+from app.search.biogps import BIOGPS_SUPPORT_DATASETS
+
+logger = create_logger(__name__)
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def read_genes(path: str) -> list[str]:
+    """read gene symbols separated by newlines, commas or whitespaces ("#" starts a comment)"""
+
+    genes = []
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            genes.extend(line.replace(",", " ").split())
+
+    return genes
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="gene-searcher",
+        description="Search genes on target databases and write tidy long-format expression tables (gene, source, dataset, probeset, tissue, value).",
+    )
+    parser.add_argument(
+        "genes", help='file of gene symbols (one per line, "-" for stdin)'
+    )
+    parser.add_argument("-o", "--output", required=True, help="output file path")
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=EXPORT_FORMATS,
+        default=EXPORT_FORMAT_PARQUET,
+        help="output file format (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--biogps-datasets",
+        nargs="*",
+        default=None,
+        metavar="DATASET_ID",
+        help="BioGPS dataset IDs to fetch (default: all of "
+        + ", ".join(d["dataset_id"] for d in BIOGPS_SUPPORT_DATASETS)
+        + ")",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="number of rows per written chunk (default: %(default)s)",
+    )
+
+    return parser.parse_args(argv)
+
+
+def run(
+    genes: list[str],
+    output: str,
+    fmt: str = EXPORT_FORMAT_PARQUET,
+    biogps_dataset_ids: Optional[list[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """search genes and write results to output, return the number of failed (gene, source) pairs"""
+
+    start = time.time()
+    num_results = 0
+    num_errors = 0
+
+    with ChunkedTableWriter(output, fmt, chunk_size) as writer:
+        for result in search_batch_sync(genes, biogps_dataset_ids):
+            num_results += 1
+
+            if not result.ok:
+                num_errors += 1
+                logger.error(
+                    f"failed to search {result.source} by gene '{result.gene}': {result.error}"
+                )
+                continue
+
+            try:
+                writer.write(tidy_batch_result(result))
+            except Exception as e:
+                num_errors += 1
+                logger.error(
+                    f"failed to convert data from {result.source} of gene '{result.gene}': {e}"
+                )
+
+    logger.info(
+        f"wrote {writer.num_rows} rows of {len(genes)} genes to {output} "
+        f"({num_results} results, {num_errors} errors, takes {time.time() - start:.2f} sec)"
+    )
+
+    return num_errors
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+
+    genes = read_genes(args.genes)
+    if len(genes) == 0:
+        logger.error(f"no genes found in {args.genes}")
+        return 2
+
+    try:
+        num_errors = run(
+            genes, args.output, args.format, args.biogps_datasets, args.chunk_size
+        )
+    except ExportError as e:
+        logger.error(str(e))
+        return 2
+
+    return 1 if num_errors > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,47 +1,825 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import contextvars
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from collections.abc import AsyncIterator, Coroutine, Iterator
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional, TypeVar, Union
+from urllib.parse import urlsplit
+
 import aiohttp
 
-from app.errors import FetchClientError, FetchClientResponseError, FetchUnexpectedError
+from app import metrics
+from app.constants import (
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+    ADAPTIVE_TIMEOUT_MIN_SECONDS,
+    ADAPTIVE_TIMEOUT_P99_MULTIPLIER,
+    CIRCUIT_BREAKERS,
+    HEDGE_MIN_DELAY_SECONDS,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_SOURCES,
+    RETRY_POLICIES,
+    RETRY_STATUSES,
+)
+from app.errors import (
+    FetchClientError,
+    FetchClientResponseError,
+    FetchUnexpectedError,
+    NotModifiedError,
+    SourceUnavailableError,
+)
 from app.logger import create_logger
+from app.ratelimit import HostLimiter, get_host_limiter
 
 logger = create_logger(__name__)
 
+T = TypeVar("T")
+F = TypeVar("F", bound=Union[asyncio.Future, concurrent.futures.Future])
+
 DEFAULT_HEADERS = {
     "Content-Type": "application/json",
 }
 DEFAULT_TIMEOUT_SECONDS = 30
 
+# for connection pool shared by all searches in the process
+CONNECTOR_LIMIT = 100
+CONNECTOR_LIMIT_PER_HOST = 10
+CONNECTOR_DNS_CACHE_TTL_SECONDS = 300
+CONNECTOR_KEEPALIVE_TIMEOUT_SECONDS = 60
 
-async def fetch(
+# interval to call `on_wait` while waiting for the background event loop (see `iterate_sync`)
+WAIT_POLL_INTERVAL_SECONDS = 0.2
+
+# errors of a request which may succeed on retry (connection reset, timeout, etc.)
+RETRYABLE_EXCEPTIONS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+# conditional request of the running search (see `conditional_request`)
+_conditional_request: contextvars.ContextVar[
+    Optional["ConditionalRequest"]
+] = contextvars.ContextVar("conditional_request", default=None)
+
+# circuit breakers of data sources: source -> breaker
+_circuit_breakers: dict[str, "CircuitBreaker"] = {}
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+# ClientSession is bound to the event loop it was created on, so keep one per loop
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide event loop running forever on a background daemon thread.
+
+    Streamlit runs each script rerun on its own thread, so creating an event loop per
+    search leaks loops and throws away every pooled connection. All searches are
+    submitted to this loop instead (see `run_sync`).
+    """
+
+    global _loop
+
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="gene-searcher-event-loop", daemon=True
+            )
+            thread.start()
+            _loop = loop
+            logger.info("started background event loop for searches")
+
+        return _loop
+
+
+def _cancel_future(future: Union[asyncio.Future, concurrent.futures.Future]):
+    if isinstance(future, asyncio.Future):
+        # asyncio futures are not thread-safe
+        future.get_loop().call_soon_threadsafe(future.cancel)
+    else:
+        future.cancel()
+
+
+class CancelToken:
+    """
+    Token to cancel work submitted to the background event loop,
+    e.g. all searches started by a Streamlit session (kept in session state).
+
+    `cancel` is thread-safe. It cancels all bound futures which are not done yet,
+    and futures bound after that are cancelled immediately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._futures: set[Union[asyncio.Future, concurrent.futures.Future]] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def bind(self, future: F) -> F:
+        """
+        Cancel the future when the token is cancelled: a concurrent.futures.Future,
+        or an asyncio future (task) bound on the thread of its event loop.
+        """
+
+        with self._lock:
+            cancelled = self._cancelled
+            if not cancelled:
+                self._futures.add(future)
+
+        if cancelled:
+            _cancel_future(future)
+        else:
+            future.add_done_callback(self._discard)
+
+        return future
+
+    def _discard(self, future: Union[asyncio.Future, concurrent.futures.Future]):
+        with self._lock:
+            self._futures.discard(future)
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            futures = list(self._futures)
+            self._futures.clear()
+
+        if futures:
+            logger.info(f"cancel {len(futures)} in-flight tasks")
+        for future in futures:
+            _cancel_future(future)
+
+
+def _wait(
+    future: concurrent.futures.Future,
+    on_wait: Optional[Callable[[], None]],
+    poll_interval: float,
+) -> Any:
+    if on_wait is not None:
+        while not concurrent.futures.wait([future], timeout=poll_interval).done:
+            on_wait()
+
+    return future.result()
+
+
+def run_sync(
+    coro: Coroutine[Any, Any, T],
+    timeout: Optional[float] = None,
+    token: Optional[CancelToken] = None,
+) -> T:
+    """
+    Run a coroutine on the background event loop and block until it returns.
+
+    If the token is cancelled, the coroutine is cancelled and
+    `concurrent.futures.CancelledError` is raised.
+    """
+
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    if token is not None:
+        token.bind(future)
+
+    return future.result(timeout)
+
+
+def iterate_sync(
+    agen: AsyncIterator[T],
+    token: Optional[CancelToken] = None,
+    on_wait: Optional[Callable[[], None]] = None,
+    poll_interval: float = WAIT_POLL_INTERVAL_SECONDS,
+) -> Iterator[T]:
+    """
+    Iterate an async iterator on the background event loop from sync code.
+
+    If the caller stops iteration early (e.g. Streamlit stops the script run),
+    the async iterator is closed on the background event loop.
+    If the token is cancelled, the pending step is cancelled and iteration ends.
+
+    While waiting for the next item, `on_wait` is called every `poll_interval` seconds.
+    An exception raised by `on_wait` stops iteration, e.g. Streamlit raises an exception
+    on any `st` call once the script run is superseded by a new run or the session ends,
+    which would otherwise wait until the next item returns.
+    """
+
+    step: dict[str, asyncio.Task] = {}
+
+    async def _anext() -> T:
+        step["task"] = asyncio.current_task()
+        return await agen.__anext__()
+
+    async def _aclose():
+        # async generator cannot be closed while its step is running,
+        # so wait until the step cancelled by the token or the caller finishes
+        task = step.get("task")
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.wait([task])
+
+        aclose = getattr(agen, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    try:
+        while True:
+            future = asyncio.run_coroutine_threadsafe(_anext(), get_event_loop())
+            if token is not None:
+                token.bind(future)
+
+            try:
+                yield _wait(future, on_wait, poll_interval)
+            except StopAsyncIteration:
+                return
+            except concurrent.futures.CancelledError:
+                logger.info("iteration is cancelled")
+                return
+    finally:
+        run_sync(_aclose())
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Create ClientSession with a keep-alive connection pool and DNS cache."""
+
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTOR_LIMIT,
+        limit_per_host=CONNECTOR_LIMIT_PER_HOST,
+        ttl_dns_cache=CONNECTOR_DNS_CACHE_TTL_SECONDS,
+        keepalive_timeout=CONNECTOR_KEEPALIVE_TIMEOUT_SECONDS,
+    )
+
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the pooled ClientSession of the running event loop, creating it on first use."""
+
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = create_session()
+        _sessions[loop] = session
+
+    return session
+
+
+async def close_session():
+    """Close the pooled ClientSession of the running event loop if any."""
+
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+@atexit.register
+def _shutdown_event_loop():
+    if _loop is None or _loop.is_closed() or not _loop.is_running():
+        return
+
+    try:
+        run_sync(close_session(), timeout=5)
+    except Exception as e:
+        logger.error(f"Error on shutdown: failed to close pooled session: {e}")
+    finally:
+        _loop.call_soon_threadsafe(_loop.stop)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Retry policy of requests to a data source.
+
+    - a request is retried on connection errors, timeouts and `retry_statuses`
+      up to `max_attempts` attempts in total
+    - the delay before a retry is `Retry-After` of the response if any, or
+      exponential backoff with full jitter: uniform(0, min(max, base * 2 ** (attempt - 1)))
+    - no retry is made if the next attempt would start after `deadline_seconds`
+      from the first attempt
+    """
+
+    max_attempts: int = 1
+    backoff_base_seconds: float = 0.5
+    backoff_max_seconds: float = 8.0
+    retry_statuses: frozenset[int] = frozenset(RETRY_STATUSES)
+    deadline_seconds: float = 60.0
+
+    def backoff(self, attempt: int) -> float:
+        """delay [sec] before the next attempt after `attempt`-th attempt failed"""
+
+        cap = min(
+            self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempt - 1)
+        )
+        return random.uniform(0, cap)
+
+
+def get_retry_policy(source: Optional[str] = None) -> RetryPolicy:
+    """Retry policy of the data source (no retry if the source is unknown)"""
+
+    return RetryPolicy(**RETRY_POLICIES.get(source, {}))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse `Retry-After` header (seconds or HTTP date) into delay [sec]"""
+
+    if value is None:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a data source.
+
+    - closed: requests are sent, and the breaker opens when `error_rate` of the recent
+      `window_size` requests (at least `min_requests`) fail
+    - open: requests fail fast with SourceUnavailableError for `open_seconds`
+    - half-open: up to `half_open_probes` probe requests are sent, and the breaker
+      closes if a probe succeeds or opens again if it fails
+
+    A request fails on connection errors, timeouts and retryable statuses (e.g. 503).
+    Other responses such as 404 mean that the data source is alive.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        source: str,
+        window_size: int = 20,
+        min_requests: int = 5,
+        error_rate: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        self.source = source
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = self.CLOSED
+        self.outcomes: deque[bool] = deque(maxlen=window_size)  # True if succeeded
+        self.opened_at = 0.0
+        self.probes = 0
+        self.half_opened = (
+            0  # number of transitions to half-open, to tell probes of each one
+        )
+
+    def before_request(self) -> Optional[int]:
+        """
+        raise SourceUnavailableError if a request must not be sent now,
+        and return the probe ID to pass to `record` if the request is a probe of half-open state
+        """
+
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.open_seconds:
+                raise SourceUnavailableError(self.source, self.open_seconds - elapsed)
+
+            logger.info(f"circuit breaker of {self.source} is half-open")
+            self.state = self.HALF_OPEN
+            self.probes = 0
+            self.half_opened += 1
+
+        if self.state == self.HALF_OPEN:
+            if self.probes >= self.half_open_probes:
+                raise SourceUnavailableError(self.source, 0)
+
+            self.probes += 1
+            return self.half_opened
+
+        return None
+
+    def record(self, ok: Optional[bool], probe: Optional[int] = None):
+        """
+        record the outcome of a request (None if the request had no outcome, e.g. cancelled)
+        with the probe ID returned by `before_request`
+        """
+
+        if self.state == self.HALF_OPEN:
+            if ok is None:
+                # free the probe slot only for probes of the current half-open state,
+                # not for requests sent before it
+                if probe is not None and probe == self.half_opened:
+                    self.probes = max(self.probes - 1, 0)
+            elif ok:
+                logger.info(f"circuit breaker of {self.source} is closed")
+                self.state = self.CLOSED
+                self.outcomes.clear()
+            else:
+                self._open()
+            return
+
+        if ok is None:
+            return
+
+        self.outcomes.append(ok)
+        failures = self.outcomes.count(False)
+        if (
+            self.state == self.CLOSED
+            and len(self.outcomes) >= self.min_requests
+            and failures / len(self.outcomes) >= self.error_rate
+        ):
+            self._open()
+
+    def _open(self):
+        logger.warning(
+            f"circuit breaker of {self.source} is open for {self.open_seconds} sec"
+        )
+        metrics.increment(f"circuit_open:{self.source}")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+
+
+def get_circuit_breaker(source: Optional[str]) -> Optional[CircuitBreaker]:
+    """Return the process-wide circuit breaker of the data source, or None if it has none"""
+
+    config = CIRCUIT_BREAKERS.get(source)
+    if config is None:
+        return None
+
+    breaker = _circuit_breakers.get(source)
+    if breaker is None:
+        breaker = _circuit_breakers[source] = CircuitBreaker(source, **config)
+
+    return breaker
+
+
+@dataclass
+class ConditionalRequest:
+    """
+    HTTP validators of the cached response to revalidate (`etag`, `last_modified`),
+    and validators of the new response set by `fetch` (`response_etag`, `response_last_modified`).
+    """
+
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    response_etag: Optional[str] = None
+    response_last_modified: Optional[str] = None
+
+    def headers(self) -> dict:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+
+        return headers
+
+
+@contextlib.contextmanager
+def conditional_request(
+    etag: Optional[str] = None, last_modified: Optional[str] = None
+) -> Iterator[ConditionalRequest]:
+    """
+    Make GET requests by `fetch` in this context conditional, and collect validators of responses.
+
+    The search adapters don't need to know about it: `fetch` sends `If-None-Match` and
+    `If-Modified-Since` with the validators, and raises NotModifiedError on HTTP 304.
+
+    Usage:
+        with conditional_request(entry.etag, entry.last_modified) as cond:
+            try:
+                _, res = await search_dice(session, query)
+            except NotModifiedError:
+                ...  # use the cached response
+        cache.set(..., etag=cond.response_etag, last_modified=cond.response_last_modified)
+    """
+
+    cond = ConditionalRequest(etag, last_modified)
+    token = _conditional_request.set(cond)
+    try:
+        yield cond
+    finally:
+        _conditional_request.reset(token)
+
+
+def get_latency_histogram(url: str) -> metrics.LatencyHistogram:
+    """latency histogram of the host of the URL"""
+    return metrics.get_histogram(f"latency:{urlsplit(url).netloc}")
+
+
+def get_adaptive_timeout(url: str, timeout_seconds: float) -> float:
+    """
+    Timeout [sec] of a request to the host derived from observed p99 latency,
+    or `timeout_seconds` if there are not enough samples.
+    """
+
+    histogram = get_latency_histogram(url)
+    p99 = histogram.quantile(0.99)
+    if histogram.samples < ADAPTIVE_TIMEOUT_MIN_SAMPLES or p99 is None:
+        return timeout_seconds
+
+    timeout = max(p99 * ADAPTIVE_TIMEOUT_P99_MULTIPLIER, ADAPTIVE_TIMEOUT_MIN_SECONDS)
+    return min(timeout, timeout_seconds)
+
+
+def get_hedge_delay(url: str) -> Optional[float]:
+    """delay [sec] before a hedged request to the host (p95 latency), or None if unknown"""
+
+    histogram = get_latency_histogram(url)
+    p95 = histogram.quantile(0.95)
+    if histogram.samples < HEDGE_MIN_SAMPLES or p95 is None:
+        return None
+
+    return max(p95, HEDGE_MIN_DELAY_SECONDS)
+
+
+async def _request(
     session: aiohttp.ClientSession,
+    method: str,
     url: str,
-    params: dict = None,
-    headers: dict = None,
-    timeout_seconds: int = DEFAULT_TIMEOUT_SECONDS,
+    limiter: Optional[HostLimiter] = None,
+    admitted: Optional[asyncio.Event] = None,
+    **kwargs,
 ) -> aiohttp.ClientResponse:
-    # setup HTTP headers
-    headers = {**DEFAULT_HEADERS, **(headers or {})}
+    """
+    Send a request within the rate limit of the host, and record latency until
+    response headers are received (excluding wait for the rate limit).
+    `admitted` is set when the request is admitted by the rate limit.
 
-    # fetch data
+    The slot of the limiter is held until the body of the response is read or
+    the response is released, so that the cap of in-flight requests also limits
+    concurrent transfers of large bodies.
+    """
+
+    if limiter is not None:
+        await limiter.acquire()
+    if admitted is not None:
+        admitted.set()
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
     try:
-        res = await session.get(
-            url, params=params, headers=headers, timeout=timeout_seconds
-        )
-        res.raise_for_status()  # raise error if status is not 200-299
-        logger.info(f"fetch data successfully from {res.url}")
+        res = await session.request(method, url, **kwargs)
+    except BaseException:
+        if limiter is not None:
+            limiter.release()
+        raise
+    get_latency_histogram(url).observe(loop.time() - start)
+
+    if limiter is not None:
+        _call_on_release(res, limiter.release)
+
+    return res
+
+
+def _call_on_release(res: aiohttp.ClientResponse, callback: Callable[[], None]):
+    """call back when the connection of the response returns to the pool or is closed"""
+
+    if res.connection is None:
+        # the body has been read already (or the response has no body)
+        callback()
+    else:
+        res.connection.add_callback(callback)
+
+
+async def _request_hedged(
+    session: aiohttp.ClientSession,
+    method: str,
+    url: str,
+    hedge_delay: float,
+    **kwargs,
+) -> aiohttp.ClientResponse:
+    """
+    Send a request, and send the same request again if the first doesn't answer within
+    `hedge_delay` after it's admitted by the rate limit (waiting in the queue of the rate limit
+    doesn't count, not to double requests while the host is throttled).
+    The first successful response is returned and the other is cancelled.
+    """
+
+    admitted = asyncio.Event()
+    first = asyncio.ensure_future(
+        _request(session, method, url, admitted=admitted, **kwargs)
+    )
+    waiting = asyncio.ensure_future(admitted.wait())
+    try:
+        await asyncio.wait({first, waiting}, return_when=asyncio.FIRST_COMPLETED)
+        done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+    except asyncio.CancelledError:
+        first.cancel()
+        raise
+    finally:
+        waiting.cancel()
+    if done:
+        return first.result()
 
-        return res
-    except aiohttp.ClientResponseError as e:
+    logger.info(f"send hedged request to {url} after {hedge_delay:.2f} sec")
+    metrics.increment(f"hedged:{urlsplit(url).netloc}")
+    second = asyncio.ensure_future(_request(session, method, url, **kwargs))
+
+    pending = {first, second}
+    winner: Optional[asyncio.Future] = None
+    error: Optional[BaseException] = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                elif winner is None:
+                    winner = task
+                else:
+                    # both answered at the same time
+                    task.result().release()
+
+        if winner is None:
+            raise error
+
+        if winner is second:
+            metrics.increment(f"hedge_won:{urlsplit(url).netloc}")
+
+        return winner.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _wrap_fetch_error(url: str, e: Exception) -> Exception:
+    if isinstance(e, aiohttp.ClientResponseError):
         msg = f"Error on fetch: failed to fetch data from {url} with status {e.status} due to response error"
         logger.error(msg)
 
-        raise FetchClientResponseError(msg) from e
-    except aiohttp.ClientError as e:
+        return FetchClientResponseError(msg)
+
+    if isinstance(e, aiohttp.ClientError):
         msg = f"Error on fetch: failed to fetch data from {url} due to client error"
         logger.error(msg)
 
-        raise FetchClientError(msg) from e
-    except Exception as e:
-        msg = f"Error on fetch: failed to fetch data from {url} due to unexpected error"
+        return FetchClientError(msg)
+
+    if isinstance(e, asyncio.TimeoutError):
+        msg = f"Error on fetch: failed to fetch data from {url} due to timeout"
         logger.error(msg)
 
-        raise FetchUnexpectedError(msg) from e
+        return FetchClientError(msg)
+
+    msg = f"Error on fetch: failed to fetch data from {url} due to unexpected error"
+    logger.error(msg)
+
+    return FetchUnexpectedError(msg)
+
+
+@contextlib.contextmanager
+def reading_response(url: str) -> Iterator[None]:
+    """
+    Wrap errors on reading the body of a response returned by `fetch`
+    (e.g. timeout or disconnection) in FetchClientError.
+    """
+
+    try:
+        yield
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise _wrap_fetch_error(url, e) from e
+
+
+async def fetch(
+    session: aiohttp.ClientSession,
+    url: str,
+    params: dict = None,
+    headers: dict = None,
+    timeout_seconds: int = DEFAULT_TIMEOUT_SECONDS,
+    method: str = "GET",
+    data: dict = None,
+    source: Optional[str] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> aiohttp.ClientResponse:
+    """
+    Send a request and return the response with status 200-299.
+
+    Transient failures are retried with the retry policy of the data source
+    (see `RetryPolicy`), and the last failure is raised as
+    FetchClientResponseError, FetchClientError or FetchUnexpectedError.
+
+    Timeout of connecting and reading each chunk of an attempt is adapted to observed latency
+    of the host, while the whole attempt including the body read is bounded by `timeout_seconds`
+    and the deadline of the retry policy. Errors on reading the body after `fetch` returns
+    should be wrapped by `reading_response`. GET requests
+    to sources in `HEDGE_SOURCES` are hedged when slower than p95 latency of the host.
+    Requests to a host are rate-limited with `RATE_LIMITS` of the data source.
+
+    While the circuit breaker of the data source is open, SourceUnavailableError is raised
+    without sending a request.
+
+    In `conditional_request` context, GET requests are sent with the validators of the cached
+    response, and NotModifiedError is raised on HTTP 304.
+    """
+
+    # setup HTTP headers
+    headers = {**DEFAULT_HEADERS, **(headers or {})}
+    cond = _conditional_request.get() if method == "GET" else None
+    if cond is not None:
+        headers.update(cond.headers())
+
+    policy = retry_policy or get_retry_policy(source)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + policy.deadline_seconds
+
+    hedge = method == "GET" and source in HEDGE_SOURCES
+    limiter = get_host_limiter(source, urlsplit(url).netloc)
+    breaker = get_circuit_breaker(source)
+
+    attempt = 1
+    while True:
+        # latency is observed as time to headers, so the adaptive timeout applies to
+        # connecting and reading, while each attempt including the body read must finish by the deadline
+        adaptive_timeout = get_adaptive_timeout(url, timeout_seconds)
+        total_timeout = max(min(timeout_seconds, deadline - loop.time()), 0.001)
+        kwargs = {
+            "limiter": limiter,
+            "params": params,
+            "data": data,
+            "headers": headers,
+            "timeout": aiohttp.ClientTimeout(
+                total=total_timeout,
+                sock_connect=adaptive_timeout,
+                sock_read=adaptive_timeout,
+            ),
+        }
+        hedge_delay = get_hedge_delay(url) if hedge else None
+
+        # fail fast while the data source is down
+        probe = None
+        if breaker is not None:
+            probe = breaker.before_request()
+
+        # fetch data
+        try:
+            if hedge_delay is None:
+                res = await _request(session, method, url, **kwargs)
+            else:
+                res = await _request_hedged(session, method, url, hedge_delay, **kwargs)
+        except RETRYABLE_EXCEPTIONS as e:
+            if breaker is not None:
+                breaker.record(False, probe)
+
+            delay = policy.backoff(attempt)
+            if attempt >= policy.max_attempts or loop.time() + delay >= deadline:
+                raise _wrap_fetch_error(url, e) from e
+
+            reason = type(e).__name__
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.record(None, probe)
+            raise
+        except Exception as e:
+            if breaker is not None:
+                breaker.record(None, probe)
+
+            raise _wrap_fetch_error(url, e) from e
+        else:
+            if breaker is not None:
+                breaker.record(res.status not in policy.retry_statuses, probe)
+
+            delay = None
+            if res.status in policy.retry_statuses and attempt < policy.max_attempts:
+                delay = parse_retry_after(res.headers.get("Retry-After"))
+                if delay is None:
+                    delay = policy.backoff(attempt)
+
+            if res.status == 304 and cond is not None:
+                res.release()
+                logger.info(f"not modified: {res.url}")
+                raise NotModifiedError(f"Not modified: {url}")
+
+            if delay is None or loop.time() + delay >= deadline:
+                try:
+                    res.raise_for_status()  # raise error if status is not 200-299
+                except Exception as e:
+                    raise _wrap_fetch_error(url, e) from e
+
+                logger.info(f"fetch data successfully from {res.url}")
+                if cond is not None:
+                    cond.response_etag = res.headers.get("ETag")
+                    cond.response_last_modified = res.headers.get("Last-Modified")
+
+                return res
+
+            # 読み込まないレスポンスは接続をプールに返却する
+            res.release()
+            reason = f"status {res.status}"
+
+        logger.warning(
+            f"retry fetch {url} after {delay:.2f} sec due to {reason} (attempt {attempt}/{policy.max_attempts})"
+        )
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -1,5 +1,8 @@
+import time
+
 import streamlit as st
 
+from app.client import CancelToken
 from app.components.tabs import (
     tab_search_result_antibody,
     tab_search_result_rna,
@@ -9,7 +12,7 @@ from app.constants import (
     TAB_NAME_RNA_EXPRESSION_DATA,
 )
 from app.logger import create_logger
-from app.search.search import search
+from app.search.search import search_stream
 
 logger = create_logger(__name__)
 
@@ -19,6 +22,10 @@ def session_state_init():
         st.session_state["result"] = None
         st.session_state["diff"] = None
 
+    # cancellation token of searches started by the session
+    if "search_token" not in st.session_state:
+        st.session_state["search_token"] = None
+
 
 def header():
     st.header("# Gene Searcher")
@@ -54,10 +61,14 @@ def input_query() -> tuple:
         return is_button_clicked, "", None, None
 
     if is_button_clicked:
-        with st.spinner("Searching..."):
-            result, diff = search(query)
-            st.session_state["result"] = result
-            st.session_state["diff"] = diff
+        # cancel searches (and prefetches) of the previous query superseded by this one
+        if st.session_state["search_token"] is not None:
+            st.session_state["search_token"].cancel()
+        st.session_state["search_token"] = CancelToken()
+
+        # results are filled progressively by stream_search_result
+        st.session_state["result"] = {}
+        st.session_state["diff"] = None
 
     return (
         is_button_clicked,
@@ -67,15 +78,18 @@ def input_query() -> tuple:
     )
 
 
-def search_result(is_button_clicked: bool, query: str, result: dict, diff: float):
+def search_result(
+    is_button_clicked: bool, query: str, result: dict, diff: float
+) -> tuple:
     if is_button_clicked and query == "":
         st.warning("Please input query!", icon="⚠️")
 
     st.markdown("## Search Results from Databases")
 
     # 検索にかかった時間
+    diff_slot = st.empty()
     if diff is not None:
-        st.markdown(f"search takes {diff:.2f} seconds")
+        diff_slot.markdown(f"search takes {diff:.2f} seconds")
 
     # create tabs
     tab_list = [
@@ -84,13 +98,57 @@ def search_result(is_button_clicked: bool, query: str, result: dict, diff: float
     ]
     tab_rna, tab_antibody = st.tabs(tab_list)
 
+    # 検索中はまだ結果が返ってきていないデータソースにプレースホルダを表示する
+    is_searching = is_button_clicked and query != ""
+    panels = {}
+
     # RNA Expression Data
     with tab_rna:
-        tab_search_result_rna(TAB_NAME_RNA_EXPRESSION_DATA, query, result)
+        panels.update(
+            tab_search_result_rna(
+                TAB_NAME_RNA_EXPRESSION_DATA, query, result, is_searching
+            )
+        )
 
     # Antibody List
     with tab_antibody:
-        tab_search_result_antibody(TAB_NAME_ANTIBODY_LIST, query, result)
+        panels.update(
+            tab_search_result_antibody(
+                TAB_NAME_ANTIBODY_LIST, query, result, is_searching
+            )
+        )
+
+    return diff_slot, panels
+
+
+def stream_search_result(query: str, result: dict, diff_slot, panels: dict):
+    """
+    render the panel of each data source as soon as its search result lands
+
+    While waiting for results, elapsed time is shown in `diff_slot`. Updating it lets
+    Streamlit stop this script run (and the search) as soon as a new query supersedes it
+    or the session ends, instead of after the next result lands.
+    """
+
+    start = time.time()
+    token: CancelToken = st.session_state["search_token"]
+
+    def on_wait():
+        diff_slot.markdown(f"searching... {time.time() - start:.1f} seconds")
+
+    for db_name, res in search_stream(query, token=token, on_wait=on_wait):
+        result[db_name] = res
+
+        render = panels.get(db_name)
+        if render is not None:
+            render()
+
+    if token.cancelled:
+        return
+
+    diff = time.time() - start
+    st.session_state["diff"] = diff
+    diff_slot.markdown(f"search takes {diff:.2f} seconds")
 
 
 def contents():
@@ -103,4 +161,8 @@ def contents():
     is_button_clicked, query, result, diff = input_query()
 
     # search results
-    search_result(is_button_clicked, query, result, diff)
+    diff_slot, panels = search_result(is_button_clicked, query, result, diff)
+
+    # search by query and render results progressively
+    if is_button_clicked and query != "":
+        stream_search_result(query, result, diff_slot, panels)
@@ -0,0 +1,52 @@
+from typing import Callable
+
+import streamlit as st
+
+from app.errors import SourceUnavailableError
+
+PanelType = Callable[[str, dict], None]
+RenderPanelType = Callable[[], None]
+
+
+def panel_slot(
+    panel: PanelType, source: str, query: str, result: dict, is_searching: bool
+) -> RenderPanelType:
+    """
+    Reserve a slot for a data source panel and render it.
+
+    While searching, the slot shows a placeholder until the result of the data source lands.
+    Call the returned function to render the panel again after `result[source]` is set.
+
+    Panels are fragments (`st.fragment`), so interacting with widgets of a panel reruns
+    only the panel with the same `query` and `result` (kept in session state).
+    """
+
+    slot = st.empty()
+
+    def render():
+        if is_searching and source not in result:
+            slot.info(f"Searching {source}...", icon="⏳")
+            return
+
+        with slot.container():
+            panel(query, result)
+
+    render()
+
+    return render
+
+
+def search_error(query: str, error: Exception):
+    """
+    Show an error of search: a data source which is temporarily unavailable
+    (its circuit breaker is open) is shown as a warning instead of an error.
+    """
+
+    if isinstance(error, SourceUnavailableError):
+        st.warning(
+            f"{error.source} is temporarily unavailable. Please search again later.\n\n{error}",
+            icon="⏸️",
+        )
+        return
+
+    st.error(f"Error on search: `{query}`\n\n{error}", icon="🚨")
@@ -1,5 +1,6 @@
 import streamlit as st
 
+from app.components.tabs.panel import RenderPanelType, panel_slot
 from app.constants import (
     DATA_SOURCE_NAME_BENCHSCI,
     MESSAGE_BEFORE_SEARCH,
@@ -9,6 +10,7 @@ from app.logger import create_logger
 logger = create_logger(__name__)
 
 
+@st.fragment
 def tab_innser_benchsci(query: str, result: dict):
     st.markdown(f"#### {DATA_SOURCE_NAME_BENCHSCI}")
     data_benchsci = result.get(DATA_SOURCE_NAME_BENCHSCI, None)
@@ -28,13 +30,21 @@ def tab_innser_benchsci(query: str, result: dict):
     st.info("TODO: fetch & visualize data")
 
 
-def tab_search_result_antibody(heading: str, query: str, result: dict):
+def tab_search_result_antibody(
+    heading: str, query: str, result: dict, is_searching: bool = False
+) -> dict[str, RenderPanelType]:
+    """render panels of data sources and return functions to render each panel again by data source name"""
+
     st.markdown(f"### {heading}")
 
     # search result
     if result is None:
         st.markdown(MESSAGE_BEFORE_SEARCH)
-        return
+        return {}
 
     # BenchSci
-    tab_innser_benchsci(query, result)
+    return {
+        DATA_SOURCE_NAME_BENCHSCI: panel_slot(
+            tab_innser_benchsci, DATA_SOURCE_NAME_BENCHSCI, query, result, is_searching
+        )
+    }
@@ -1,9 +1,13 @@
 import streamlit as st
 
+from app.components.tabs.panel import RenderPanelType, panel_slot
 from app.components.tabs.tab_search_result_rna_biogps import tab_inner_biogps
 from app.components.tabs.tab_search_result_rna_dice import tab_inner_dice
 from app.components.tabs.tab_search_result_rna_hpa import tab_inner_hpa
 from app.constants import (
+    DATA_SOURCE_NAME_DICE,
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+    DATA_SOURCE_NAME_MYGENEINFO,
     MESSAGE_BEFORE_SEARCH,
 )
 from app.logger import create_logger
@@ -11,19 +15,37 @@ from app.logger import create_logger
 logger = create_logger(__name__)
 
 
-def tab_search_result_rna(heading: str, query: str, result: dict):
+def tab_search_result_rna(
+    heading: str, query: str, result: dict, is_searching: bool = False
+) -> dict[str, RenderPanelType]:
+    """render panels of data sources and return functions to render each panel again by data source name"""
+
     # search result
     if result is None:
         st.markdown(MESSAGE_BEFORE_SEARCH)
-        return
+        return {}
+
+    panels: dict[str, RenderPanelType] = {}
 
     # The Human Protein Atlas
-    tab_inner_hpa(query, result)
+    panels[DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS] = panel_slot(
+        tab_inner_hpa,
+        DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+        query,
+        result,
+        is_searching,
+    )
     st.divider()
 
     # DICE
-    tab_inner_dice(query, result)
+    panels[DATA_SOURCE_NAME_DICE] = panel_slot(
+        tab_inner_dice, DATA_SOURCE_NAME_DICE, query, result, is_searching
+    )
     st.divider()
 
-    # BioGPS
-    tab_inner_biogps(query, result)
+    # BioGPS (gene annotations are fetched from MyGene.info)
+    panels[DATA_SOURCE_NAME_MYGENEINFO] = panel_slot(
+        tab_inner_biogps, DATA_SOURCE_NAME_MYGENEINFO, query, result, is_searching
+    )
+
+    return panels
@@ -1,15 +1,19 @@
-import io
+from typing import Optional
 
-import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 
+from app.components.tabs.panel import search_error
 from app.constants import (
+    BIOGPS_EXPRESSION_CACHE_MAX_ENTRIES,
     CHART_BACKGROUND_COLOR,
     DATA_SOURCE_NAME_BIOGPS,
     DATA_SOURCE_NAME_MYGENEINFO,
 )
+from app.errors import PreprocessError, SourceUnavailableError
 from app.logger import create_logger
+from app.plot.figure_cache import FigureKey, get_figure_cache
+from app.preprocess.biogps import BiogpsExpression, aggregate_biogps_csv
 from app.search.biogps import BIOGPS_SUPPORT_DATASETS
 from app.search.mygeneinfo import RESULT_KEY_GENE_ANOTATIONS
 from app.search.search import search_biogps_sync
@@ -41,13 +45,109 @@ def get_gene_ensembl_id_from_gene_anotation(g: dict) -> str:
     return "Not found"
 
 
+@st.cache_resource(max_entries=BIOGPS_EXPRESSION_CACHE_MAX_ENTRIES, show_spinner=False)
+def aggregate_biogps_expression(
+    data_biogps: bytes, dataset_id: str
+) -> BiogpsExpression:
+    """
+    aggregate all probesets of CSV data from BioGPS once per response,
+    so that switching probesets doesn't parse or group the data again
+    """
+
+    logger.info(f"preprocessing BioGPS data: {dataset_id}")
+    return aggregate_biogps_csv(data_biogps, dataset_id)
+
+
+def load_biogps_expression(
+    dataset_id: str, ncbi_gene_id: str
+) -> Optional[BiogpsExpression]:
+    """
+    Fetch CSV data from BioGPS and aggregate it, or None if there is no data.
+
+    The response comes from the result cache on every rerun, so that its expiry
+    (including the negative TTL) and revalidation apply, while the aggregation
+    is cached per response. Errors are raised (not cached) to retry on next rerun.
+    """
+
+    data_biogps = search_biogps_sync(dataset_id, ncbi_gene_id)
+    if isinstance(data_biogps, Exception):
+        raise data_biogps
+
+    if data_biogps is None or len(data_biogps) == 0:
+        return None
+
+    return aggregate_biogps_expression(data_biogps, dataset_id)
+
+
+def build_biogps_figure(
+    expression: BiogpsExpression, symbol: str, dataset_name: str, probeset: str
+) -> go.Figure:
+    # 指定されたデータセット、probeset のデータを可視化
+    selected_df = expression.probeset_frame(probeset)
+
+    # plot horizontal bar chart with error bar
+    title = f"RNA expression of {symbol} (datasets: {dataset_name}, probe: {probeset})"
+    fig = go.Figure()
+    fig.add_trace(
+        go.Bar(
+            name=title,
+            x=selected_df[f"{probeset}_mean"],
+            y=selected_df.index,
+            orientation="h",
+            error_x={
+                "type": "data",
+                "array": selected_df[f"{probeset}_std"],
+                "visible": True,
+                "thickness": 1,
+            },
+            # style of bar
+            marker={
+                "color": "rgba(158,202,225,1)",  # バーの塗りつぶし色
+                "line": {
+                    "color": "rgba(8,48,107,1)",  # 枠線の色
+                    "width": 0.5,  # 枠線の太さ
+                },
+            },
+        )
+    )
+
+    # configure layout
+    fig.update_layout(
+        title=title,
+        xaxis_title="RNA Expression level",
+        yaxis_title="Organs, Tissues, Cell Lines",
+        height=1300,
+        # space between bars
+        bargap=0.4,
+        xaxis={
+            "showgrid": True,
+            "gridcolor": "LightGray",
+            "gridwidth": 1,
+            "zeroline": True,
+        },
+        yaxis={
+            "tickfont": {"size": 11},
+            "showgrid": True,
+            "gridcolor": "LightGray",
+            "gridwidth": 1,
+            "zeroline": True,
+        },
+        # chart color
+        paper_bgcolor=CHART_BACKGROUND_COLOR,
+        plot_bgcolor=CHART_BACKGROUND_COLOR,
+    )
+
+    return fig
+
+
+@st.fragment
 def tab_inner_biogps(query: str, result: dict):
     st.markdown(f"### {DATA_SOURCE_NAME_BIOGPS}")
     data_mygene = result.get(DATA_SOURCE_NAME_MYGENEINFO, None)
 
     # fetch 時にエラーが発生した場合は早期リターン
     if isinstance(data_mygene, Exception):
-        st.error(f"Error on search: `{query}`\n\n{data_mygene}", icon="🚨")
+        search_error(query, data_mygene)
         return
 
     # data を result から取得できなかった場合は早期リターン
@@ -153,110 +253,52 @@ def tab_inner_biogps(query: str, result: dict):
     # fetch CSV data with dataset_id and ncbi_gene_id
     # --------------------------------------------------
 
-    # fetch data from BioGPS
-    data_biogps = search_biogps_sync(selected_dataset_id, ncbi_gene_id)
-    if data_biogps is None:
+    # fetch data from BioGPS and preprocess it (preprocessed data is cached per response)
+    try:
+        expression = load_biogps_expression(selected_dataset_id, ncbi_gene_id)
+    except PreprocessError as e:
+        st.error(
+            f"Error on preprocessing data of BioGPS: `{selected_dataset_id}/{ncbi_gene_id}`\n\n{e}",
+            icon="🚨",
+        )
+        return
+    except SourceUnavailableError as e:
+        search_error(f"{selected_dataset_id}/{ncbi_gene_id}", e)
+        return
+    except Exception as e:
+        st.error(
+            f"Error on search BioGPS: `{selected_dataset_id}/{ncbi_gene_id}`\n\n{e}",
+            icon="🚨",
+        )
+        return
+
+    if expression is None:
         st.warning(
             f"No data found on BioGPS by dataset_id: `{selected_dataset_id}` and ncbi_gene_id: `{ncbi_gene_id}`",
             icon="⚠️",
         )
         return
 
-    # csv データを pandas DataFrame に変換
-    csv_text = data_biogps.decode("utf-8")  # bytes to str
-    csv_stream = io.StringIO(csv_text)
-    df = pd.read_csv(csv_stream).set_index("Samples")
-    logger.info(f"BioGPS df index: {df.index}")
-
     # Probeset の選択（レスポンスデータの CSV のカラムから取得できる）
-    probesets = df.columns.tolist()
-    selected_probeset = col_probeset.selectbox("Select probeset", options=probesets)
-
-    # データの前処理: probesets ごとにデータを抽出し、prefix が一致する行の平均、標準偏差を計算する
-    preprocessed_dfs = {}
-    for p in probesets:
-        logger.info(f"preprocessing data for probeset: {p}")
-
-        # 特定の probeset のデータを抽出
-        df_probeset = df[p]
-
-        # prefix が一致する行の平均、標準偏差を計算
-        grouped = df_probeset.groupby(
-            df_probeset.index.str.extract(r"([^\.]+)", expand=False)
-        )
-        se_mean = grouped.mean()
-        se_std = grouped.std(ddof=1)
-
-        # rename series
-        se_mean.name = f"{p}_mean"
-        se_std.name = f"{p}_std"
-
-        # plot 用に平均、標準偏差を結合
-        df_plot = pd.concat([se_mean, se_std], axis=1)
-
-        # sort by index desc
-        df_plot = df_plot.sort_index(ascending=False)
-
-        # store
-        preprocessed_dfs[p] = df_plot
+    selected_probeset = col_probeset.selectbox(
+        "Select probeset", options=expression.probesets
+    )
 
     # --------------------------------------------------
     # write chart
     # --------------------------------------------------
 
-    # 指定されたデータセット、probeset のデータを可視化
-    selected_df = preprocessed_dfs[selected_probeset]
-
-    # plot horizontal bar chart with error bar
-    title = f"RNA expression of {symbol} (datasets: {selected_dataset_name}, probe: {selected_probeset})"
-    fig = go.Figure()
-    fig.add_trace(
-        go.Bar(
-            name=title,
-            x=selected_df[f"{selected_probeset}_mean"],
-            y=selected_df.index,
-            orientation="h",
-            error_x={
-                "type": "data",
-                "array": selected_df[f"{selected_probeset}_std"],
-                "visible": True,
-                "thickness": 1,
-            },
-            # style of bar
-            marker={
-                "color": "rgba(158,202,225,1)",  # バーの塗りつぶし色
-                "line": {
-                    "color": "rgba(8,48,107,1)",  # 枠線の色
-                    "width": 0.5,  # 枠線の太さ
-                },
-            },
-        )
-    )
-
-    # configure layout
-    fig.update_layout(
-        title=title,
-        xaxis_title="RNA Expression level",
-        yaxis_title="Organs, Tissues, Cell Lines",
-        height=1300,
-        # space between bars
-        bargap=0.4,
-        xaxis={
-            "showgrid": True,
-            "gridcolor": "LightGray",
-            "gridwidth": 1,
-            "zeroline": True,
-        },
-        yaxis={
-            "tickfont": {"size": 11},
-            "showgrid": True,
-            "gridcolor": "LightGray",
-            "gridwidth": 1,
-            "zeroline": True,
-        },
-        # chart color
-        paper_bgcolor=CHART_BACKGROUND_COLOR,
-        plot_bgcolor=CHART_BACKGROUND_COLOR,
+    # 指定されたデータセット、probeset のデータを可視化 (figure is cached per gene, dataset and probeset)
+    fig = get_figure_cache().get_or_build(
+        FigureKey(
+            DATA_SOURCE_NAME_BIOGPS,
+            ncbi_gene_id,
+            selected_dataset_id,
+            selected_probeset,
+        ),
+        lambda: build_biogps_figure(
+            expression, symbol, selected_dataset_name, selected_probeset
+        ),
     )
 
     # render
@@ -278,11 +320,11 @@ def tab_inner_biogps(query: str, result: dict):
         # preprocessed data for plot
         col_chart_data, col_raw = st.columns(2)
         col_chart_data.markdown("#### Preprocessed Data for Chart")
-        col_chart_data.dataframe(selected_df)
+        col_chart_data.dataframe(expression.probeset_frame(selected_probeset))
 
         # raw data
         col_raw.markdown("#### Raw Data")
         col_raw.markdown(
             f"Download: http://ds.biogps.org/dataset/csv/{selected_dataset_id}/gene/{ncbi_gene_id}/"
         )
-        col_raw.dataframe(df)
+        col_raw.dataframe(expression.raw)
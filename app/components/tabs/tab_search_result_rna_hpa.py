@@ -2,24 +2,65 @@ import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 
+from app.components.tabs.panel import search_error
 from app.constants import CHART_BACKGROUND_COLOR, DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
 from app.logger import create_logger
-from app.plot.human_protein_atlas import TISSUE_PLOT_ATTRIBUTES, modify_tissue_data_key
-from app.search.human_protein_atlas import (
-    COLUMNS_HUMAN_PROTEIN_ATLAS,
-    COLUMNS_RNA_EXPRESSION,
-)
+from app.plot.figure_cache import FigureKey, get_figure_cache
+from app.plot.human_protein_atlas import TISSUE_LAYOUT
+from app.preprocess.human_protein_atlas import HpaExpression, HpaResult
+from app.search.search import search_hpa_expression_sync
 
 logger = create_logger(__name__)
 
 
+def build_hpa_figure(expression: HpaExpression) -> go.Figure:
+    # - create figure: nTPM is already in plot order of TISSUE_LAYOUT
+    graph_object = go.Bar(
+        x=TISSUE_LAYOUT.tissues,  # tissue を X 軸に設定
+        y=expression.nTPM,  # nTPM を Y 軸に設定
+        marker_color=TISSUE_LAYOUT.colors,  # 色を設定
+        opacity=0.8,  # 透明度を設定
+        # for tooltip
+        customdata=TISSUE_LAYOUT.organs,  # tooltip のためのデータを設定
+        hovertemplate="<b>Tissue: %{x}</b><br>nTPM: %{y}<br>Organ: %{customdata}<extra></extra>",
+    )
+    fig = go.Figure(graph_object)
+
+    # - fig settings
+    fig.update_layout(
+        title="RNA expression of tissues (Concensus dataset)",
+        xaxis_tickangle=-60,
+        xaxis_title="tissue",
+        yaxis_title="nTPM",
+        hoverlabel={
+            "align": "left",
+            "bgcolor": "rgba(36,35,35,0.8)",
+            "font_color": "white",
+            "font_size": 14,
+            "font_family": "'Open Sans', sans-serif",
+        },
+        yaxis={
+            "showgrid": True,
+            "gridcolor": "LightGray",
+            "gridwidth": 1,
+            "zeroline": True,
+        },
+        # chart color
+        paper_bgcolor=CHART_BACKGROUND_COLOR,
+        plot_bgcolor=CHART_BACKGROUND_COLOR,
+    )
+
+    return fig
+
+
+@st.fragment
 def tab_inner_hpa(query: str, result: dict):
     st.markdown(f"### {DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS}")
     data_hpa = result.get(DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, None)
 
     # fetch 時にエラーが発生した場合は早期リターン
     if isinstance(data_hpa, Exception):
-        st.error(f"Error on search: `{query}`\n\n{data_hpa}", icon="🚨")
+        search_error(query, data_hpa)
         return
 
     # data を result から取得できなかった場合は早期リターン
@@ -27,20 +68,21 @@ def tab_inner_hpa(query: str, result: dict):
         st.warning(f"No data found by query: `{query}`", icon="⚠️")
         return
 
+    # index the result once and keep it in result (session state) for later reruns
+    if not isinstance(data_hpa, HpaResult):
+        data_hpa = result[DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS] = HpaResult(data_hpa)
+
     # select gene
-    gene_select_labels = [
-        f'{x["Gene"]} (synonyms: {", ".join(x["Gene synonym"])})' for x in data_hpa
-    ]
     st.markdown(f"{len(data_hpa)} genes found by query: `{query}`")
-    selected_gene_label = st.selectbox("Select gene", options=gene_select_labels)
-
-    # extract gene name from selected_gene_label, from "IL2RA (synonyms: CD25, IDDM10, IL2R)" to "IL2RA"
-    gene = selected_gene_label.split(" ")[0]
-    selected_gene_data = list(filter(lambda x: x["Gene"] == gene, data_hpa))[0]
+    ensembl_id = st.selectbox(
+        "Select gene",
+        options=[g.ensembl_id for g in data_hpa],
+        format_func=lambda x: data_hpa.find(x).label,
+    )
+    selected_gene = data_hpa.find(ensembl_id)
 
     # write gene info
-    gene_name = selected_gene_data.get("Gene", "Unknown")
-    ensembl_id = selected_gene_data.get("Ensembl", "Unknown")
+    gene_name = selected_gene.gene
     summary_link = f"https://www.proteinatlas.org/{ensembl_id}-{gene_name}"
     st.markdown(
         f"""
@@ -48,44 +90,30 @@ def tab_inner_hpa(query: str, result: dict):
 
         Data source: {summary_link}
 
-        - Gene: `{selected_gene_data.get("Gene", "Unknown")}`
-        - Gene synonyms: {", ".join(selected_gene_data.get("Gene synonym", []))}
-        - Gene Ensembl ID: `{selected_gene_data.get("Ensembl", "Unknown")}`
-        - Gene description: {selected_gene_data.get("Gene description", "Unknown")}
+        - Gene: `{gene_name}`
+        - Gene synonyms: {", ".join(selected_gene.synonyms)}
+        - Gene Ensembl ID: `{ensembl_id}`
+        - Gene description: {selected_gene.description}
         """
     )
 
     # - Tissue
+    # fetch expression data of the selected gene (phase 2 of two-phase search) when it's first viewed
+    expression = data_hpa.expression(ensembl_id)
+    if expression is None:
+        data_expression = search_hpa_expression_sync(ensembl_id)
+        if isinstance(data_expression, Exception):
+            search_error(query, data_expression)
+            return
+        if len(data_expression) == 0:
+            st.warning(f"No expression data found for gene: `{gene_name}`", icon="⚠️")
+            return
+        expression = data_hpa.set_expression(ensembl_id, data_expression)
+
     # extract tissue metadata
-    keys = list(COLUMNS_HUMAN_PROTEIN_ATLAS.keys())
-    tissue_metadata = {k: v for k, v in selected_gene_data.items() if k in keys}
+    tissue_metadata = expression.metadata
     logger.info(f"tissue_metadata: {tissue_metadata}")
 
-    # extract only RNA expression data
-    keys = list(COLUMNS_RNA_EXPRESSION.keys())
-    # note: nTPM is str from API response, so convert to float
-    tissue_data: dict[str, float] = {
-        k: float(v) for k, v in selected_gene_data.items() if k in keys
-    }
-
-    # modify keys
-    # extract tissue name & capitalize: "Tissue RNA - hypothalamus [nTPM]" -> "Hypothalamus"
-    tissue_data = {modify_tissue_data_key(k): v for k, v in tissue_data.items()}
-
-    # tissue, nTPM を TISSUE_PLOT_ATTRIBUTES の順序に基づいて並び替える
-    col_tissues = [t["tissue"] for t in TISSUE_PLOT_ATTRIBUTES]
-    col_tissue_nTPMs = [tissue_data[t["tissue"]] for t in TISSUE_PLOT_ATTRIBUTES]
-    col_organs = [t["organ"] for t in TISSUE_PLOT_ATTRIBUTES]
-    colors = [t["color"] for t in TISSUE_PLOT_ATTRIBUTES]
-
-    # create dataframe
-    tissue_data = {
-        "tissue": col_tissues,
-        "organ": col_organs,
-        "nTPM": col_tissue_nTPMs,
-    }
-    df_tissue = pd.DataFrame(tissue_data)
-
     # write tissue metadata
     tissue_link = f"https://www.proteinatlas.org/{ensembl_id}-{gene_name}/tissue"
     st.markdown(
@@ -100,43 +128,10 @@ def tab_inner_hpa(query: str, result: dict):
         """
     )
 
-    # visualize data
-    # - create figure
-    logger.info(f"df_tissue shape: {df_tissue.shape}")
-    logger.info(f"df_tissue columns: {df_tissue.columns}")
-    graph_object = go.Bar(
-        x=df_tissue["tissue"],  # TissueカラムのデータをX軸に設定
-        y=df_tissue["nTPM"],  # nTPMカラムのデータをY軸に設定
-        marker_color=colors,  # 色を設定
-        opacity=0.8,  # 透明度を設定
-        # for tooltip
-        customdata=df_tissue["organ"],  # tooltip のためのデータを設定
-        hovertemplate="<b>Tissue: %{x}</b><br>nTPM: %{y}<br>Organ: %{customdata}<extra></extra>",
-    )
-    fig = go.Figure(graph_object)
-
-    # - fig settings
-    fig.update_layout(
-        title="RNA expression of tissues (Concensus dataset)",
-        xaxis_tickangle=-60,
-        xaxis_title="tissue",
-        yaxis_title="nTPM",
-        hoverlabel={
-            "align": "left",
-            "bgcolor": "rgba(36,35,35,0.8)",
-            "font_color": "white",
-            "font_size": 14,
-            "font_family": "'Open Sans', sans-serif",
-        },
-        yaxis={
-            "showgrid": True,
-            "gridcolor": "LightGray",
-            "gridwidth": 1,
-            "zeroline": True,
-        },
-        # chart color
-        paper_bgcolor=CHART_BACKGROUND_COLOR,
-        plot_bgcolor=CHART_BACKGROUND_COLOR,
+    # visualize data (figure is cached per gene)
+    fig = get_figure_cache().get_or_build(
+        FigureKey(DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, ensembl_id),
+        lambda: build_hpa_figure(expression),
     )
 
     # write chart
@@ -144,10 +139,18 @@ def tab_inner_hpa(query: str, result: dict):
 
     # write table for download
     toggle = st.toggle(
-        "Show source data of above chart", key=f"toggle_show_source_data_hpa_{gene}"
+        "Show source data of above chart",
+        key=f"toggle_show_source_data_hpa_{gene_name}",
     )
     if toggle:
         st.markdown(
             "As you mouse over the table below, you can download CSV file from popup."
         )
+        df_tissue = pd.DataFrame(
+            {
+                "tissue": TISSUE_LAYOUT.tissues,
+                "organ": TISSUE_LAYOUT.organs,
+                "nTPM": expression.nTPM,
+            }
+        )
         st.dataframe(df_tissue, hide_index=True)
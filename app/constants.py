@@ -1,3 +1,5 @@
+import os
+
 # data sources
 DATA_SOURCE_NAME_ENSEMBL = "Ensembl"
 DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS = "The Human Protein Atlas"
@@ -64,3 +66,106 @@ TAB_NAME_ANTIBODY_LIST = "Antibody List"
 
 # for chart
 CHART_BACKGROUND_COLOR = "rgba(238,240,244,0.7)"
+
+# for result cache
+# note: cache file is shared by all Streamlit worker processes on the same host
+CACHE_PATH = os.environ.get(
+    "GENE_SEARCHER_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "gene-searcher", "cache.sqlite3"),
+)
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60  # 7 days
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512 MiB (compressed)
+# the total size is tracked in process and synced with the cache file every N writes,
+# since other worker processes also write to the file
+CACHE_SIZE_SYNC_WRITES = 100
+# TTL of empty results (gene not found on the data source)
+CACHE_NEGATIVE_TTL_SECONDS = 24 * 60 * 60  # 1 day
+# expired entries are kept to be revalidated with ETag / Last-Modified (HTTP 304)
+CACHE_STALE_SECONDS = 30 * 24 * 60 * 60  # 30 days
+# expired entries of these data sources are served immediately while revalidating in background
+# note: expression data changes only with releases of the databases
+CACHE_STALE_WHILE_REVALIDATE_SOURCES = [
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+    DATA_SOURCE_NAME_DICE,
+    DATA_SOURCE_NAME_BIOGPS,
+]
+
+# for batch search
+# max number of concurrent requests to each data source
+BATCH_CONCURRENCY_LIMITS = {
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS: 4,
+    DATA_SOURCE_NAME_DICE: 4,
+    DATA_SOURCE_NAME_MYGENEINFO: 2,
+    DATA_SOURCE_NAME_BIOGPS: 4,
+}
+BATCH_HPA_CHUNK_SIZE = (
+    20  # number of genes per multi-term search on The Human Protein Atlas
+)
+
+# for prefetch of BioGPS datasets after MyGene.info returns
+BIOGPS_PREFETCH_MAX_GENES = 2  # max number of genes to prefetch all datasets
+BIOGPS_PREFETCH_CONCURRENCY = 3  # max number of concurrent requests to BioGPS
+
+# for in-process cache of preprocessed BioGPS data per response
+BIOGPS_EXPRESSION_CACHE_MAX_ENTRIES = 64
+
+# for in-process cache of preprocessed DICE data per response
+DICE_EXPRESSION_CACHE_MAX_ENTRIES = 64
+
+# for in-process cache of chart figures (see `app.plot.figure_cache.FigureCache`)
+FIGURE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 MiB (serialized figure specs)
+FIGURE_LAYOUT_VERSION = 1  # bump when charts change to invalidate cached figures
+
+# for retry of requests to data sources (see `app.client.RetryPolicy`)
+# note: DICE returns status 500 when a gene is not found, so 500 is not retried
+RETRY_STATUSES = [429, 502, 503, 504]
+RETRY_POLICIES = {
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS: {"max_attempts": 3, "deadline_seconds": 60},
+    DATA_SOURCE_NAME_DICE: {"max_attempts": 3, "deadline_seconds": 45},
+    DATA_SOURCE_NAME_MYGENEINFO: {"max_attempts": 3, "deadline_seconds": 45},
+    # ds.biogps.org often returns 502/503 and resets connections under load
+    DATA_SOURCE_NAME_BIOGPS: {
+        "max_attempts": 5,
+        "backoff_base_seconds": 1.0,
+        "deadline_seconds": 60,
+    },
+}
+
+# for adaptive timeouts per host (see `app.client.get_adaptive_timeout`)
+# timeout = clamp(p99 latency * multiplier, min, timeout of the request)
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20
+ADAPTIVE_TIMEOUT_P99_MULTIPLIER = 3.0
+ADAPTIVE_TIMEOUT_MIN_SECONDS = 5.0
+
+# for hedged requests: a second identical GET is sent when the first is slower than
+# p95 latency of the host, and whichever answers first is used
+HEDGE_SOURCES = [DATA_SOURCE_NAME_DICE, DATA_SOURCE_NAME_BIOGPS]
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 0.1
+
+# for rate limits of requests to each data source (shared by all searches in the process)
+# - rate_per_second, burst: token bucket
+# - max_in_flight: max number of concurrent requests to the host
+RATE_LIMITS = {
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS: {
+        "rate_per_second": 5,
+        "burst": 10,
+        "max_in_flight": 8,
+    },
+    DATA_SOURCE_NAME_DICE: {"rate_per_second": 5, "burst": 10, "max_in_flight": 8},
+    DATA_SOURCE_NAME_MYGENEINFO: {
+        "rate_per_second": 10,
+        "burst": 10,
+        "max_in_flight": 4,
+    },
+    DATA_SOURCE_NAME_BIOGPS: {"rate_per_second": 5, "burst": 10, "max_in_flight": 6},
+}
+
+# for circuit breakers of data sources (see `app.client.CircuitBreaker`)
+# a breaker opens when the error rate of the recent `window_size` requests exceeds `error_rate`
+CIRCUIT_BREAKERS = {
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS: {},
+    DATA_SOURCE_NAME_DICE: {},
+    DATA_SOURCE_NAME_MYGENEINFO: {},
+    DATA_SOURCE_NAME_BIOGPS: {"open_seconds": 60},
+}
@@ -31,6 +31,36 @@ class FetchUnexpectedError(Exception):
     """Unexpected error occurred during fetching data."""
 
 
+class NotModifiedError(Exception):
+    """
+    Response is not modified since the cached one (HTTP 304).
+    This error is raised only for conditional requests (see `app.client.conditional_request`).
+    """
+
+
+class SourceUnavailableError(Exception):
+    """
+    Data source is temporarily unavailable.
+    This error is raised without sending a request while the circuit breaker of the data source is open.
+    """
+
+    def __init__(self, source: str, retry_after_seconds: float):
+        self.source = source
+        self.retry_after_seconds = retry_after_seconds
+        super().__init__(
+            f"{source} is temporarily unavailable (retry after {retry_after_seconds:.0f} sec)"
+        )
+
+
+# ------------------------------------------------------------------------
+# for cache
+# ------------------------------------------------------------------------
+
+
+class CacheError(Exception):
+    """Error occurred during reading or writing the result cache."""
+
+
 # ------------------------------------------------------------------------
 # for search
 # ------------------------------------------------------------------------
@@ -38,3 +68,21 @@ class FetchUnexpectedError(Exception):
 
 class FetchFromMyGeneError(Exception):
     """Not found on BioGPS."""
+
+
+# ------------------------------------------------------------------------
+# for preprocess
+# ------------------------------------------------------------------------
+
+
+class PreprocessError(Exception):
+    """Error occurred during preprocessing data from data sources."""
+
+
+# ------------------------------------------------------------------------
+# for export
+# ------------------------------------------------------------------------
+
+
+class ExportError(Exception):
+    """Error occurred during exporting search results to file."""
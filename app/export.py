@@ -0,0 +1,204 @@
+import csv
+import io
+from typing import Optional
+
+from app.constants import (
+    DATA_SOURCE_NAME_BIOGPS,
+    DATA_SOURCE_NAME_DICE,
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+)
+from app.errors import ExportError
+from app.logger import create_logger
+from app.plot.human_protein_atlas import modify_tissue_data_key
+from app.preprocess.dice import parse_dice_csv
+from app.search.batch import BatchSearchResult, select_hpa_record
+from app.search.human_protein_atlas import COLUMNS_RNA_EXPRESSION
+
+logger = create_logger(__name__)
+
+# columns of tidy long-format expression table
+# note: "tissue" is a tissue for The Human Protein Atlas, a cell type for DICE and a sample for BioGPS
+EXPORT_COLUMNS = ["gene", "source", "dataset", "probeset", "tissue", "value"]
+
+# output formats
+EXPORT_FORMAT_PARQUET = "parquet"
+EXPORT_FORMAT_ARROW = "arrow"  # Arrow IPC file
+EXPORT_FORMATS = [EXPORT_FORMAT_PARQUET, EXPORT_FORMAT_ARROW]
+
+DATASET_HPA = "Tissue RNA consensus [nTPM]"
+DATASET_DICE = "Immune cell types [TPM]"
+
+RowType = tuple[str, str, str, Optional[str], str, float]
+
+
+def tidy_hpa(gene: str, records: list[dict]) -> list[RowType]:
+    """nTPM of each tissue of the gene from The Human Protein Atlas records (other genes hit are dropped)"""
+
+    rows: list[RowType] = []
+    record = select_hpa_record(gene, records)
+    if record is None:
+        return rows
+
+    for key in COLUMNS_RNA_EXPRESSION:
+        value = record.get(key)
+        if value is None:
+            continue
+
+        rows.append(
+            (
+                gene,
+                DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+                DATASET_HPA,
+                None,
+                modify_tissue_data_key(key),
+                float(value),
+            )
+        )
+
+    return rows
+
+
+def tidy_dice(gene: str, data: bytes) -> list[RowType]:
+    """TPM of each replicate of each cell type from DICE CSV data"""
+
+    expression = parse_dice_csv(data)
+
+    rows: list[RowType] = []
+    for i, cell_type in enumerate(expression.cell_types):
+        for value in expression.samples(i).tolist():
+            rows.append(
+                (
+                    gene,
+                    DATA_SOURCE_NAME_DICE,
+                    DATASET_DICE,
+                    None,
+                    cell_type,
+                    value,
+                )
+            )
+
+    return rows
+
+
+def tidy_biogps(gene: str, dataset_id: str, data: bytes) -> list[RowType]:
+    """expression level of each probeset of each sample from BioGPS CSV data"""
+
+    rows: list[RowType] = []
+    reader = csv.reader(io.StringIO(data.decode("utf-8")))
+
+    # 1 行目はヘッダー ("Samples", probeset, ...)、2 行目以降はデータ
+    header = next(reader, None)
+    if header is None:
+        return rows
+
+    probesets = header[1:]
+    for row in reader:
+        sample = row[0]
+        for probeset, value in zip(probesets, row[1:]):
+            if value == "":
+                continue
+
+            rows.append(
+                (
+                    gene,
+                    DATA_SOURCE_NAME_BIOGPS,
+                    dataset_id,
+                    probeset,
+                    sample,
+                    float(value),
+                )
+            )
+
+    return rows
+
+
+def tidy_batch_result(result: BatchSearchResult) -> list[RowType]:
+    """convert batch search result to rows of tidy long-format expression table"""
+
+    if not result.ok or not result.data:
+        return []
+
+    if result.source == DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS:
+        return tidy_hpa(result.gene, result.data)
+    if result.source == DATA_SOURCE_NAME_DICE:
+        return tidy_dice(result.gene, result.data)
+    if result.source == DATA_SOURCE_NAME_BIOGPS:
+        return tidy_biogps(result.gene, result.dataset_id, result.data)
+
+    # MyGene.info has gene annotations only
+    return []
+
+
+class ChunkedTableWriter:
+    """
+    Write rows of tidy long-format expression table to Parquet or Arrow IPC file in chunks.
+
+    pyarrow is imported lazily because it is only needed by the CLI.
+    """
+
+    def __init__(
+        self, path: str, fmt: str = EXPORT_FORMAT_PARQUET, chunk_size: int = 100_000
+    ):
+        if fmt not in EXPORT_FORMATS:
+            raise ExportError(
+                f"Unsupported format: {fmt} (supported: {EXPORT_FORMATS})"
+            )
+
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ExportError(
+                "pyarrow is required to write Parquet or Arrow IPC files: pip install pyarrow"
+            ) from e
+
+        self._pa = pa
+        self.path = path
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.num_rows = 0
+        self._rows: list[RowType] = []
+        self._schema = pa.schema(
+            [
+                ("gene", pa.string()),
+                ("source", pa.string()),
+                ("dataset", pa.string()),
+                ("probeset", pa.string()),
+                ("tissue", pa.string()),
+                ("value", pa.float64()),
+            ]
+        )
+
+        if fmt == EXPORT_FORMAT_PARQUET:
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self._schema)
+
+    def write(self, rows: list[RowType]):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if len(self._rows) == 0:
+            return
+
+        columns = list(zip(*self._rows))
+        batch = self._pa.record_batch(
+            [self._pa.array(c, type=f.type) for c, f in zip(columns, self._schema)],
+            schema=self._schema,
+        )
+        self._writer.write_batch(batch)
+        self.num_rows += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self) -> "ChunkedTableWriter":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
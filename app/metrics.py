@@ -0,0 +1,113 @@
+import bisect
+import threading
+from typing import Optional
+
+# upper bounds [sec] of histogram buckets: 10 ms ... ~160 sec (x1.25 each)
+LATENCY_BUCKETS: list[float] = [0.01 * 1.25**i for i in range(44)]
+
+# counts are halved when the total exceeds this, so recent samples weigh more
+# and quantiles follow changes of upstream latency
+HISTOGRAM_DECAY_COUNT = 1000
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies with log-spaced buckets and exponential decay.
+
+    Quantiles are approximated by the upper bound of the bucket, which is at most
+    25% larger than the exact value.
+    """
+
+    def __init__(self, buckets: list[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0.0] * (len(buckets) + 1)  # the last bucket is +Inf
+        self.count = 0.0
+        self.total = 0.0  # sum of latencies of all samples (not decayed)
+        self.samples = 0  # number of all samples (not decayed)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.samples += 1
+
+            if self.count > HISTOGRAM_DECAY_COUNT:
+                self.counts = [c / 2 for c in self.counts]
+                self.count /= 2
+
+    def quantile(self, q: float) -> Optional[float]:
+        """q-th quantile [sec] of recent latencies, or None if no sample"""
+
+        with self._lock:
+            if self.count == 0:
+                return None
+
+            target = q * self.count
+            cumulative = 0.0
+            for i, c in enumerate(self.counts):
+                cumulative += c
+                if cumulative >= target and c > 0:
+                    return self.buckets[i] if i < len(self.buckets) else float("inf")
+
+            return float("inf")
+
+
+_histograms: dict[str, LatencyHistogram] = {}
+_counters: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def get_histogram(name: str) -> LatencyHistogram:
+    """Return the process-wide histogram of the name (e.g. "latency:www.proteinatlas.org")"""
+
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = LatencyHistogram()
+
+        return histogram
+
+
+def observe(name: str, seconds: float):
+    get_histogram(name).observe(seconds)
+
+
+def increment(name: str, value: int = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get_counter(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> dict:
+    """p50, p95, p99 and count of all histograms and values of all counters (for logs)"""
+
+    with _lock:
+        histograms = dict(_histograms)
+        counters = dict(_counters)
+
+    return {
+        "histograms": {
+            name: {
+                "p50": h.quantile(0.5),
+                "p95": h.quantile(0.95),
+                "p99": h.quantile(0.99),
+                "count": h.samples,
+            }
+            for name, h in histograms.items()
+        },
+        "counters": counters,
+    }
+
+
+def reset():
+    """Clear all metrics (for tests)"""
+
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from app import metrics
+from app.constants import FIGURE_CACHE_MAX_BYTES, FIGURE_LAYOUT_VERSION
+from app.logger import create_logger
+
+logger = create_logger(__name__)
+
+
+class FigureKey(NamedTuple):
+    source: str
+    gene: str
+    dataset: str = ""
+    probeset: str = ""
+    variant: str = ""  # other options of the chart, e.g. "all samples" of DICE
+    layout_version: int = FIGURE_LAYOUT_VERSION
+
+
+class FigureCache:
+    """
+    In-process LRU cache of Plotly figures shared by all sessions,
+    bounded by the total size of serialized figure specs (JSON).
+
+    Cached figures are shared, so they must not be mutated by callers.
+    """
+
+    def __init__(self, max_bytes: int = FIGURE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._figures: OrderedDict[FigureKey, tuple[go.Figure, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._figures)
+
+    def get(self, key: FigureKey) -> Optional[go.Figure]:
+        with self._lock:
+            item = self._figures.get(key)
+            if item is None:
+                metrics.increment(f"figure_cache_miss:{key.source}")
+                return None
+
+            self._figures.move_to_end(key)
+            metrics.increment(f"figure_cache_hit:{key.source}")
+
+            return item[0]
+
+    def set(self, key: FigureKey, fig: go.Figure):
+        size = len(pio.to_json(fig, validate=False))
+        if size > self.max_bytes:
+            logger.info(f"figure is too large to cache: {key} ({size} bytes)")
+            return
+
+        with self._lock:
+            old = self._figures.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old[1]
+
+            self._figures[key] = (fig, size)
+            self.size_bytes += size
+
+            # evict least recently used figures
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted) = self._figures.popitem(last=False)
+                self.size_bytes -= evicted
+
+    def get_or_build(self, key: FigureKey, build: Callable[[], go.Figure]) -> go.Figure:
+        """return the cached figure of the key, or build and cache it"""
+
+        fig = self.get(key)
+        if fig is None:
+            fig = build()
+            self.set(key, fig)
+
+        return fig
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.size_bytes = 0
+
+
+_figure_cache: Optional[FigureCache] = None
+_figure_cache_lock = threading.Lock()
+
+
+def get_figure_cache() -> FigureCache:
+    """Return the process-wide FigureCache."""
+
+    global _figure_cache
+
+    with _figure_cache_lock:
+        if _figure_cache is None:
+            _figure_cache = FigureCache()
+
+        return _figure_cache
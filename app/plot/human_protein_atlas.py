@@ -1,3 +1,10 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.search.human_protein_atlas import COLUMNS_RNA_EXPRESSION
+
+
 def modify_tissue_data_key(x: str) -> str:
     modified_key = x.replace("Tissue RNA - ", "").replace(" [nTPM]", "").capitalize()
     if modified_key in ["Endometrium 1", "Skin 1", "Stomach 1"]:
@@ -322,3 +329,48 @@ TISSUE_PLOT_ATTRIBUTES = [
         "color": "#df6174",
     },
 ]
+
+
+@dataclass(frozen=True)
+class TissueLayout:
+    """
+    Layout of the tissue chart compiled from `TISSUE_PLOT_ATTRIBUTES`:
+    values of a tissue are plotted at `positions[column]` where `column` is the key of HPA record.
+    """
+
+    positions: dict[str, int]
+    tissues: np.ndarray  # object, shape (n,)
+    organs: np.ndarray  # object, shape (n,)
+    colors: np.ndarray  # object, shape (n,)
+
+    def __len__(self) -> int:
+        return len(self.tissues)
+
+    def scatter(self, record: dict) -> np.ndarray:
+        """values of tissue columns in the record in plot order (float32, NaN if missing)"""
+
+        values = np.full(len(self), np.nan, dtype=np.float32)
+        positions = self.positions
+        for k, v in record.items():
+            i = positions.get(k)
+            if i is not None and v is not None and v != "":
+                # note: nTPM is str from API response, so convert to float
+                values[i] = float(v)
+
+        return values
+
+
+def compile_tissue_layout(columns: list[str]) -> TissueLayout:
+    attributes = sorted(TISSUE_PLOT_ATTRIBUTES, key=lambda t: t["order"])
+    order = {t["tissue"]: i for i, t in enumerate(attributes)}
+
+    return TissueLayout(
+        positions={k: order[modify_tissue_data_key(k)] for k in columns},
+        tissues=np.array([t["tissue"] for t in attributes], dtype=object),
+        organs=np.array([t["organ"] for t in attributes], dtype=object),
+        colors=np.array([t["color"] for t in attributes], dtype=object),
+    )
+
+
+# compiled once on import, since Streamlit reruns the whole script on every interaction
+TISSUE_LAYOUT = compile_tissue_layout(list(COLUMNS_RNA_EXPRESSION.keys()))
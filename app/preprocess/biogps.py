@@ -0,0 +1,224 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.cache import get_cache
+from app.errors import CacheError, PreprocessError
+from app.logger import create_logger
+
+logger = create_logger(__name__)
+
+# sample group key: "Yeast (background).1" -> "Yeast (background)"
+SAMPLE_GROUP_PATTERN = re.compile(r"([^\.]+)")
+
+# key of sample indexes in the result cache: (source, f"{version}/{dataset_id}")
+CACHE_SOURCE_SAMPLE_INDEX = "BioGPS sample index"
+SAMPLE_INDEX_VERSION = "v1"
+
+# sample indexes loaded in this process: dataset_id -> index
+_sample_indexes: dict[str, "BiogpsSampleIndex"] = {}
+
+
+@dataclass(frozen=True)
+class BiogpsSampleIndex:
+    """
+    Sample groups (organ, tissue, cell line) of a BioGPS dataset.
+
+    Every CSV of a dataset has the same samples regardless of the gene,
+    so the index is built once per dataset and `group_ids[i]` is the position of
+    the group of `samples[i]` in `groups` (sorted desc for display),
+    or -1 if the sample has no group.
+    """
+
+    samples: list[str]
+    groups: list[str]
+    group_ids: np.ndarray  # int64, shape (len(samples),)
+    group_sizes: np.ndarray  # int64, shape (len(groups),)
+
+    @classmethod
+    def build(cls, samples: list[str]) -> "BiogpsSampleIndex":
+        labels = []
+        for sample in samples:
+            m = SAMPLE_GROUP_PATTERN.search(sample)
+            labels.append(m.group(1) if m else None)
+
+        groups = sorted({label for label in labels if label is not None}, reverse=True)
+        positions = {group: i for i, group in enumerate(groups)}
+        group_ids = np.array(
+            [positions[label] if label is not None else -1 for label in labels],
+            dtype=np.int64,
+        )
+        group_sizes = np.bincount(group_ids[group_ids >= 0], minlength=len(groups))
+
+        return cls(samples, groups, group_ids, group_sizes)
+
+    def matches(self, samples: list[str]) -> bool:
+        """whether the samples of a downloaded CSV are the same as this index"""
+        return self.samples == samples
+
+    def to_json(self) -> dict:
+        return {
+            "samples": self.samples,
+            "groups": self.groups,
+            "group_ids": self.group_ids.tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "BiogpsSampleIndex":
+        group_ids = np.asarray(data["group_ids"], dtype=np.int64)
+        group_sizes = np.bincount(
+            group_ids[group_ids >= 0], minlength=len(data["groups"])
+        )
+        return cls(data["samples"], data["groups"], group_ids, group_sizes)
+
+    def aggregate(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        mean and std (ddof=1) of each group for a float32 vector of expression levels
+        aligned with `samples`; missing values (NaN) are skipped like pandas.
+        """
+
+        valid = (self.group_ids >= 0) & ~np.isnan(values)
+        group_ids = self.group_ids[valid]
+        values = values[valid].astype(np.float64)
+        n_groups = len(self.groups)
+
+        counts = np.bincount(group_ids, minlength=n_groups)
+        sums = np.bincount(group_ids, weights=values, minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums / counts
+            deviations = values - mean[group_ids]
+            squares = np.bincount(group_ids, weights=deviations**2, minlength=n_groups)
+            std = np.sqrt(squares / (counts - 1))
+
+        # std of a group with one sample is NaN like pandas
+        std[counts < 2] = np.nan
+        return mean, std
+
+
+@dataclass(frozen=True)
+class BiogpsExpression:
+    """
+    RNA expression data of a gene in a BioGPS dataset, and mean and standard deviation
+    of each sample group (organ, tissue, cell line) for all probesets.
+    """
+
+    raw: pd.DataFrame  # index: sample, columns: probesets
+    mean: pd.DataFrame  # index: sample group (sorted desc), columns: probesets
+    std: pd.DataFrame  # index: sample group (sorted desc), columns: probesets
+
+    @property
+    def probesets(self) -> list[str]:
+        return self.raw.columns.tolist()
+
+    def probeset_frame(self, probeset: str) -> pd.DataFrame:
+        """mean and std of the probeset for plot: columns are "<probeset>_mean" and "<probeset>_std" """
+
+        return pd.concat(
+            [
+                self.mean[probeset].rename(f"{probeset}_mean"),
+                self.std[probeset].rename(f"{probeset}_std"),
+            ],
+            axis=1,
+        )
+
+
+def parse_biogps_csv(data: bytes) -> tuple[list[str], list[str], np.ndarray]:
+    """
+    Parse CSV data downloaded from BioGPS into samples, probesets and a float32 matrix
+    of shape (samples, probesets):
+    1 行目はヘッダー ("Samples", probeset, ...)、2 行目以降は 1 列目が sample, 2 列目以降が expression level
+    """
+
+    lines = [line for line in data.splitlines() if line.strip() != b""]
+    if len(lines) == 0 or not lines[0].startswith(b"Samples,"):
+        raise PreprocessError("Failed to parse CSV data of BioGPS: no Samples column")
+
+    probesets = lines[0].decode("utf-8").rstrip().split(",")[1:]
+    samples: list[str] = []
+    fields: list[bytes] = []
+    for line in lines[1:]:
+        sample, _, rest = line.rstrip().partition(b",")
+        row = rest.split(b",")
+        if len(row) != len(probesets):
+            raise PreprocessError(
+                f"Failed to parse CSV data of BioGPS: invalid row of {sample!r}"
+            )
+
+        samples.append(sample.decode("utf-8"))
+        fields.extend(row)
+
+    try:
+        values = np.array([f or b"nan" for f in fields], dtype=np.float32)
+    except ValueError as e:
+        raise PreprocessError(f"Failed to parse CSV data of BioGPS: {e}") from e
+
+    return samples, probesets, values.reshape(len(samples), len(probesets))
+
+
+def get_sample_index(dataset_id: str, samples: list[str]) -> BiogpsSampleIndex:
+    """
+    Get the sample index of the dataset from memory or the result cache,
+    and rebuild it if the samples of a downloaded CSV don't match (the dataset changed).
+    """
+
+    key = f"{SAMPLE_INDEX_VERSION}/{dataset_id}"
+
+    index = _sample_indexes.get(dataset_id)
+    if index is None:
+        try:
+            cached = get_cache().get(CACHE_SOURCE_SAMPLE_INDEX, key)
+        except CacheError as e:
+            logger.error(f"Error on get_sample_index: {e}")
+            cached = None
+
+        if cached is not None:
+            index = BiogpsSampleIndex.from_json(cached)
+
+    if index is not None and index.matches(samples):
+        _sample_indexes[dataset_id] = index
+        return index
+
+    logger.info(f"building sample index of BioGPS dataset: {dataset_id}")
+    index = BiogpsSampleIndex.build(samples)
+    _sample_indexes[dataset_id] = index
+    try:
+        get_cache().set(CACHE_SOURCE_SAMPLE_INDEX, key, index.to_json())
+    except CacheError as e:
+        logger.error(f"Error on get_sample_index: {e}")
+
+    return index
+
+
+def aggregate_biogps_csv(
+    data: bytes, dataset_id: Optional[str] = None
+) -> BiogpsExpression:
+    """
+    Parse CSV data downloaded from BioGPS and aggregate replicates by sample group.
+
+    Sample groups are taken from the index of the dataset shared across genes
+    (built from the CSV if dataset_id is not given), and mean and std of each probeset
+    are computed by `np.bincount` over group ids.
+    """
+
+    samples, probesets, values = parse_biogps_csv(data)
+    if dataset_id is None:
+        index = BiogpsSampleIndex.build(samples)
+    else:
+        index = get_sample_index(dataset_id, samples)
+
+    mean = np.empty((len(index.groups), len(probesets)), dtype=np.float64)
+    std = np.empty_like(mean)
+    for j in range(len(probesets)):
+        mean[:, j], std[:, j] = index.aggregate(values[:, j])
+
+    groups = pd.Index(index.groups, name="Samples")
+    return BiogpsExpression(
+        raw=pd.DataFrame(
+            values, index=pd.Index(samples, name="Samples"), columns=probesets
+        ),
+        mean=pd.DataFrame(mean, index=groups, columns=probesets),
+        std=pd.DataFrame(std, index=groups, columns=probesets),
+    )
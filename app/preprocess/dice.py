@@ -0,0 +1,160 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from app.errors import PreprocessError
+
+
+@dataclass(frozen=True)
+class DiceExpression:
+    """
+    RNA expression data of DICE parsed from CSV, and its statistics per cell type.
+
+    Replicates of all cell types are stored in one array (`values`) and
+    `values[offsets[i]:offsets[i + 1]]` are the replicates of `cell_types[i]`
+    sorted in ascending order. Statistics are arrays aligned with `cell_types`.
+    """
+
+    cell_types: list[str]
+    offsets: np.ndarray  # int64, shape (n + 1,)
+    values: np.ndarray  # float64, shape (offsets[-1],)
+    mean: np.ndarray
+    median: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    q1: np.ndarray
+    q3: np.ndarray
+    lowerfence: np.ndarray  # min of replicates >= q1 - 1.5 * IQR (lower whisker)
+    upperfence: np.ndarray  # max of replicates <= q3 + 1.5 * IQR (upper whisker)
+
+    def __len__(self) -> int:
+        return len(self.cell_types)
+
+    def samples(self, i: int) -> np.ndarray:
+        """replicates of i-th cell type"""
+        return self.values[self.offsets[i] : self.offsets[i + 1]]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """statistics table indexed by cell type"""
+        return pd.DataFrame(
+            {
+                "cell_type": self.cell_types,
+                "mean": self.mean,
+                "median": self.median,
+                "min": self.min,
+                "max": self.max,
+            }
+        ).set_index("cell_type")
+
+
+def _split_cell_type(line: bytes) -> tuple[bytes, bytes]:
+    """split CSV line into cell type and the rest: b'"T cell, CD4, TH1",7.9,15.7' -> (b"T cell, CD4, TH1", b"7.9,15.7")"""
+
+    if line.startswith(b'"'):
+        end = line.find(b'",', 1)
+        if end < 0:
+            return line[1:].rstrip(b'"').replace(b'""', b'"'), b""
+
+        return line[1:end].replace(b'""', b'"'), line[end + 2 :]
+
+    cell_type, _, rest = line.partition(b",")
+    return cell_type, rest
+
+
+def quantile_sorted(values: np.ndarray, offsets: np.ndarray, q: float) -> np.ndarray:
+    """
+    q-th quantile of each segment of sorted values with linear interpolation
+    (same as the default method of `np.quantile`)
+    """
+
+    starts = offsets[:-1]
+    position = (np.diff(offsets) - 1) * q
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    fraction = position - lower
+
+    values_lower = values[starts + lower]
+    values_upper = values[starts + upper]
+
+    return values_lower + (values_upper - values_lower) * fraction
+
+
+def fences_sorted(
+    values: np.ndarray, offsets: np.ndarray, q1: np.ndarray, q3: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    whiskers of each segment of sorted values: the most extreme values within 1.5 * IQR
+    from the box (same as box plots of Plotly computed from raw data)
+    """
+
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    iqr = q3 - q1
+
+    # number of values below the lower limit and not above the upper limit in each segment
+    below = np.add.reduceat(values < np.repeat(q1 - 1.5 * iqr, counts), starts)
+    not_above = np.add.reduceat(values <= np.repeat(q3 + 1.5 * iqr, counts), starts)
+
+    return values[starts + below], values[starts + not_above - 1]
+
+
+def parse_dice_csv(data: bytes) -> DiceExpression:
+    """
+    Parse CSV data downloaded from DICE and compute statistics per cell type.
+
+    CSV data of DICE is ragged (the number of replicates differs by cell type):
+    1 行目はヘッダー、2 行目以降は 1 列目が cell type, 2 列目以降が expression level [TPM]
+    """
+
+    cell_types: list[str] = []
+    rows: list[bytes] = []
+    counts: list[int] = []
+    for line in data.splitlines()[1:]:
+        if line.strip() == b"":
+            continue
+
+        cell_type, rest = _split_cell_type(line)
+        rest = rest.strip().rstrip(b",")
+        if rest == b"":
+            # no replicates
+            continue
+
+        cell_types.append(cell_type.decode("utf-8"))
+        rows.append(rest)
+        counts.append(rest.count(b",") + 1)
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    if len(cell_types) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return DiceExpression([], offsets, empty, *([empty] * 8))
+
+    try:
+        values = np.array(b",".join(rows).split(b","), dtype=np.float64)
+    except ValueError as e:
+        raise PreprocessError(f"Failed to parse CSV data of DICE: {e}") from e
+
+    # sort replicates within each cell type
+    group_ids = np.repeat(np.arange(len(counts)), counts)
+    values = values[np.lexsort((values, group_ids))]
+
+    starts = offsets[:-1]
+    q1 = quantile_sorted(values, offsets, 0.25)
+    q3 = quantile_sorted(values, offsets, 0.75)
+    lowerfence, upperfence = fences_sorted(values, offsets, q1, q3)
+
+    return DiceExpression(
+        cell_types=cell_types,
+        offsets=offsets,
+        values=values,
+        mean=np.add.reduceat(values, starts) / np.asarray(counts),
+        median=quantile_sorted(values, offsets, 0.5),
+        min=values[starts],
+        max=values[offsets[1:] - 1],
+        q1=q1,
+        q3=q3,
+        lowerfence=lowerfence,
+        upperfence=upperfence,
+    )
@@ -0,0 +1,102 @@
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+
+from app.plot.human_protein_atlas import TISSUE_LAYOUT
+from app.search.human_protein_atlas import COLUMNS_HUMAN_PROTEIN_ATLAS
+
+EXPRESSION_COLUMNS = [*COLUMNS_HUMAN_PROTEIN_ATLAS.keys(), *TISSUE_LAYOUT.positions]
+
+
+@dataclass(frozen=True)
+class HpaGene:
+    """identity of a gene on The Human Protein Atlas"""
+
+    gene: str
+    synonyms: tuple[str, ...]
+    ensembl_id: str
+    description: str
+
+    @classmethod
+    def from_record(cls, record: dict) -> "HpaGene":
+        return cls(
+            gene=record.get("Gene") or "Unknown",
+            synonyms=tuple(record.get("Gene synonym") or []),
+            ensembl_id=record.get("Ensembl") or "Unknown",
+            description=record.get("Gene description") or "Unknown",
+        )
+
+    @property
+    def label(self) -> str:
+        """label for selectbox: "IL2RA (synonyms: CD25, IDDM10, IL2R)" """
+        return f'{self.gene} (synonyms: {", ".join(self.synonyms)})'
+
+
+@dataclass(frozen=True)
+class HpaExpression:
+    """RNA expression data of a gene on The Human Protein Atlas"""
+
+    metadata: dict[str, str]  # keys of COLUMNS_HUMAN_PROTEIN_ATLAS
+    nTPM: np.ndarray  # float32, in plot order of TISSUE_LAYOUT, NaN if missing
+
+    @classmethod
+    def from_record(cls, record: dict) -> "HpaExpression":
+        nTPM = TISSUE_LAYOUT.scatter(record)
+        metadata = {k: record[k] for k in COLUMNS_HUMAN_PROTEIN_ATLAS if record.get(k)}
+
+        return cls(metadata=metadata, nTPM=nTPM)
+
+
+class HpaResult:
+    """
+    Search result of The Human Protein Atlas indexed by gene symbol and Ensembl ID.
+
+    Identity of genes is parsed eagerly, while expression data of a gene is decoded
+    only when it's first requested by `expression` and kept for later reruns.
+    Expression data comes from the records themselves if they include its columns,
+    or is added by `set_expression` (phase 2 of two-phase search).
+    """
+
+    def __init__(self, records: list[dict]):
+        self.genes = [HpaGene.from_record(r) for r in records]
+        self._index: dict[str, int] = {}
+        for i, gene in reversed(list(enumerate(self.genes))):
+            self._index[gene.gene] = i
+            self._index[gene.ensembl_id] = i
+
+        # raw expression columns not decoded yet, and decoded expression data by Ensembl ID
+        self._records: dict[str, dict] = {}
+        for gene, record in zip(self.genes, records):
+            raw = {k: record[k] for k in EXPRESSION_COLUMNS if k in record}
+            if raw:
+                self._records.setdefault(gene.ensembl_id, raw)
+        self._expressions: dict[str, HpaExpression] = {}
+
+    def __len__(self) -> int:
+        return len(self.genes)
+
+    def __iter__(self) -> Iterator[HpaGene]:
+        return iter(self.genes)
+
+    def find(self, key: str) -> Optional[HpaGene]:
+        """gene by gene symbol or Ensembl ID"""
+        i = self._index.get(key)
+        return None if i is None else self.genes[i]
+
+    def expression(self, ensembl_id: str) -> Optional[HpaExpression]:
+        """expression data of the gene, or None if it's not available yet"""
+
+        expression = self._expressions.get(ensembl_id)
+        if expression is None and ensembl_id in self._records:
+            expression = self.set_expression(ensembl_id, self._records[ensembl_id])
+
+        return expression
+
+    def set_expression(self, ensembl_id: str, record: dict) -> HpaExpression:
+        """decode and keep expression data of the gene from the record"""
+
+        expression = self._expressions[ensembl_id] = HpaExpression.from_record(record)
+        self._records.pop(ensembl_id, None)
+
+        return expression
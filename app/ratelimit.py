@@ -0,0 +1,115 @@
+import asyncio
+import time
+import weakref
+from typing import Optional
+
+from app import metrics
+from app.constants import RATE_LIMITS
+from app.logger import create_logger
+
+logger = create_logger(__name__)
+
+# limiters are bound to the event loop (asyncio.Semaphore), so keep them per loop:
+# loop -> host -> limiter
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, HostLimiter]]" = weakref.WeakKeyDictionary()
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: `rate_per_second` tokens are added per second up to `burst`.
+
+    A caller reserves a token even if the bucket is empty and waits until the token
+    is added, so callers are served in order of arrival.
+    """
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated_at) * self.rate_per_second
+        )
+        self.updated_at = now
+
+    async def acquire(self):
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return
+
+        try:
+            await asyncio.sleep(-self.tokens / self.rate_per_second)
+        except asyncio.CancelledError:
+            # give back the reserved token
+            self.tokens += 1
+            raise
+
+
+class HostLimiter:
+    """
+    Rate limit (token bucket) and cap of in-flight requests (semaphore) to a host.
+
+    Usage:
+        async with limiter:
+            res = await session.request(...)
+
+    or `acquire` and `release` to hold the slot longer than a block,
+    e.g. until the body of the response is read.
+    """
+
+    def __init__(
+        self, host: str, rate_per_second: float, burst: int, max_in_flight: int
+    ):
+        self.host = host
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def __aenter__(self) -> "HostLimiter":
+        await self.acquire()
+
+        return self
+
+    async def __aexit__(self, *args):
+        self.release()
+
+    async def acquire(self):
+        """wait for a slot of in-flight requests and a token of the rate limit"""
+
+        start = time.monotonic()
+        await self.semaphore.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+        wait = time.monotonic() - start
+        metrics.observe(f"queue_wait:{self.host}", wait)
+        if wait > 1.0:
+            logger.info(f"waited {wait:.2f} sec for rate limit of {self.host}")
+
+    def release(self):
+        self.semaphore.release()
+
+
+def get_host_limiter(source: Optional[str], host: str) -> Optional[HostLimiter]:
+    """
+    Return the limiter of the host shared by all searches on the running event loop
+    with the limits of the data source in `RATE_LIMITS`, or None if the source has no limits.
+    """
+
+    config = RATE_LIMITS.get(source)
+    if config is None:
+        return None
+
+    loop = asyncio.get_running_loop()
+    limiters = _limiters.setdefault(loop, {})
+    limiter = limiters.get(host)
+    if limiter is None:
+        limiter = limiters[host] = HostLimiter(host, **config)
+
+    return limiter
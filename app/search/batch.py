@@ -0,0 +1,308 @@
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Iterable, Iterator
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.client import get_session, iterate_sync
+from app.constants import (
+    BATCH_CONCURRENCY_LIMITS,
+    BATCH_HPA_CHUNK_SIZE,
+    DATA_SOURCE_NAME_BIOGPS,
+    DATA_SOURCE_NAME_DICE,
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+    DATA_SOURCE_NAME_MYGENEINFO,
+)
+from app.logger import create_logger
+from app.search.biogps import BIOGPS_SUPPORT_DATASETS, search_biogps
+from app.search.dice import search_dice
+from app.search.human_protein_atlas import search_hpa
+from app.search.mygeneinfo import RESULT_KEY_GENE_ANOTATIONS, querymany_mygene
+from app.search.search import (
+    DataType,
+    FetchResultType,
+    _get_cached,
+    _search_with_cache,
+    _set_cached,
+)
+
+logger = create_logger(__name__)
+
+# results of multi-gene requests differ from results of free-text query,
+# so they are cached under another key (e.g. "batch:IL2RA")
+CACHE_KEY_PREFIX_BATCH = "batch:"
+
+# sentinel to notify all searches are done
+_DONE = object()
+
+
+@dataclass(frozen=True)
+class BatchSearchResult:
+    """Search result of one gene from one data source (and one dataset of BioGPS)"""
+
+    gene: str
+    source: str
+    data: Optional[DataType] = None
+    error: Optional[Exception] = None
+    dataset_id: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def unique_genes(genes: Iterable[str]) -> list[str]:
+    """strip gene symbols and drop empty and duplicated ones keeping order"""
+
+    result: dict[str, None] = {}
+    for gene in genes:
+        gene = gene.strip()
+        if gene:
+            result[gene] = None
+
+    return list(result)
+
+
+def select_ncbi_gene_id(gene: str, hits: list[dict]) -> Optional[str]:
+    """select NCBI Gene ID of the hit whose symbol matches the gene, or the top-ranked hit"""
+
+    hits = [h for h in hits if not h.get("notfound", False) and "_id" in h]
+    if len(hits) == 0:
+        return None
+
+    for h in hits:
+        if h.get("symbol", "").upper() == gene.upper():
+            return h["_id"]
+
+    return hits[0]["_id"]
+
+
+def select_hpa_record(gene: str, records: list[dict]) -> Optional[dict]:
+    """
+    select the record of The Human Protein Atlas whose symbol or synonyms match the gene,
+    or the first hit (free-text search also hits other genes, e.g. IL15RA by "IL2RA")
+    """
+
+    if not records:
+        return None
+
+    for r in records:
+        if r.get("Gene", "").upper() == gene.upper():
+            return r
+
+    for r in records:
+        if gene.upper() in (s.upper() for s in r.get("Gene synonym") or []):
+            return r
+
+    return records[0]
+
+
+async def search_batch(
+    genes: Iterable[str],
+    biogps_dataset_ids: Optional[list[str]] = None,
+    concurrency_limits: Optional[dict[str, int]] = None,
+) -> AsyncIterator[BatchSearchResult]:
+    """
+    Search a gene panel on The Human Protein Atlas, DICE, MyGene.info and BioGPS,
+    and yield the result of each gene and data source as soon as it returns.
+
+    - requests to each data source are limited by BATCH_CONCURRENCY_LIMITS
+    - MyGene.info is queried with querymany, and The Human Protein Atlas with multi-term search
+      to cut the number of requests
+    - BioGPS datasets are fetched for the NCBI Gene ID resolved by MyGene.info
+    - results are read from and written to the result cache
+    - errors are reported per gene and data source instead of being raised
+    """
+
+    genes = unique_genes(genes)
+    if biogps_dataset_ids is None:
+        biogps_dataset_ids = [d["dataset_id"] for d in BIOGPS_SUPPORT_DATASETS]
+    limits = {**BATCH_CONCURRENCY_LIMITS, **(concurrency_limits or {})}
+    semaphores = {source: asyncio.Semaphore(n) for source, n in limits.items()}
+
+    session = await get_session()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    logger.info(f"start batch searching {len(genes)} genes...")
+
+    def _limited(
+        source: str, search_func: Callable[[], Awaitable[FetchResultType]]
+    ) -> Callable[[], Awaitable[FetchResultType]]:
+        async def _search() -> FetchResultType:
+            async with semaphores[source]:
+                return await search_func()
+
+        return _search
+
+    async def _search_one(
+        gene: str,
+        source: str,
+        cache_query: str,
+        search_func: Callable[[], Awaitable[FetchResultType]],
+        dataset_id: Optional[str] = None,
+    ):
+        try:
+            # exported data must be fresh: stale results are revalidated before they're returned
+            _, res = await _search_with_cache(
+                source, cache_query, _limited(source, search_func), serve_stale=False
+            )
+            queue.put_nowait(BatchSearchResult(gene, source, res, None, dataset_id))
+        except Exception as e:
+            logger.error(f"Error on search_batch: {source} by gene '{gene}': {e}")
+            queue.put_nowait(BatchSearchResult(gene, source, None, e, dataset_id))
+
+    async def _search_dice(gene: str):
+        await _search_one(
+            gene,
+            DATA_SOURCE_NAME_DICE,
+            gene,
+            lambda: search_dice(session, gene),
+        )
+
+    async def _search_hpa_chunk(chunk: list[str]):
+        source = DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
+
+        misses = []
+        for gene in chunk:
+            cached = await _get_cached(source, CACHE_KEY_PREFIX_BATCH + gene)
+            if cached is not None:
+                queue.put_nowait(BatchSearchResult(gene, source, cached))
+            else:
+                misses.append(gene)
+
+        if len(misses) == 0:
+            return
+
+        # search all genes in the chunk at once, e.g. "IL2RA OR ERBB2" ("IL2RA" for one gene)
+        records: Optional[list[dict]] = None
+        try:
+            query = " OR ".join(misses)
+            _, records = await _limited(source, lambda: search_hpa(session, query))()
+        except Exception as e:
+            logger.error(f"Error on search_batch: multi-term search on {source}: {e}")
+
+        async def _search_alone(gene: str) -> FetchResultType:
+            _, hits = await search_hpa(session, gene)
+            record = select_hpa_record(gene, hits)
+
+            return source, [record] if record is not None else []
+
+        records_by_gene = {r.get("Gene", "").upper(): r for r in records or []}
+        fallbacks = []
+        for gene in misses:
+            record = records_by_gene.get(gene.upper())
+            if record is None and records is not None and len(misses) == 1:
+                # the gene has been searched alone (e.g. query is a synonym)
+                record = select_hpa_record(gene, records)
+            elif record is None:
+                # fallback: search the gene alone (e.g. query is a synonym)
+                fallbacks.append(
+                    _search_one(
+                        gene,
+                        source,
+                        CACHE_KEY_PREFIX_BATCH + gene,
+                        lambda g=gene: _search_alone(g),
+                    )
+                )
+                continue
+
+            res = [record] if record is not None else []
+            await _set_cached(source, CACHE_KEY_PREFIX_BATCH + gene, res)
+            queue.put_nowait(BatchSearchResult(gene, source, res))
+
+        await asyncio.gather(*fallbacks)
+
+    async def _search_biogps(gene: str, ncbi_gene_id: str):
+        await asyncio.gather(
+            *[
+                _search_one(
+                    gene,
+                    DATA_SOURCE_NAME_BIOGPS,
+                    f"{dataset_id}/{ncbi_gene_id}",
+                    lambda d=dataset_id: search_biogps(session, d, ncbi_gene_id),
+                    dataset_id,
+                )
+                for dataset_id in biogps_dataset_ids
+            ]
+        )
+
+    async def _search_mygene_and_biogps():
+        source = DATA_SOURCE_NAME_MYGENEINFO
+
+        annotations: dict[str, dict] = {}
+        misses = []
+        for gene in genes:
+            cached = await _get_cached(source, CACHE_KEY_PREFIX_BATCH + gene)
+            if cached is not None:
+                annotations[gene] = cached
+            else:
+                misses.append(gene)
+
+        if len(misses) > 0:
+            try:
+                async with semaphores[source]:
+                    hits = await querymany_mygene(session, misses)
+            except Exception as e:
+                logger.error(f"Error on search_batch: querymany on {source}: {e}")
+                for gene in misses:
+                    queue.put_nowait(BatchSearchResult(gene, source, None, e))
+                misses, hits = [], []
+
+            hits_by_gene: dict[str, list[dict]] = {}
+            for h in hits:
+                if not h.get("notfound", False):
+                    hits_by_gene.setdefault(h.get("query", ""), []).append(h)
+
+            for gene in misses:
+                found = hits_by_gene.get(gene, [])
+                res = {RESULT_KEY_GENE_ANOTATIONS: found} if len(found) > 0 else {}
+                await _set_cached(source, CACHE_KEY_PREFIX_BATCH + gene, res)
+                annotations[gene] = res
+
+        tasks = []
+        for gene, res in annotations.items():
+            queue.put_nowait(BatchSearchResult(gene, source, res))
+
+            hits = res.get(RESULT_KEY_GENE_ANOTATIONS, []) if res else []
+            ncbi_gene_id = select_ncbi_gene_id(gene, hits)
+            if ncbi_gene_id is not None:
+                tasks.append(_search_biogps(gene, ncbi_gene_id))
+
+        await asyncio.gather(*tasks)
+
+    async def _search_all():
+        try:
+            await asyncio.gather(
+                _search_mygene_and_biogps(),
+                *[
+                    _search_hpa_chunk(genes[i : i + BATCH_HPA_CHUNK_SIZE])
+                    for i in range(0, len(genes), BATCH_HPA_CHUNK_SIZE)
+                ],
+                *[_search_dice(gene) for gene in genes],
+            )
+        finally:
+            queue.put_nowait(_DONE)
+
+    task = asyncio.create_task(_search_all())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+
+            yield item
+    finally:
+        # cancel remaining searches if the consumer stops iteration early
+        task.cancel()
+
+    # raise unexpected error if any
+    await task
+    logger.info(f"end batch searching {len(genes)} genes")
+
+
+def search_batch_sync(
+    genes: Iterable[str],
+    biogps_dataset_ids: Optional[list[str]] = None,
+    concurrency_limits: Optional[dict[str, int]] = None,
+) -> Iterator[BatchSearchResult]:
+    """sync wrapper of search_batch"""
+    return iterate_sync(search_batch(genes, biogps_dataset_ids, concurrency_limits))
@@ -2,12 +2,14 @@ from typing import Tuple
 
 import aiohttp
 
-from app.client import fetch
+from app.client import fetch, reading_response
 from app.constants import DATA_SOURCE_NAME_BIOGPS
 from app.errors import (
     FetchClientError,
     FetchClientResponseError,
     FetchUnexpectedError,
+    NotModifiedError,
+    SourceUnavailableError,
 )
 from app.logger import create_logger
 
@@ -44,12 +46,17 @@ async def search_biogps(
 
     # fetch data from BioGPS
     try:
-        res = await fetch(session, url, headers=headers)
+        res = await fetch(session, url, headers=headers, source=DATA_SOURCE_NAME_BIOGPS)
         res.raise_for_status()
-        data: bytes = await res.content.read()
+        with reading_response(url):
+            data: bytes = await res.content.read()
 
         return (DATA_SOURCE_NAME_BIOGPS, data)
 
+    except (NotModifiedError, SourceUnavailableError):
+        # not wrapped: the cached result is used on HTTP 304,
+        # and tabs show that the data source is unavailable
+        raise
     except aiohttp.ClientResponseError as e:
         msg = "Error on search_biogps: failed to fetch data due to response error"
         logger.error(msg)
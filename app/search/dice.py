@@ -2,7 +2,7 @@ from typing import Tuple
 
 import aiohttp
 
-from app.client import fetch
+from app.client import fetch, reading_response
 from app.constants import DATA_SOURCE_NAME_DICE
 from app.errors import FetchClientError, FetchClientResponseError, FetchUnexpectedError
 from app.logger import create_logger
@@ -23,15 +23,21 @@ async def search_dice(session: aiohttp.ClientSession, query: str) -> Tuple[str,
 
     # fetch data from DICE
     try:
-        res = await fetch(session, api_url, headers=headers)
+        res = await fetch(
+            session, api_url, headers=headers, source=DATA_SOURCE_NAME_DICE
+        )
 
         if res.status == 200 and res.headers.get("Content-Type") == "text/csv":
             # DICE の API は、遺伝子が見つかった場合、status code 200、Content-Type: text/csv でレスポンスが返ってくる
             # 前処理前の CSV データをレスポンスから読込
-            raw_csv_data: bytes = await res.content.read()
+            with reading_response(api_url):
+                raw_csv_data: bytes = await res.content.read()
 
             return (DATA_SOURCE_NAME_DICE, raw_csv_data)
 
+        # 読み込まないレスポンスは接続をプールに返却する
+        res.release()
+
         return (DATA_SOURCE_NAME_DICE, b"")
     except FetchClientResponseError as e:
         # DICE の API は、遺伝子が見つからなかった場合、status code 500、Content-Type: text/html でレスポンスが返ってくる# 遺伝子が見つからなかった場合、status code 500、Content-Type: text/html でレスポンスが返ってくる
@@ -1,8 +1,11 @@
-from typing import Tuple
+import codecs
+import json
+import zlib
+from typing import Optional, Tuple
 
 import aiohttp
 
-from app.client import fetch
+from app.client import fetch, reading_response
 from app.constants import DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
 from app.errors import FetchClientError, FetchClientResponseError, FetchUnexpectedError
 from app.logger import create_logger
@@ -79,34 +82,184 @@ COLUMNS_RNA_EXPRESSION = {
 }
 
 
-async def search_hpa(session: aiohttp.ClientSession, query: str) -> Tuple[str, dict]:
+# columns of all genes hit by a query (phase 1 of two-phase search)
+COLUMNS_IDENTITY = COLUMNS_GENERAL_INFO
+
+# columns of the gene selected by Ensembl ID (phase 2 of two-phase search)
+COLUMNS_EXPRESSION = {
+    "Gene": "g",
+    "Ensembl": "eg",
+    **COLUMNS_HUMAN_PROTEIN_ATLAS,
+    **COLUMNS_RNA_EXPRESSION,
+}
+
+# all columns (for batch search and export)
+COLUMNS_ALL = {
+    **COLUMNS_GENERAL_INFO,
+    **COLUMNS_HUMAN_PROTEIN_ATLAS,
+    **COLUMNS_RNA_EXPRESSION,
+}
+
+# for compressed transfer: the API returns gzip file with `compress=yes`
+HPA_READ_CHUNK_SIZE = 64 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class JsonArrayParser:
+    """
+    Incremental parser of a JSON array: each item is parsed as soon as it arrives,
+    so parsing overlaps with download and the whole text is never held in memory.
+
+    Usage:
+        parser = JsonArrayParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+        items = parser.close()
+    """
+
+    START = 0  # before "["
+    VALUE_OR_END = 1  # after "["
+    VALUE = 2  # after ","
+    COMMA_OR_END = 3  # after an item
+    END = 4  # after "]"
+
+    def __init__(self):
+        self.items: list = []
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = self.START
+
+    def feed(self, data: bytes):
+        self._buffer += self._text_decoder.decode(data)
+        self._parse(final=False)
+
+    def close(self) -> list:
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        self._parse(final=True)
+        if self._state != self.END:
+            raise ValueError("Invalid JSON array: unexpected end of data")
+
+        return self.items
+
+    def _parse(self, final: bool):
+        buf = self._buffer
+        pos = 0
+        while True:
+            # skip whitespaces
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos >= len(buf):
+                break
+
+            c = buf[pos]
+            if self._state == self.START:
+                if c != "[":
+                    raise ValueError(f"Invalid JSON array: unexpected {c!r}")
+                self._state = self.VALUE_OR_END
+                pos += 1
+            elif self._state == self.VALUE_OR_END and c == "]":
+                self._state = self.END
+                pos += 1
+            elif self._state in (self.VALUE_OR_END, self.VALUE):
+                try:
+                    item, end = self._decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # wait for the rest of the item
+
+                # a number may be truncated at the end of data (e.g. "2" of "2.5")
+                if (
+                    not final
+                    and isinstance(item, (int, float))
+                    and (end == len(buf) or buf[end] not in ",] \t\r\n")
+                ):
+                    break
+
+                self.items.append(item)
+                self._state = self.COMMA_OR_END
+                pos = end
+            elif self._state == self.COMMA_OR_END and c in ",]":
+                self._state = self.VALUE if c == "," else self.END
+                pos += 1
+            else:
+                raise ValueError(f"Invalid JSON array: unexpected {c!r}")
+
+        self._buffer = buf[pos:]
+
+
+async def read_json_array(res: aiohttp.ClientResponse) -> list:
+    """
+    Read JSON array from the response in chunks, decompressing gzip data on the fly
+    (the API returns gzip file with `compress=yes`, or plain JSON otherwise).
+    """
+
+    parser = JsonArrayParser()
+    decompressor = None
+    head = b""
+    try:
+        async for chunk in res.content.iter_chunked(HPA_READ_CHUNK_SIZE):
+            # detect gzip by the magic number in the first 2 bytes
+            if head is not None:
+                head += chunk
+                if len(head) < len(GZIP_MAGIC):
+                    continue
+
+                if head.startswith(GZIP_MAGIC):
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                chunk, head = head, None
+
+            parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+    finally:
+        # return the connection to the pool even if the data is broken
+        res.release()
+
+    if head:
+        parser.feed(head)
+    if decompressor is not None:
+        parser.feed(decompressor.flush())
+
+    return parser.close()
+
+
+async def search_hpa(
+    session: aiohttp.ClientSession,
+    query: str,
+    columns: Optional[dict[str, str]] = None,
+) -> Tuple[str, list[dict]]:
     """
     The Human Protein Atlas API docs: https://www.proteinatlas.org/about/help/dataaccess
 
+    Only `columns` (all columns by default) are requested to reduce the payload.
+
     Example:
-    - https://www.proteinatlas.org/api/search_download.php?search=%22IL2RA%22&format=json&columns=g,gs,rnatsm,rnatd&compress=no
+    - https://www.proteinatlas.org/api/search_download.php?search=%22IL2RA%22&format=json&columns=g,gs,rnatsm,rnatd&compress=yes
     """
 
     api_url = "https://www.proteinatlas.org/api/search_download.php"
 
     # create params
-    columns = ",".join(
-        list(COLUMNS_GENERAL_INFO.values())
-        + list(COLUMNS_HUMAN_PROTEIN_ATLAS.values())
-        + list(COLUMNS_RNA_EXPRESSION.values())
-    )
+    columns = COLUMNS_ALL if columns is None else columns
     params = {
         "search": query,
         "format": "json",
-        "columns": columns,
-        "compress": "no",
+        "columns": ",".join(dict.fromkeys(columns.values())),
+        "compress": "yes",
     }
-    headers = {"Content-Type": "application/json"}
+    headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip, deflate"}
 
     # fetch data from The Human Protein Atlas
     try:
-        res = await fetch(session, api_url, params, headers)
-        data: dict = await res.json()
+        res = await fetch(
+            session,
+            api_url,
+            params,
+            headers,
+            source=DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+        )
+        with reading_response(api_url):
+            data: list[dict] = await read_json_array(res)
 
         return (
             DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
@@ -127,3 +280,34 @@ async def search_hpa(session: aiohttp.ClientSession, query: str) -> Tuple[str, d
         logger.error(msg)
 
         raise Exception(f"{msg}: {e}") from e
+    except (ValueError, zlib.error) as e:
+        msg = f"Error on search_hpa: failed to read data from {api_url} due to invalid response"
+        logger.error(msg)
+
+        raise Exception(f"{msg}: {e}") from e
+
+
+async def search_hpa_genes(
+    session: aiohttp.ClientSession, query: str
+) -> Tuple[str, list[dict]]:
+    """
+    Phase 1 of two-phase search: identity columns (gene, synonyms, Ensembl ID, description)
+    of all genes hit by the query. Expression data is fetched by `search_hpa_expression`
+    only for the gene selected on the tab.
+    """
+
+    return await search_hpa(session, query, COLUMNS_IDENTITY)
+
+
+async def search_hpa_expression(
+    session: aiohttp.ClientSession, ensembl_id: str
+) -> Tuple[str, dict]:
+    """
+    Phase 2 of two-phase search: RNA expression data of the gene by Ensembl ID,
+    or {} if not found.
+    """
+
+    source, records = await search_hpa(session, ensembl_id, COLUMNS_EXPRESSION)
+    record = next((r for r in records if r.get("Ensembl") == ensembl_id), {})
+
+    return (source, record)
@@ -1,21 +1,27 @@
 from typing import Tuple
 
 import aiohttp
-import mygene
 
+from app.client import fetch, reading_response
 from app.constants import DATA_SOURCE_NAME_MYGENEINFO
 from app.errors import (
     FetchClientError,
     FetchClientResponseError,
     FetchFromMyGeneError,
     FetchUnexpectedError,
+    NotModifiedError,
+    SourceUnavailableError,
 )
 from app.logger import create_logger
 
 logger = create_logger(__name__)
 
 # for MyGene.info API query
+MYGENE_API_URL = "https://mygene.info/v3"
 MYGENE_QUERY_FIELDS = "symbol,taxid,name,alias,ensembl"
+MYGENE_QUERY_SIZE = 100
+MYGENE_QUERYMANY_SCOPES = "symbol,alias,ensembl.gene,entrezgene"
+MYGENE_QUERYMANY_MAX_SIZE = 1000  # max number of queries per request of /querymany
 TARGET_SPECIES = ["human"]
 
 # for search result
@@ -29,6 +35,71 @@ def sort_gene_anotations_by_ncbi_gene_id(gene_anotations: list) -> list:
     return sorted(gene_anotations, key=lambda x: x["_id"], reverse=False)
 
 
+async def query_mygene(
+    session: aiohttp.ClientSession,
+    query: str,
+    fields: str = MYGENE_QUERY_FIELDS,
+    species: list[str] = TARGET_SPECIES,
+    size: int = MYGENE_QUERY_SIZE,
+) -> dict:
+    """
+    GET /v3/query of MyGene.info API (same as `mygene.MyGeneInfo().query`)
+
+    API docs: https://docs.mygene.info/en/latest/doc/query_service.html
+    """
+
+    params = {
+        "q": query,
+        "fields": fields,
+        "species": ",".join(species),
+        "size": size,
+    }
+    url = f"{MYGENE_API_URL}/query"
+    res = await fetch(session, url, params, source=DATA_SOURCE_NAME_MYGENEINFO)
+
+    with reading_response(url):
+        return await res.json()
+
+
+async def querymany_mygene(
+    session: aiohttp.ClientSession,
+    queries: list[str],
+    scopes: str = MYGENE_QUERYMANY_SCOPES,
+    fields: str = MYGENE_QUERY_FIELDS,
+    species: list[str] = TARGET_SPECIES,
+) -> list[dict]:
+    """
+    POST /v3/query of MyGene.info API (same as `mygene.MyGeneInfo().querymany`)
+
+    Each hit has "query" key, and queries not found are returned as {"query": ..., "notfound": True}.
+
+    API docs: https://docs.mygene.info/en/latest/doc/query_service.html#batch-queries-via-post
+    """
+
+    hits: list[dict] = []
+    for i in range(0, len(queries), MYGENE_QUERYMANY_MAX_SIZE):
+        data = {
+            "q": ",".join(queries[i : i + MYGENE_QUERYMANY_MAX_SIZE]),
+            "scopes": scopes,
+            "fields": fields,
+            "species": ",".join(species),
+        }
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        url = f"{MYGENE_API_URL}/query"
+        res = await fetch(
+            session,
+            url,
+            headers=headers,
+            method="POST",
+            data=data,
+            source=DATA_SOURCE_NAME_MYGENEINFO,
+        )
+        with reading_response(url):
+            hits.extend(await res.json())
+
+    return hits
+
+
 async def search_mygene(session: aiohttp.ClientSession, query: str) -> Tuple[str, dict]:
     """
     MyGene.info API docs:
@@ -46,45 +117,31 @@ async def search_mygene(session: aiohttp.ClientSession, query: str) -> Tuple[str
     - 360 (HomoloGene)
     """
 
-    # http://ds.biogps.org/dataset/csv/<dataset ID>/gene/<NCBI gene ID>/
-
-    # fetch data from BioGPS
+    # fetch data from MyGene.info
     try:
         res = {}
 
         # MyGene.info から BioGPS のクエリをしようして NCBI Gene ID を取得する
-        try:
-            logger.info(f"search_biogps: query to MyGeneInfo API: {query}")
-            mg = mygene.MyGeneInfo()
-
-            # caution: mg.query は同期的な API しか提供していない
-            res_mg = mg.query(
-                query,
-                fields=MYGENE_QUERY_FIELDS,
-                species=TARGET_SPECIES,
-                size=100,
-            )
-
-            if res_mg.get("total", 0) == 0:
-                return (DATA_SOURCE_NAME_MYGENEINFO, {})
-
-            # preprocess and add gene annotation data to res
-            result = res_mg["hits"]
-            # sort asc by "_id" (NCBI Gene ID)
-            result = sorted(result, key=lambda x: x["_id"], reverse=True)
-            res[RESULT_KEY_GENE_ANOTATIONS] = result
-
-            logger.info(
-                f"search_mygene: gene-anotations: {len(res['gene-anotations'])}"
-            )
-        except Exception as e:
-            msg = "Error on search_mygene: failed to fetch data from MyGeneInfo API"
-            logger.error(msg)
-
-            raise FetchFromMyGeneError(f"{msg}: {e}") from e
+        logger.info(f"search_mygene: query to MyGeneInfo API: {query}")
+        res_mg = await query_mygene(session, query)
+
+        if res_mg.get("total", 0) == 0:
+            return (DATA_SOURCE_NAME_MYGENEINFO, {})
+
+        # preprocess and add gene annotation data to res
+        result = res_mg["hits"]
+        # sort asc by "_id" (NCBI Gene ID)
+        result = sorted(result, key=lambda x: x["_id"], reverse=True)
+        res[RESULT_KEY_GENE_ANOTATIONS] = result
+
+        logger.info(f"search_mygene: gene-anotations: {len(res['gene-anotations'])}")
 
         return (DATA_SOURCE_NAME_MYGENEINFO, res)
 
+    except (NotModifiedError, SourceUnavailableError):
+        # not wrapped: the cached result is used on HTTP 304,
+        # and tabs show that the data source is unavailable
+        raise
     except FetchClientResponseError as e:
         msg = "Error on search_mygene: failed to fetch data due to response error"
         logger.error(msg)
@@ -102,6 +159,11 @@ async def search_mygene(session: aiohttp.ClientSession, query: str) -> Tuple[str
         logger.error(msg)
 
         raise Exception(f"{msg}: {e}") from e
+    except Exception as e:
+        msg = "Error on search_mygene: failed to fetch data from MyGeneInfo API"
+        logger.error(msg)
+
+        raise FetchFromMyGeneError(f"{msg}: {e}") from e
 
 
 async def search_biogps(
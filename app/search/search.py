@@ -1,23 +1,40 @@
 import asyncio
 import time
-from typing import Tuple, Union
+import weakref
+from collections.abc import AsyncIterator, Awaitable, Coroutine, Iterator
+from typing import Callable, Optional, Tuple, Union
 
 import aiohttp
-import streamlit as st
 
+from app import metrics
+from app.cache import CacheEntry, get_cache, normalize_query
+from app.client import (
+    CancelToken,
+    ConditionalRequest,
+    conditional_request,
+    get_session,
+    iterate_sync,
+    run_sync,
+)
 from app.constants import (
+    BIOGPS_PREFETCH_CONCURRENCY,
+    BIOGPS_PREFETCH_MAX_GENES,
+    CACHE_NEGATIVE_TTL_SECONDS,
+    CACHE_STALE_WHILE_REVALIDATE_SOURCES,
     DATA_SOURCE_NAME_BENCHSCI,
     DATA_SOURCE_NAME_BIOGPS,
     DATA_SOURCE_NAME_DICE,
     DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
     DATA_SOURCE_NAME_MYGENEINFO,
 )
+from app.errors import CacheError, NotModifiedError
 from app.logger import create_logger
 from app.search.benchsci import search_benchsci
-from app.search.biogps import search_biogps
+from app.search.biogps import BIOGPS_SUPPORT_DATASETS, search_biogps
 from app.search.dice import search_dice
-from app.search.human_protein_atlas import search_hpa
-from app.search.mygeneinfo import search_mygene
+from app.search.human_protein_atlas import search_hpa_expression, search_hpa_genes
+from app.search.mygeneinfo import RESULT_KEY_GENE_ANOTATIONS, search_mygene
+from app.singleflight import SingleFlight
 
 logger = create_logger(__name__)
 
@@ -27,95 +44,457 @@ FetchResultType = Tuple[str, Union[HpaResultType, DiceResultType]]
 TaskResultType = Union[FetchResultType, Exception]
 DataType = Union[Union[HpaResultType, DiceResultType], Exception]
 
+# for prefetch of BioGPS datasets
+_biogps_prefetch_tasks: set[asyncio.Task] = set()
+_biogps_prefetch_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
 
-async def _search(query: str) -> Tuple[dict, float]:
-    logger.info(f"start searching by query '{query}'...")
-    start = time.time()
+# for coalescing concurrent identical searches (e.g. many users search IL2RA at the same time)
+_source_calls = SingleFlight("source")
 
-    # start async tasks
-    tasks: list = []
-    results: list[TaskResultType] = []
-    async with aiohttp.ClientSession() as session:
-        # FIXME: asyncio.TaskGroup のエラーハンドリング必要？多分必要なさそうだけど
-        # ref: https://gihyo.jp/article/2022/10/monthly-python-2210
+# for two-phase search on The Human Protein Atlas: results of each phase have other columns
+# than results of the full-column search (e.g. batch search), so they are cached under other keys
+# - phase 1: identity columns of genes hit by the query (e.g. "genes:IL2RA")
+# - phase 2: expression data per Ensembl ID (e.g. "expression:ENSG00000134460")
+CACHE_KEY_PREFIX_HPA_GENES = "genes:"
+CACHE_KEY_PREFIX_HPA_EXPRESSION = "expression:"
+_hpa_prefetch_tasks: set[asyncio.Task] = set()
 
-        # fetch from Human Protein Atlas
-        tasks.append(search_hpa(session, query))
+# for revalidation of stale cache entries in background
+_revalidate_tasks: set[asyncio.Task] = set()
+_revalidate_calls = SingleFlight("revalidate")
+
+
+def _create_background_task(coro: Coroutine, tasks: set[asyncio.Task]) -> asyncio.Task:
+    """create a task running in background, and keep strong reference to it in `tasks` until it's done"""
+
+    task = asyncio.create_task(coro)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+    return task
+
+
+async def _get_cached(source: str, query: str) -> Optional[DataType]:
+    """get cached result of data source, errors of the cache are only logged"""
+
+    try:
+        cached = await asyncio.to_thread(get_cache().get, source, query)
+        if cached is not None:
+            logger.info(f"cache hit: {source} by query '{query}'")
 
-        # fetch from DICE
-        tasks.append(search_dice(session, query))
+        return cached
+    except CacheError as e:
+        logger.error(f"Error on _get_cached: {e}")
 
+        return None
+
+
+async def _get_cached_entry(source: str, query: str) -> Optional[CacheEntry]:
+    """get cached entry of data source including stale one, errors of the cache are only logged"""
+
+    try:
+        entry = await asyncio.to_thread(get_cache().get_entry, source, query)
+        if entry is not None:
+            state = "fresh" if entry.fresh else "stale"
+            if len(entry.value) == 0:
+                state += ", not found"
+            logger.info(f"cache hit ({state}): {source} by query '{query}'")
+
+        return entry
+    except CacheError as e:
+        logger.error(f"Error on _get_cached_entry: {e}")
+
+        return None
+
+
+async def _set_cached(
+    source: str,
+    query: str,
+    res: DataType,
+    cond: Optional[ConditionalRequest] = None,
+):
+    """
+    cache result of data source with HTTP validators if any, errors of the cache are only logged
+
+    Empty result (gene not found, e.g. DICE returns status 500 for synonyms) is cached
+    with shorter TTL (negative cache) because the gene may be added later.
+    """
+
+    if res is None:
+        return
+
+    ttl_seconds = None
+    if len(res) == 0:
+        logger.info(f"negative cache: {source} by query '{query}'")
+        ttl_seconds = CACHE_NEGATIVE_TTL_SECONDS
+
+    etag = cond.response_etag if cond is not None else None
+    last_modified = cond.response_last_modified if cond is not None else None
+    try:
+        await asyncio.to_thread(
+            get_cache().set,
+            source,
+            query,
+            res,
+            ttl_seconds=ttl_seconds,
+            etag=etag,
+            last_modified=last_modified,
+        )
+    except CacheError as e:
+        logger.error(f"Error on _set_cached: {e}")
+
+
+async def _touch_cached(source: str, query: str, res: DataType):
+    """extend the expiry of cached result of data source, errors of the cache are only logged"""
+
+    ttl_seconds = CACHE_NEGATIVE_TTL_SECONDS if len(res) == 0 else None
+    try:
+        await asyncio.to_thread(get_cache().touch, source, query, ttl_seconds)
+    except CacheError as e:
+        logger.error(f"Error on _touch_cached: {e}")
+
+
+async def _fetch_and_cache(
+    source: str,
+    query: str,
+    search_func: Callable[[], Awaitable[FetchResultType]],
+    entry: Optional[CacheEntry],
+) -> DataType:
+    """
+    Call search_func and cache its result. If there is a stale cached entry,
+    requests are revalidated with its validators and the entry is reused on HTTP 304.
+    """
+
+    etag = entry.etag if entry is not None else None
+    last_modified = entry.last_modified if entry is not None else None
+    with conditional_request(etag, last_modified) as cond:
+        try:
+            _, res = await search_func()
+        except NotModifiedError:
+            if entry is None:
+                raise
+
+            await _touch_cached(source, query, entry.value)
+            return entry.value
+
+    await _set_cached(source, query, res, cond)
+
+    return res
+
+
+def _start_revalidate(
+    source: str,
+    query: str,
+    search_func: Callable[[], Awaitable[FetchResultType]],
+    entry: CacheEntry,
+):
+    """revalidate a stale cached entry in background (once per source and query at a time)"""
+
+    async def _revalidate():
+        try:
+            await _revalidate_calls.do(
+                (source, normalize_query(query)),
+                lambda: _fetch_and_cache(source, query, search_func, entry),
+            )
+        except Exception as e:
+            logger.error(f"Error on revalidating {source} by query '{query}': {e}")
+
+    _create_background_task(_revalidate(), _revalidate_tasks)
+
+
+async def _search_with_cache(
+    source: str,
+    query: str,
+    search_func: Callable[[], Awaitable[FetchResultType]],
+    serve_stale: bool = True,
+) -> FetchResultType:
+    """
+    Return the cached result of data source if any, otherwise call search_func and cache its result.
+
+    An expired (stale) result is revalidated with HTTP validators (ETag, Last-Modified).
+    For data sources in `CACHE_STALE_WHILE_REVALIDATE_SOURCES`, it is returned immediately
+    and revalidated in background, unless `serve_stale` is False (e.g. batch search exports
+    the data, and background revalidation would be cut off when the CLI exits).
+
+    Errors of the cache never fail the search, they are only logged.
+    Concurrent calls with the same source and query share one in-flight call.
+    """
+
+    async def _call() -> FetchResultType:
+        entry = await _get_cached_entry(source, query)
+        if entry is not None and entry.fresh:
+            return (source, entry.value)
+
+        if (
+            entry is not None
+            and serve_stale
+            and source in CACHE_STALE_WHILE_REVALIDATE_SOURCES
+        ):
+            _start_revalidate(source, query, search_func, entry)
+            return (source, entry.value)
+
+        res = await _fetch_and_cache(source, query, search_func, entry)
+
+        return (source, res)
+
+    # calls not serving stale results must not join calls which may serve them
+    return await _source_calls.do((source, normalize_query(query), serve_stale), _call)
+
+
+def _create_search_tasks(
+    session: aiohttp.ClientSession, query: str
+) -> list[Tuple[str, Awaitable[FetchResultType]]]:
+    """create (data source name, coroutine) pairs to search all data sources by query"""
+
+    return [
+        # fetch from Human Protein Atlas
+        (
+            DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+            _search_with_cache(
+                DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+                CACHE_KEY_PREFIX_HPA_GENES + normalize_query(query),
+                lambda: search_hpa_genes(session, query),
+            ),
+        ),
+        # fetch from DICE
+        (
+            DATA_SOURCE_NAME_DICE,
+            _search_with_cache(
+                DATA_SOURCE_NAME_DICE, query, lambda: search_dice(session, query)
+            ),
+        ),
         # fetch from BioGPS (MyGene.info)
-        tasks.append(search_mygene(session, query))
-
+        (
+            DATA_SOURCE_NAME_MYGENEINFO,
+            _search_with_cache(
+                DATA_SOURCE_NAME_MYGENEINFO,
+                query,
+                lambda: search_mygene(session, query),
+            ),
+        ),
         # fetch from BenchSci
-        tasks.append(search_benchsci(session, query))
+        (DATA_SOURCE_NAME_BENCHSCI, search_benchsci(session, query)),
+    ]
 
-        # await all tasks
-        results = await asyncio.gather(*tasks, return_exceptions=True)
 
-    # extract each result
-    data: dict[str, DataType] = {}
+def select_biogps_prefetch_genes(
+    query: str, gene_anotations: list[dict], max_genes: int = BIOGPS_PREFETCH_MAX_GENES
+) -> list[str]:
+    """
+    Select NCBI Gene IDs whose BioGPS datasets are likely to be viewed:
+    the gene selected by default in the BioGPS tab (matching the query, or the first one)
+    and the top-ranked gene by MyGene.info score.
+    """
 
-    # caution: result の結果の順序は tasks.append した順番になるので注意
-    # FIXME: もうちょっときれいに書けないかな。raise しないで Exception を戻り値にするとか
-    for db_name, result in zip(
-        [
-            DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
-            DATA_SOURCE_NAME_DICE,
-            DATA_SOURCE_NAME_MYGENEINFO,
-            DATA_SOURCE_NAME_BENCHSCI,
+    if len(gene_anotations) == 0:
+        return []
+
+    default = next(
+        (g for g in gene_anotations if g.get("symbol") == query), gene_anotations[0]
+    )
+    top_ranked = max(gene_anotations, key=lambda g: g.get("_score") or 0)
+
+    ncbi_gene_ids: list[str] = []
+    for g in [default, top_ranked]:
+        if "_id" in g and g["_id"] not in ncbi_gene_ids:
+            ncbi_gene_ids.append(g["_id"])
+
+    return ncbi_gene_ids[:max_genes]
+
+
+async def _prefetch_biogps(ncbi_gene_ids: list[str]):
+    """fetch all supported BioGPS datasets of genes concurrently to populate the result cache"""
+
+    loop = asyncio.get_running_loop()
+    semaphore = _biogps_prefetch_semaphores.get(loop)
+    if semaphore is None:
+        # shared by all prefetches on the loop not to hammer ds.biogps.org
+        semaphore = asyncio.Semaphore(BIOGPS_PREFETCH_CONCURRENCY)
+        _biogps_prefetch_semaphores[loop] = semaphore
+
+    session = await get_session()
+
+    async def _prefetch(dataset_id: str, ncbi_gene_id: str):
+        # wait for the semaphore before joining the in-flight call of the dataset, so that
+        # the dataset selected on the tab meanwhile is fetched right away by its own call
+        # instead of waiting behind prefetches of other datasets
+        async with semaphore:
+            await _search_with_cache(
+                DATA_SOURCE_NAME_BIOGPS,
+                f"{dataset_id}/{ncbi_gene_id}",
+                lambda: search_biogps(session, dataset_id, ncbi_gene_id),
+            )
+
+    # datasets selected by default on the tab (the first dataset of each gene) come first
+    logger.info(f"start prefetching BioGPS datasets of genes {ncbi_gene_ids}...")
+    results = await asyncio.gather(
+        *[
+            _prefetch(dataset["dataset_id"], ncbi_gene_id)
+            for dataset in BIOGPS_SUPPORT_DATASETS
+            for ncbi_gene_id in ncbi_gene_ids
         ],
-        results,
-    ):
+        return_exceptions=True,
+    )
+    for result in results:
         if isinstance(result, Exception):
-            logger.error(f"Error on _search query '{query}': {result}")
-            data[db_name] = result
-            continue
+            logger.error(f"Error on _prefetch_biogps: {result}")
+    logger.info(f"end prefetching BioGPS datasets of genes {ncbi_gene_ids}")
 
-        _, res = result
-        data[db_name] = res
+
+def start_biogps_prefetch(query: str, data_mygene: DataType) -> Optional[asyncio.Task]:
+    """start prefetching BioGPS datasets in background by the result of MyGene.info"""
+
+    if not isinstance(data_mygene, dict) or len(data_mygene) == 0:
+        return None
+
+    ncbi_gene_ids = select_biogps_prefetch_genes(
+        query, data_mygene.get(RESULT_KEY_GENE_ANOTATIONS, [])
+    )
+    if len(ncbi_gene_ids) == 0:
+        return None
+
+    return _create_background_task(
+        _prefetch_biogps(ncbi_gene_ids), _biogps_prefetch_tasks
+    )
+
+
+async def _search_hpa_expression_cached(
+    session: aiohttp.ClientSession, ensembl_id: str
+) -> FetchResultType:
+    """phase 2 of two-phase search on The Human Protein Atlas, cached per Ensembl ID"""
+
+    return await _search_with_cache(
+        DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+        CACHE_KEY_PREFIX_HPA_EXPRESSION + ensembl_id,
+        lambda: search_hpa_expression(session, ensembl_id),
+    )
+
+
+def start_hpa_expression_prefetch(data_hpa: DataType) -> Optional[asyncio.Task]:
+    """start prefetching expression data of the gene selected by default (the first one) in background"""
+
+    if not isinstance(data_hpa, list) or len(data_hpa) == 0:
+        return None
+
+    ensembl_id = data_hpa[0].get("Ensembl")
+    if not ensembl_id:
+        return None
+
+    async def _prefetch():
+        try:
+            await _search_hpa_expression_cached(await get_session(), ensembl_id)
+        except Exception as e:
+            logger.error(f"Error on prefetching expression data of {ensembl_id}: {e}")
+
+    return _create_background_task(_prefetch(), _hpa_prefetch_tasks)
+
+
+async def _search_stream(
+    query: str, prefetch_biogps: bool = True, token: Optional[CancelToken] = None
+) -> AsyncIterator[Tuple[str, DataType]]:
+    """
+    Search all data sources concurrently and yield (data source name, result) as soon as each one returns.
+
+    If searching a data source fails, the exception is yielded as its result.
+    When MyGene.info returns, BioGPS datasets of the likely viewed genes are prefetched in background.
+    Prefetches are bound to the token, so they're cancelled with the search superseded by a new query.
+    """
+
+    logger.info(f"start searching by query '{query}'...")
+    start = time.time()
+
+    # note: session is pooled and shared by all searches, so don't close it here
+    session = await get_session()
+
+    async def _run(db_name: str, task: Awaitable[FetchResultType]):
+        try:
+            _, res = await task
+            return db_name, res
+        except Exception as e:
+            logger.error(f"Error on _search query '{query}': {e}")
+            return db_name, e
+
+    tasks = [
+        asyncio.create_task(_run(db_name, task))
+        for db_name, task in _create_search_tasks(session, query)
+    ]
+
+    prefetch_tasks: list[asyncio.Task] = []
+    is_completed = False
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            db_name, res = await next_done
+            logger.info(
+                f"done searching {db_name} by query '{query}' (takes {time.time() - start:.4f} sec)"
+            )
+
+            prefetch_task = None
+            if prefetch_biogps and db_name == DATA_SOURCE_NAME_MYGENEINFO:
+                prefetch_task = start_biogps_prefetch(query, res)
+            if db_name == DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS:
+                prefetch_task = start_hpa_expression_prefetch(res)
+            if prefetch_task is not None:
+                prefetch_tasks.append(prefetch_task)
+                if token is not None:
+                    token.bind(prefetch_task)
+
+            yield db_name, res
+
+        is_completed = True
+    finally:
+        # cancel remaining tasks if the consumer stops iteration early
+        for task in tasks:
+            task.cancel()
+
+        # prefetch outlives the search, but not a search stopped early
+        if not is_completed:
+            for task in prefetch_tasks:
+                task.cancel()
 
     end = time.time()
     diff = end - start
     logger.info(f"end searching by query '{query}' (takes {diff:.4f} sec)")
 
-    return data, end - start
+    # latency, hit rate of caches, etc. of the process so far
+    logger.info(f"metrics: {metrics.snapshot()}")
 
 
-@st.cache_data
-def search(query: str) -> Tuple[dict, float]:
-    """sync wrapper for caching API responses on streamlit"""
-    return asyncio.run(_search(query))
+def search_stream(
+    query: str,
+    token: Optional[CancelToken] = None,
+    on_wait: Optional[Callable[[], None]] = None,
+) -> Iterator[Tuple[str, DataType]]:
+    """
+    sync wrapper of _search_stream to render each result on streamlit as soon as it returns
+
+    The search is cancelled when the token is cancelled or `on_wait` (called periodically
+    while waiting for results) raises, e.g. the script run is superseded by a new query.
+    Results already returned are cached.
+    """
+    return iterate_sync(
+        _search_stream(query, token=token), token=token, on_wait=on_wait
+    )
 
 
 async def _search_biogps(dataset_id: str, ncbi_gene_id: str) -> Tuple[dict, float]:
-    """search_biogps の非同期版"""
+    """search_biogps の非同期版 (concurrent calls with the same arguments share one in-flight call of _search_with_cache)"""
 
     logger.info(
         f"start searching BioGPS by dataset_id '{dataset_id}' and ncbi_gene_id '{ncbi_gene_id}'..."
     )
     start = time.time()
 
-    # start async tasks
-    tasks: list = []
-    results: list[TaskResultType] = []
-    async with aiohttp.ClientSession() as session:
-        tasks.append(search_biogps(session, dataset_id, ncbi_gene_id))
-
-        # await all tasks
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # extract each result
     data: dict[str, DataType] = {}
-    for db_name, result in zip([DATA_SOURCE_NAME_BIOGPS], results):
-        if isinstance(result, Exception):
-            logger.error(f"Error on _search_biogps: {result}")
-            data[db_name] = result
-            continue
-
-        _, res = result
-        data[db_name] = res
+    session = await get_session()
+    try:
+        _, data[DATA_SOURCE_NAME_BIOGPS] = await _search_with_cache(
+            DATA_SOURCE_NAME_BIOGPS,
+            f"{dataset_id}/{ncbi_gene_id}",
+            lambda: search_biogps(session, dataset_id, ncbi_gene_id),
+        )
+    except Exception as e:
+        logger.error(f"Error on _search_biogps: {e}")
+        data[DATA_SOURCE_NAME_BIOGPS] = e
 
     end = time.time()
     diff = end - start
@@ -126,12 +505,28 @@ async def _search_biogps(dataset_id: str, ncbi_gene_id: str) -> Tuple[dict, floa
     return data, end - start
 
 
-@st.cache_data
 def search_biogps_sync(dataset_id: str, ncbi_gene_id: str) -> Tuple[dict, float]:
-    """sync wrapper for caching BioGPS API responses on streamlit"""
+    """sync wrapper of _search_biogps (API responses are cached on disk, see app.cache)"""
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    data, _ = loop.run_until_complete(_search_biogps(dataset_id, ncbi_gene_id))
+    data, _ = run_sync(_search_biogps(dataset_id, ncbi_gene_id))
 
     return data[DATA_SOURCE_NAME_BIOGPS]
+
+
+async def _search_hpa_expression(ensembl_id: str) -> DataType:
+    session = await get_session()
+    try:
+        _, res = await _search_hpa_expression_cached(session, ensembl_id)
+        return res
+    except Exception as e:
+        logger.error(f"Error on _search_hpa_expression: {e}")
+        return e
+
+
+def search_hpa_expression_sync(ensembl_id: str) -> DataType:
+    """
+    sync wrapper of phase 2 of two-phase search on The Human Protein Atlas:
+    expression data of the gene by Ensembl ID, {} if not found, or the exception on error
+    """
+
+    return run_sync(_search_hpa_expression(ensembl_id))
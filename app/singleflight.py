@@ -0,0 +1,73 @@
+import asyncio
+import weakref
+from collections.abc import Awaitable, Hashable
+from typing import Any, Callable, TypeVar
+
+from app import metrics
+from app.logger import create_logger
+
+logger = create_logger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    """in-flight call shared by waiters"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one in-flight call.
+
+    While a call of a key is in flight, later calls of the same key wait for it
+    instead of calling `func` again, and all of them receive the same result
+    (or exception). So results must not be mutated by callers.
+
+    The shared call is cancelled only when all of its waiters are cancelled.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+        # tasks are bound to the event loop, so keep in-flight calls per loop
+        self._calls: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[Hashable, _Call]]" = weakref.WeakKeyDictionary()
+
+    def _get_calls(self) -> dict[Hashable, _Call]:
+        return self._calls.setdefault(asyncio.get_running_loop(), {})
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        calls = self._get_calls()
+        call = calls.get(key)
+        if call is None:
+            call = calls[key] = _Call(asyncio.ensure_future(func()))
+
+            def _forget(_: Any, call: _Call = call):
+                if calls.get(key) is call:
+                    del calls[key]
+
+            call.task.add_done_callback(_forget)
+        else:
+            logger.info(f"share in-flight call of {self.name}: {key}")
+            metrics.increment(f"singleflight_shared:{self.name}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # forget the call first, so that later calls of the key don't join
+                # the cancelled one before it finishes, but start a new one
+                if calls.get(key) is call:
+                    del calls[key]
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def in_flight(self) -> int:
+        """number of in-flight calls on the running event loop"""
+        return len(self._get_calls())
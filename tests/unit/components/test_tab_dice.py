@@ -0,0 +1,22 @@
+from streamlit.testing.v1 import AppTest
+
+
+def _app(data_dice: bytes):
+    from app.components.tabs.tab_search_result_rna_dice import tab_inner_dice
+    from app.constants import DATA_SOURCE_NAME_DICE
+
+    tab_inner_dice("IL2RA", {DATA_SOURCE_NAME_DICE: data_dice})
+
+
+def test_tab_inner_dice_without_data():
+    # テスト項目: 正常系: ヘッダーのみの CSV の場合、エラーにならず "No data found" の警告が表示される
+    # given (前提条件):
+    at = AppTest.from_function(_app, args=(b'"header"\n',))
+
+    # when (操作):
+    at.run()
+
+    # then (期待する結果):
+    assert not at.exception
+    assert at.warning[0].value == "No data found by query: `IL2RA`"
+    assert len(at.get("plotly_chart")) == 0
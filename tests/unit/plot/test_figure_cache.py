@@ -0,0 +1,78 @@
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from app.constants import DATA_SOURCE_NAME_BIOGPS, DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
+from app.plot.figure_cache import FigureCache, FigureKey
+
+
+def build_figure(n: int = 100) -> go.Figure:
+    return go.Figure(go.Bar(x=list(range(n)), y=list(range(n))))
+
+
+def test_figure_cache_get_or_build():
+    # テスト項目: 正常系: 同じキーの figure は一度だけ構築され、以降はキャッシュから取得される
+    # given (前提条件):
+    cache = FigureCache(max_bytes=1024 * 1024)
+    key = FigureKey(DATA_SOURCE_NAME_BIOGPS, "3559", "BDS_00001", "211269_s_at")
+    built = []
+
+    def build() -> go.Figure:
+        built.append(key)
+        return build_figure()
+
+    # when (操作):
+    first = cache.get_or_build(key, build)
+    second = cache.get_or_build(key, build)
+
+    # then (期待する結果):
+    assert first is second
+    assert len(built) == 1
+    assert cache.size_bytes == len(pio.to_json(first, validate=False))
+
+
+def test_figure_cache_key_with_layout_version():
+    # テスト項目: 正常系: レイアウトのバージョンが異なるキーではキャッシュにヒットしない
+    # given (前提条件):
+    cache = FigureCache(max_bytes=1024 * 1024)
+    key = FigureKey(DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, "ENSG00000134460")
+    cache.set(key, build_figure())
+
+    # when (操作):
+    actual = cache.get(key._replace(layout_version=key.layout_version + 1))
+
+    # then (期待する結果):
+    assert actual is None
+
+
+def test_figure_cache_evicts_least_recently_used():
+    # テスト項目: 正常系: 合計サイズが上限を超えたとき、最も長く使われていない figure から削除される
+    # given (前提条件):
+    size = len(pio.to_json(build_figure(), validate=False))
+    cache = FigureCache(max_bytes=size * 2 + size // 2)
+    keys = [FigureKey(DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, g) for g in "ABC"]
+    cache.set(keys[0], build_figure())
+    cache.set(keys[1], build_figure())
+    cache.get(keys[0])  # "B" becomes least recently used
+
+    # when (操作):
+    cache.set(keys[2], build_figure())
+
+    # then (期待する結果):
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache.size_bytes == size * 2
+
+
+def test_figure_cache_skips_too_large_figure():
+    # テスト項目: 正常系: 上限より大きい figure はキャッシュしない
+    # given (前提条件):
+    cache = FigureCache(max_bytes=100)
+    key = FigureKey(DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, "ENSG00000134460")
+
+    # when (操作):
+    cache.set(key, build_figure())
+
+    # then (期待する結果):
+    assert cache.get(key) is None
+    assert len(cache) == 0
@@ -1,6 +1,11 @@
+import numpy as np
 import pytest
 
-from app.plot.human_protein_atlas import modify_tissue_data_key
+from app.plot.human_protein_atlas import (
+    TISSUE_LAYOUT,
+    TISSUE_PLOT_ATTRIBUTES,
+    modify_tissue_data_key,
+)
 
 
 @pytest.mark.parametrize(
@@ -17,3 +22,33 @@ def test_modify_tissue_data_key(input: str, expected: str):
     actual = modify_tissue_data_key(input)
 
     assert actual == expected
+
+
+def test_tissue_layout():
+    # テスト項目: 正常系: HPA のレコードのカラムが TISSUE_PLOT_ATTRIBUTES の順序の位置に対応する
+    assert sorted(TISSUE_LAYOUT.positions.values()) == list(range(len(TISSUE_LAYOUT)))
+    for k, i in TISSUE_LAYOUT.positions.items():
+        assert TISSUE_LAYOUT.tissues[i] == modify_tissue_data_key(k)
+        assert TISSUE_PLOT_ATTRIBUTES[i]["tissue"] == TISSUE_LAYOUT.tissues[i]
+        assert TISSUE_PLOT_ATTRIBUTES[i]["color"] == TISSUE_LAYOUT.colors[i]
+
+
+def test_tissue_layout_scatter():
+    # テスト項目: 正常系: レコードの nTPM (文字列) をプロット順の float32 の配列に変換し、欠損値は NaN とする
+    # given (前提条件):
+    record = {
+        "Gene": "IL2RA",
+        "Tissue RNA - liver [nTPM]": "1.5",
+        "Tissue RNA - skin 1 [nTPM]": "0.0",
+        "Tissue RNA - lung [nTPM]": "",
+    }
+
+    # when (操作):
+    actual = TISSUE_LAYOUT.scatter(record)
+
+    # then (期待する結果):
+    tissues = list(TISSUE_LAYOUT.tissues)
+    assert actual.dtype == np.float32
+    assert actual[tissues.index("Liver")] == 1.5
+    assert actual[tissues.index("Skin")] == 0.0
+    assert np.count_nonzero(~np.isnan(actual)) == 2
@@ -0,0 +1,99 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app.preprocess.biogps as biogps
+from app.cache import ResultCache
+from app.errors import PreprocessError
+from app.preprocess.biogps import (
+    CACHE_SOURCE_SAMPLE_INDEX,
+    aggregate_biogps_csv,
+    get_sample_index,
+)
+
+SAMPLE_BIOGPS_PATH = "sample/biogps/download/IL2RA_GeneAtlas-U133A-gcrma.csv"
+
+
+@pytest.fixture
+def sample_data() -> bytes:
+    with open(SAMPLE_BIOGPS_PATH, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch) -> ResultCache:
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(biogps, "get_cache", lambda: cache)
+    monkeypatch.setattr(biogps, "_sample_indexes", {})
+    return cache
+
+
+def test_aggregate_biogps_csv_matches_per_probeset_groupby(sample_data: bytes):
+    # テスト項目: 正常系: サンプルグループのインデックスで計算した値が probeset ごとに groupby した値と一致する
+    # given (前提条件):
+    df = pd.read_csv(io.BytesIO(sample_data)).set_index("Samples")
+
+    # when (操作):
+    expression = aggregate_biogps_csv(sample_data)
+
+    # then (期待する結果):
+    assert expression.probesets == df.columns.tolist()
+    assert expression.raw.index.tolist() == df.index.tolist()
+    for p in expression.probesets:
+        grouped = df[p].groupby(df[p].index.str.extract(r"([^\.]+)", expand=False))
+        expected = pd.concat(
+            [
+                grouped.mean().rename(f"{p}_mean"),
+                grouped.std(ddof=1).rename(f"{p}_std"),
+            ],
+            axis=1,
+        ).sort_index(ascending=False)
+
+        actual = expression.probeset_frame(p)
+        assert actual.index.tolist() == expected.index.tolist()
+        np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-5)
+
+
+def test_aggregate_biogps_csv_invalid_data():
+    # テスト項目: 異常系: "Samples" カラムがない CSV は PreprocessError を送出する
+    # given (前提条件):
+    data = b"foo,bar\n1,2\n"
+
+    # when (操作), then (期待する結果):
+    with pytest.raises(PreprocessError):
+        aggregate_biogps_csv(data)
+
+
+def test_get_sample_index_persisted(cache: ResultCache):
+    # テスト項目: 正常系: データセットのインデックスは一度だけ作られ、キャッシュから読み込まれる
+    # given (前提条件):
+    samples = ["Liver.1", "Liver.2", "Brain.1"]
+    index = get_sample_index("GSE1133", samples)
+    biogps._sample_indexes.clear()
+
+    # when (操作):
+    actual = get_sample_index("GSE1133", samples)
+
+    # then (期待する結果):
+    assert actual.groups == ["Liver", "Brain"]
+    assert actual.group_ids.tolist() == [0, 0, 1]
+    assert actual.group_sizes.tolist() == [2, 1]
+    assert actual.to_json() == index.to_json()
+    assert cache.get(CACHE_SOURCE_SAMPLE_INDEX, "v1/GSE1133") == index.to_json()
+
+
+def test_get_sample_index_rebuild_on_mismatch(cache: ResultCache):
+    # テスト項目: 正常系: ダウンロードした CSV のサンプルがインデックスと異なる場合は作り直す
+    # given (前提条件):
+    get_sample_index("GSE1133", ["Liver.1", "Brain.1"])
+    samples = ["Liver.1", "Heart.1"]
+
+    # when (操作):
+    actual = get_sample_index("GSE1133", samples)
+
+    # then (期待する結果):
+    assert actual.samples == samples
+    assert actual.groups == ["Liver", "Heart"]
+    assert cache.get(CACHE_SOURCE_SAMPLE_INDEX, "v1/GSE1133")["samples"] == samples
@@ -0,0 +1,89 @@
+import csv
+import io
+import statistics
+
+import numpy as np
+import pytest
+
+from app.errors import PreprocessError
+from app.preprocess.dice import parse_dice_csv
+
+SAMPLE_DICE_PATH = "sample/dice/download/IL2RA_Expression_data.csv"
+
+
+@pytest.fixture
+def sample_data() -> bytes:
+    with open(SAMPLE_DICE_PATH, "rb") as f:
+        return f.read()
+
+
+def test_parse_dice_csv_statistics(sample_data: bytes):
+    # テスト項目: 正常系: 細胞種ごとの統計量が statistics モジュールで計算した値と一致する
+    # given (前提条件):
+    reader = csv.reader(io.StringIO(sample_data.decode("utf-8")))
+    next(reader)
+    rows = [(row[0], list(map(float, row[1:]))) for row in reader]
+
+    # when (操作):
+    expression = parse_dice_csv(sample_data)
+
+    # then (期待する結果):
+    assert expression.cell_types == [cell_type for cell_type, _ in rows]
+    for i, (_, values) in enumerate(rows):
+        assert expression.mean[i] == pytest.approx(statistics.mean(values))
+        assert expression.median[i] == pytest.approx(statistics.median(values))
+        assert expression.min[i] == min(values)
+        assert expression.max[i] == max(values)
+        assert expression.q1[i] == pytest.approx(np.quantile(values, 0.25))
+        assert expression.q3[i] == pytest.approx(np.quantile(values, 0.75))
+        assert expression.samples(i).tolist() == sorted(values)
+
+        iqr = expression.q3[i] - expression.q1[i]
+        inside = [
+            v
+            for v in values
+            if expression.q1[i] - 1.5 * iqr <= v <= expression.q3[i] + 1.5 * iqr
+        ]
+        assert expression.lowerfence[i] == min(inside)
+        assert expression.upperfence[i] == max(inside)
+
+
+def test_parse_dice_csv_ragged_rows():
+    # テスト項目: 正常系: 細胞種ごとにレプリケート数が異なる CSV を読み込める
+    # given (前提条件):
+    data = b'"header, text"\n"B cell, naive",3,1,2\nMonocyte,5\n"NK cell",\n'
+
+    # when (操作):
+    expression = parse_dice_csv(data)
+
+    # then (期待する結果):
+    assert expression.cell_types == ["B cell, naive", "Monocyte"]
+    assert expression.offsets.tolist() == [0, 3, 4]
+    assert expression.median.tolist() == [2.0, 5.0]
+    assert expression.to_dataframe().loc["B cell, naive", "mean"] == 2.0
+
+
+def test_parse_dice_csv_invalid_value():
+    # テスト項目: 異常系: 数値でない値が含まれる場合、PreprocessError が raise される
+    data = b'"header"\n"B cell, naive",1,abc\n'
+
+    with pytest.raises(PreprocessError):
+        parse_dice_csv(data)
+
+
+def test_parse_dice_csv_without_data():
+    # テスト項目: 正常系: ヘッダーのみの CSV の場合、空の結果が返る
+    expression = parse_dice_csv(b'"header"\n')
+
+    assert len(expression) == 0
+    assert expression.to_dataframe().empty
+
+
+def test_parse_dice_csv_fences_exclude_outliers():
+    # テスト項目: 正常系: 外れ値はひげ (fence) の範囲に含まれない
+    data = b'"header"\nMonocyte,1,2,3,4,100\n'
+
+    expression = parse_dice_csv(data)
+
+    assert expression.lowerfence.tolist() == [1.0]
+    assert expression.upperfence.tolist() == [4.0]
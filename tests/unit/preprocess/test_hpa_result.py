@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.plot.human_protein_atlas import TISSUE_LAYOUT
+from app.preprocess.human_protein_atlas import HpaResult
+
+SAMPLE_RESPONSE_PATH = (
+    "sample/human_protein_atlas/api_response/response_query_IL2RA.json"
+)
+
+
+@pytest.fixture
+def records() -> list[dict]:
+    with open(SAMPLE_RESPONSE_PATH) as f:
+        return json.load(f)
+
+
+def test_hpa_result_index(records: list[dict]):
+    # テスト項目: 正常系: 遺伝子シンボル、Ensembl ID のどちらでも遺伝子を検索できる
+    # given (前提条件):
+    result = HpaResult(records)
+
+    # when (操作):
+    by_symbol = result.find(records[1]["Gene"])
+    by_ensembl_id = result.find(records[1]["Ensembl"])
+
+    # then (期待する結果):
+    assert len(result) == len(records)
+    assert by_symbol is by_ensembl_id
+    assert by_symbol.gene == records[1]["Gene"]
+    assert by_symbol.synonyms == tuple(records[1]["Gene synonym"])
+    assert result.find("UNKNOWN_GENE") is None
+
+
+def test_hpa_result_expression_decoded_lazily(records: list[dict]):
+    # テスト項目: 正常系: 発現量のカラムを含むレコードは、初めて参照されたときに float32 の配列にデコードされる
+    # given (前提条件):
+    result = HpaResult(records)
+    ensembl_id = records[0]["Ensembl"]
+
+    # when (操作):
+    actual = result.expression(ensembl_id)
+
+    # then (期待する結果):
+    expected = np.zeros(len(TISSUE_LAYOUT))
+    for k, i in TISSUE_LAYOUT.positions.items():
+        expected[i] = float(records[0][k])
+    assert actual.nTPM.dtype == np.float32
+    np.testing.assert_allclose(actual.nTPM, expected, rtol=1e-6)
+    assert (
+        actual.metadata["RNA tissue specificity"]
+        == records[0]["RNA tissue specificity"]
+    )
+    assert result.expression(ensembl_id) is actual
+
+
+def test_hpa_result_set_expression(records: list[dict]):
+    # テスト項目: 正常系: 識別情報のみのレコードでは発現量はなく、2 段階目の検索結果を set_expression で追加できる
+    # given (前提条件):
+    identity_columns = ["Gene", "Gene synonym", "Ensembl", "Gene description"]
+    result = HpaResult([{k: r[k] for k in identity_columns} for r in records])
+    ensembl_id = records[0]["Ensembl"]
+    assert result.expression(ensembl_id) is None
+
+    # when (操作):
+    column, *_ = TISSUE_LAYOUT.positions
+    result.set_expression(ensembl_id, {**records[0], column: None})
+
+    # then (期待する結果):
+    actual = result.expression(ensembl_id)
+    assert np.isnan(actual.nTPM[TISSUE_LAYOUT.positions[column]])
+    assert np.count_nonzero(np.isnan(actual.nTPM)) == 1
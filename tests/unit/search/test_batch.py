@@ -0,0 +1,224 @@
+import json
+
+import pytest
+
+import app.search.batch as batch
+import app.search.search as search
+from app.cache import ResultCache
+from app.constants import (
+    DATA_SOURCE_NAME_BIOGPS,
+    DATA_SOURCE_NAME_DICE,
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+    DATA_SOURCE_NAME_MYGENEINFO,
+)
+from app.export import tidy_hpa
+from app.search.batch import (
+    BatchSearchResult,
+    search_batch,
+    select_hpa_record,
+    unique_genes,
+)
+from app.search.mygeneinfo import RESULT_KEY_GENE_ANOTATIONS
+
+SAMPLE_HPA_PATH = "sample/human_protein_atlas/api_response/response_query_{}.json"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch) -> ResultCache:
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(search, "get_cache", lambda: cache)
+
+    return cache
+
+
+@pytest.fixture
+def fake_sources(cache: ResultCache, monkeypatch) -> dict:
+    """replace data sources with fakes and count requests to each of them"""
+
+    calls: dict = {"hpa": [], "dice": [], "mygene": [], "biogps": []}
+
+    async def fake_search_hpa(session, query):
+        calls["hpa"].append(query)
+        genes = [g for g in query.split(" OR ") if g != "CD25"]
+        records = [{"Gene": g, "Tissue RNA - liver [nTPM]": "1.5"} for g in genes]
+        return DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, records
+
+    async def fake_search_dice(session, query):
+        calls["dice"].append(query)
+        if query == "CD25":
+            raise Exception("DICE is down")
+        return DATA_SOURCE_NAME_DICE, f"{query},1.0\n".encode()
+
+    async def fake_querymany_mygene(session, queries):
+        calls["mygene"].append(queries)
+        return [{"query": q, "_id": str(i), "symbol": q} for i, q in enumerate(queries)]
+
+    async def fake_search_biogps(session, dataset_id, ncbi_gene_id):
+        calls["biogps"].append((dataset_id, ncbi_gene_id))
+        return DATA_SOURCE_NAME_BIOGPS, b"Samples,probe\n"
+
+    monkeypatch.setattr(batch, "search_hpa", fake_search_hpa)
+    monkeypatch.setattr(batch, "search_dice", fake_search_dice)
+    monkeypatch.setattr(batch, "querymany_mygene", fake_querymany_mygene)
+    monkeypatch.setattr(batch, "search_biogps", fake_search_biogps)
+
+    return calls
+
+
+async def collect(genes: list[str]) -> list[BatchSearchResult]:
+    return [r async for r in search_batch(genes, biogps_dataset_ids=["GSE1133"])]
+
+
+def test_unique_genes():
+    actual = unique_genes([" IL2RA", "ERBB2", "", "IL2RA "])
+
+    assert actual == ["IL2RA", "ERBB2"]
+
+
+@pytest.mark.parametrize(
+    "gene, expected",
+    [
+        ("IL2RA", "IL2RA"),
+        ("il2ra", "IL2RA"),
+        ("CD25", "IL2RA"),  # synonym
+        ("UNKNOWN", "IL2RA"),  # first hit
+        ("HEM45", "ISG20"),  # synonym
+    ],
+)
+def test_select_hpa_record(gene: str, expected: str):
+    # テスト項目: 正常系: 遺伝子名または別名が一致するレコード、なければ最初のレコードが選ばれる
+    with open(SAMPLE_HPA_PATH.format("CD25")) as f:
+        records = json.load(f)  # IL2RA, ISG20 (synonym CD25), ...
+
+    actual = select_hpa_record(gene, records)
+
+    assert actual["Gene"] == expected
+
+
+@pytest.mark.asyncio
+async def test_search_batch_success(fake_sources: dict):
+    # テスト項目: 正常系: 遺伝子・データソースごとに結果が返り、MyGene.info と HPA はまとめて検索される
+    # given (前提条件):
+    genes = ["IL2RA", "ERBB2"]
+
+    # when (操作):
+    results = await collect(genes)
+
+    # then (期待する結果):
+    actual = {(r.gene, r.source) for r in results if r.ok}
+    assert actual == {
+        (gene, source)
+        for gene in genes
+        for source in [
+            DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+            DATA_SOURCE_NAME_DICE,
+            DATA_SOURCE_NAME_MYGENEINFO,
+            DATA_SOURCE_NAME_BIOGPS,
+        ]
+    }
+    assert fake_sources["mygene"] == [genes]
+    assert fake_sources["hpa"] == ["IL2RA OR ERBB2"]
+    mygene = [r for r in results if r.source == DATA_SOURCE_NAME_MYGENEINFO]
+    assert all(RESULT_KEY_GENE_ANOTATIONS in r.data for r in mygene)
+
+
+@pytest.mark.asyncio
+async def test_search_batch_reports_error_per_source(fake_sources: dict):
+    # テスト項目: 異常系: データソースのエラーは例外を送出せず、遺伝子・データソースごとに報告される
+    # given (前提条件):
+    genes = ["IL2RA", "CD25"]
+
+    # when (操作):
+    results = await collect(genes)
+
+    # then (期待する結果):
+    errors = [(r.gene, r.source) for r in results if not r.ok]
+    assert errors == [("CD25", DATA_SOURCE_NAME_DICE)]
+    # CD25 is not found by multi-term search, so it is searched alone
+    assert fake_sources["hpa"] == ["IL2RA OR CD25", "CD25"]
+
+
+@pytest.mark.asyncio
+async def test_search_batch_uses_cache(fake_sources: dict):
+    # テスト項目: 正常系: 2 回目の検索ではキャッシュが使われ、データソースにリクエストしない
+    # given (前提条件):
+    genes = ["IL2RA", "ERBB2"]
+    first = await collect(genes)
+    for calls in fake_sources.values():
+        calls.clear()
+
+    # when (操作):
+    second = await collect(genes)
+
+    # then (期待する結果):
+    assert all(len(calls) == 0 for calls in fake_sources.values())
+    assert len(second) == len(first)
+
+
+@pytest.mark.asyncio
+async def test_search_batch_after_interactive_search(fake_sources: dict, monkeypatch):
+    # テスト項目: 正常系: Web 画面の検索 (1 段階目) でキャッシュされた識別情報のみの結果は、バッチ検索では使われない
+    # given (前提条件):
+    async def fake_search_hpa_genes(session, query):
+        return DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, [{"Gene": query}]
+
+    monkeypatch.setattr(search, "search_hpa_genes", fake_search_hpa_genes)
+    (source, task), *others = search._create_search_tasks(None, "IL2RA")
+    for _, other in others:
+        other.close()
+    assert source == DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
+    await task
+
+    # when (操作):
+    results = await collect(["IL2RA"])
+
+    # then (期待する結果):
+    (hpa,) = (r for r in results if r.source == DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS)
+    assert fake_sources["hpa"] == ["IL2RA"]
+    assert len(tidy_hpa(hpa.gene, hpa.data)) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("genes", [["CD25"], ["IL2RA"], ["ERBB2", "CD25"]])
+async def test_search_batch_hpa_selects_record_of_gene(
+    fake_sources: dict, monkeypatch, genes: list[str]
+):
+    # テスト項目: 正常系: HPA のフリーテキスト検索でヒットした他の遺伝子は、パネルの遺伝子の結果に含まれない
+    # given (前提条件):
+    async def fake_search_hpa(session, query):
+        fake_sources["hpa"].append(query)
+        if query in ["IL2RA", "CD25"]:
+            with open(SAMPLE_HPA_PATH.format(query)) as f:
+                return DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, json.load(f)
+        return DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, [{"Gene": "ERBB2"}]
+
+    monkeypatch.setattr(batch, "search_hpa", fake_search_hpa)
+
+    # when (操作):
+    results = await collect(genes)
+    cached = await collect(genes)
+
+    # then (期待する結果):
+    for r in results + cached:
+        if r.source == DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS:
+            assert [record["Gene"] for record in r.data] == [
+                "ERBB2" if r.gene == "ERBB2" else "IL2RA"
+            ]
+
+
+@pytest.mark.asyncio
+async def test_search_batch_does_not_serve_stale(
+    fake_sources: dict, cache: ResultCache
+):
+    # テスト項目: 正常系: バッチ検索では期限切れのキャッシュを返さず、再検証した結果を返す
+    # given (前提条件):
+    cache.set(DATA_SOURCE_NAME_DICE, "IL2RA", b"old", ttl_seconds=-1)
+
+    # when (操作):
+    results = await collect(["IL2RA"])
+
+    # then (期待する結果):
+    (dice,) = (r for r in results if r.source == DATA_SOURCE_NAME_DICE)
+    assert dice.data == b"IL2RA,1.0\n"
+    assert fake_sources["dice"] == ["IL2RA"]
+    assert len(search._revalidate_tasks) == 0
@@ -0,0 +1,157 @@
+import gzip
+import json
+import re
+from typing import Generator
+
+import aiohttp
+import pytest
+from aioresponses import aioresponses
+
+from app.constants import DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
+from app.search.human_protein_atlas import (
+    COLUMNS_EXPRESSION,
+    COLUMNS_IDENTITY,
+    JsonArrayParser,
+    search_hpa,
+    search_hpa_expression,
+    search_hpa_genes,
+)
+
+SAMPLE_RESPONSE_PATH = (
+    "sample/human_protein_atlas/api_response/response_query_CD25.json"
+)
+URL_PATTERN_SEARCH = re.compile(
+    r"^https://www\.proteinatlas\.org/api/search_download\.php.*$"
+)
+
+
+@pytest.fixture
+def mock_aioresponse() -> Generator[aioresponses, None, None]:
+    with aioresponses() as mocked:
+        yield mocked
+
+
+@pytest.fixture
+def sample_data() -> bytes:
+    with open(SAMPLE_RESPONSE_PATH, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096, 1 << 20])
+def test_json_array_parser(sample_data: bytes, chunk_size: int):
+    # テスト項目: 正常系: 任意の位置で分割されたデータを逐次パースした結果が json.loads と一致する
+    # given (前提条件):
+    parser = JsonArrayParser()
+
+    # when (操作):
+    for i in range(0, len(sample_data), chunk_size):
+        parser.feed(sample_data[i : i + chunk_size])
+    actual = parser.close()
+
+    # then (期待する結果):
+    assert actual == json.loads(sample_data)
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (b"[]", []),
+        (b" [1, 2.5 ,\n 30] ", [1, 2.5, 30]),
+        (b'["a", {"b": []}]', ["a", {"b": []}]),
+    ],
+)
+def test_json_array_parser_values(data: bytes, expected: list):
+    # テスト項目: 正常系: 空配列や数値の配列もパースできる (数値は分割されても正しく読める)
+    parser = JsonArrayParser()
+    for i in range(len(data)):
+        parser.feed(data[i : i + 1])
+
+    assert parser.close() == expected
+
+
+@pytest.mark.parametrize("data", [b'{"a": 1}', b'[{"a": 1}', b"[1 2]", b"[1] x"])
+def test_json_array_parser_invalid(data: bytes):
+    # テスト項目: 異常系: JSON 配列でないデータ、途中で切れたデータは ValueError を送出する
+    parser = JsonArrayParser()
+
+    with pytest.raises(ValueError):
+        parser.feed(data)
+        parser.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compressed", [True, False])
+async def test_search_hpa_compressed(
+    mock_aioresponse: aioresponses, sample_data: bytes, compressed: bool
+):
+    # テスト項目: 正常系: gzip 圧縮されたレスポンス、圧縮されていないレスポンスのどちらも読める
+    # given (前提条件):
+    body = gzip.compress(sample_data) if compressed else sample_data
+    mock_aioresponse.get(URL_PATTERN_SEARCH, status=200, body=body)
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        source, actual = await search_hpa(session, "CD25")
+
+    # then (期待する結果):
+    assert source == DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
+    assert actual == json.loads(sample_data)
+    (_, url), *_ = mock_aioresponse.requests.keys()
+    assert url.query["compress"] == "yes"
+
+
+@pytest.mark.asyncio
+async def test_search_hpa_genes_requests_identity_columns(
+    mock_aioresponse: aioresponses,
+):
+    # テスト項目: 正常系: 1 段階目の検索では遺伝子の識別情報のカラムのみをリクエストする
+    # given (前提条件):
+    mock_aioresponse.get(URL_PATTERN_SEARCH, status=200, body=b"[]")
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        await search_hpa_genes(session, "CD25")
+
+    # then (期待する結果):
+    (_, url), *_ = mock_aioresponse.requests.keys()
+    assert url.query["columns"].split(",") == list(COLUMNS_IDENTITY.values())
+
+
+@pytest.mark.asyncio
+async def test_search_hpa_expression(mock_aioresponse: aioresponses):
+    # テスト項目: 正常系: 2 段階目の検索では発現量のカラムをリクエストし、Ensembl ID が一致するレコードを返す
+    # given (前提条件):
+    records = [
+        {"Gene": "IL2RB", "Ensembl": "ENSG00000100385"},
+        {"Gene": "IL2RA", "Ensembl": "ENSG00000134460"},
+    ]
+    mock_aioresponse.get(
+        URL_PATTERN_SEARCH, status=200, body=json.dumps(records).encode()
+    )
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        source, actual = await search_hpa_expression(session, "ENSG00000134460")
+
+    # then (期待する結果):
+    assert source == DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
+    assert actual == records[1]
+    (_, url), *_ = mock_aioresponse.requests.keys()
+    assert url.query["search"] == "ENSG00000134460"
+    assert url.query["columns"].split(",") == list(
+        dict.fromkeys(COLUMNS_EXPRESSION.values())
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_hpa_expression_not_found(mock_aioresponse: aioresponses):
+    # テスト項目: 正常系: Ensembl ID が一致するレコードがない場合は空の dict を返す
+    # given (前提条件):
+    mock_aioresponse.get(URL_PATTERN_SEARCH, status=200, body=b"[]")
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        _, actual = await search_hpa_expression(session, "ENSG00000134460")
+
+    # then (期待する結果):
+    assert actual == {}
@@ -0,0 +1,76 @@
+import json
+import re
+from typing import Generator
+
+import aiohttp
+import pytest
+from aioresponses import aioresponses
+
+from app.constants import DATA_SOURCE_NAME_MYGENEINFO
+from app.search.mygeneinfo import (
+    MYGENE_API_URL,
+    RESULT_KEY_GENE_ANOTATIONS,
+    querymany_mygene,
+    search_mygene,
+)
+
+SAMPLE_RESPONSE_PATH = "sample/mygene/api_response/response_GET_query_IL2RA.json"
+URL_PATTERN_QUERY = re.compile(rf"^{re.escape(MYGENE_API_URL)}/query.*$")
+
+
+@pytest.fixture
+def mock_aioresponse() -> Generator[aioresponses, None, None]:
+    with aioresponses() as mocked:
+        yield mocked
+
+
+@pytest.mark.asyncio
+async def test_search_mygene_success(mock_aioresponse: aioresponses):
+    # テスト項目: 正常系: MyGene.info の検索結果が NCBI Gene ID の降順で gene-anotations に格納される
+    # given (前提条件):
+    with open(SAMPLE_RESPONSE_PATH) as f:
+        payload = json.load(f)
+    mock_aioresponse.get(URL_PATTERN_QUERY, status=200, payload=payload)
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        source, actual = await search_mygene(session, "IL2RA")
+
+    # then (期待する結果):
+    assert source == DATA_SOURCE_NAME_MYGENEINFO
+    assert [x["_id"] for x in actual[RESULT_KEY_GENE_ANOTATIONS]] == sorted(
+        [x["_id"] for x in payload["hits"]], reverse=True
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_mygene_not_found(mock_aioresponse: aioresponses):
+    # テスト項目: 正常系: 遺伝子が見つからないとき、空の dict が返る
+    # given (前提条件):
+    payload = {"took": 1, "total": 0, "max_score": None, "hits": []}
+    mock_aioresponse.get(URL_PATTERN_QUERY, status=200, payload=payload)
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        _, actual = await search_mygene(session, "NOT_A_GENE")
+
+    # then (期待する結果):
+    assert actual == {}
+
+
+@pytest.mark.asyncio
+async def test_querymany_mygene_success(mock_aioresponse: aioresponses):
+    # テスト項目: 正常系: 複数のクエリを 1 回の POST リクエストで検索できる
+    # given (前提条件):
+    payload = [
+        {"query": "IL2RA", "_id": "3559", "symbol": "IL2RA"},
+        {"query": "NOT_A_GENE", "notfound": True},
+    ]
+    mock_aioresponse.post(URL_PATTERN_QUERY, status=200, payload=payload)
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        actual = await querymany_mygene(session, ["IL2RA", "NOT_A_GENE"])
+
+    # then (期待する結果):
+    assert actual == payload
@@ -0,0 +1,228 @@
+import asyncio
+import time
+
+import pytest
+
+import app.search.search as search
+from app.cache import ResultCache
+from app.client import _conditional_request
+from app.constants import (
+    CACHE_NEGATIVE_TTL_SECONDS,
+    DATA_SOURCE_NAME_BIOGPS,
+    DATA_SOURCE_NAME_DICE,
+    DATA_SOURCE_NAME_MYGENEINFO,
+)
+from app.errors import NotModifiedError
+from app.search.biogps import BIOGPS_SUPPORT_DATASETS
+from app.search.search import _search_with_cache, select_biogps_prefetch_genes
+
+
+@pytest.mark.parametrize(
+    "query, gene_anotations, expected",
+    [
+        # query-matching symbol and top-ranked gene
+        (
+            "IL2RA",
+            [
+                {"_id": "3601", "symbol": "IL15RA", "_score": 30.0},
+                {"_id": "3559", "symbol": "IL2RA", "_score": 20.0},
+            ],
+            ["3559", "3601"],
+        ),
+        # the first gene is selected by default if no symbol matches the query
+        (
+            "CD25",
+            [
+                {"_id": "3601", "symbol": "IL15RA", "_score": None},
+                {"_id": "3559", "symbol": "IL2RA", "_score": None},
+            ],
+            ["3601"],
+        ),
+        ("IL2RA", [], []),
+    ],
+)
+def test_select_biogps_prefetch_genes(
+    query: str, gene_anotations: list[dict], expected: list[str]
+):
+    actual = select_biogps_prefetch_genes(query, gene_anotations)
+
+    assert actual == expected
+
+
+@pytest.mark.asyncio
+async def test_search_stream_logs_metrics(monkeypatch):
+    # テスト項目: 正常系: 検索が終わるとメトリクスのスナップショットがログに出力される
+    # given (前提条件):
+    snapshots = []
+
+    async def fake_get_session():
+        return None
+
+    async def fake_search_dice():
+        return DATA_SOURCE_NAME_DICE, b"data"
+
+    def fake_snapshot() -> dict:
+        snapshots.append(True)
+        return {"histograms": {}, "counters": {}}
+
+    monkeypatch.setattr(search, "get_session", fake_get_session)
+    monkeypatch.setattr(
+        search,
+        "_create_search_tasks",
+        lambda session, query: [(DATA_SOURCE_NAME_DICE, fake_search_dice())],
+    )
+    monkeypatch.setattr(search.metrics, "snapshot", fake_snapshot)
+
+    # when (操作):
+    results = [r async for r in search._search_stream("IL2RA")]
+
+    # then (期待する結果):
+    assert results == [(DATA_SOURCE_NAME_DICE, b"data")]
+    assert snapshots == [True]
+
+
+@pytest.mark.asyncio
+async def test_search_with_cache_coalesces_concurrent_misses(tmp_path, monkeypatch):
+    # テスト項目: 正常系: キャッシュミス時に同じクエリの同時検索はデータソースに 1 回だけリクエストする
+    # given (前提条件):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(search, "get_cache", lambda: cache)
+    calls = []
+
+    async def fake_search_dice():
+        calls.append("IL2RA")
+        await asyncio.sleep(0.01)
+        return DATA_SOURCE_NAME_DICE, b"IL2RA,1.0\n"
+
+    # when (操作):
+    results = await asyncio.gather(
+        *[
+            _search_with_cache(DATA_SOURCE_NAME_DICE, query, fake_search_dice)
+            for query in ["IL2RA", "IL2RA", " IL2RA "]
+        ]
+    )
+
+    # then (期待する結果):
+    assert calls == ["IL2RA"]
+    assert all(r == (DATA_SOURCE_NAME_DICE, b"IL2RA,1.0\n") for r in results)
+
+
+@pytest.mark.asyncio
+async def test_search_with_cache_stale_while_revalidate(tmp_path, monkeypatch):
+    # テスト項目: 正常系: 期限切れのキャッシュはすぐに返され、バックグラウンドで更新される
+    # given (前提条件):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(search, "get_cache", lambda: cache)
+    cache.set(DATA_SOURCE_NAME_DICE, "IL2RA", b"old", ttl_seconds=-1)
+
+    async def fake_search_dice():
+        return DATA_SOURCE_NAME_DICE, b"new"
+
+    # when (操作):
+    result = await _search_with_cache(DATA_SOURCE_NAME_DICE, "IL2RA", fake_search_dice)
+    await asyncio.gather(*search._revalidate_tasks)
+
+    # then (期待する結果):
+    assert result == (DATA_SOURCE_NAME_DICE, b"old")
+    assert cache.get(DATA_SOURCE_NAME_DICE, "IL2RA") == b"new"
+
+
+@pytest.mark.asyncio
+async def test_search_with_cache_not_modified(tmp_path, monkeypatch):
+    # テスト項目: 正常系: 期限切れのキャッシュを検証子で再検証し、HTTP 304 ならキャッシュを延長して返す
+    # given (前提条件):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(search, "get_cache", lambda: cache)
+    data = {"gene-anotations": [{"_id": "3559"}]}
+    cache.set(DATA_SOURCE_NAME_MYGENEINFO, "IL2RA", data, ttl_seconds=-1, etag='"v1"')
+    sent = []
+
+    async def fake_search_mygene():
+        # fetch sends validators of the conditional request in the context
+        sent.append(_conditional_request.get().headers())
+        raise NotModifiedError("Not modified")
+
+    # when (操作):
+    result = await _search_with_cache(
+        DATA_SOURCE_NAME_MYGENEINFO, "IL2RA", fake_search_mygene
+    )
+
+    # then (期待する結果):
+    assert result == (DATA_SOURCE_NAME_MYGENEINFO, data)
+    assert sent == [{"If-None-Match": '"v1"'}]
+    assert cache.get(DATA_SOURCE_NAME_MYGENEINFO, "IL2RA") == data
+
+
+@pytest.mark.asyncio
+async def test_search_with_cache_negative(tmp_path, monkeypatch):
+    # テスト項目: 正常系: 見つからなかった結果は短い TTL でキャッシュされ、再検索ではデータソースにリクエストしない
+    # given (前提条件):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(search, "get_cache", lambda: cache)
+    calls = []
+
+    async def fake_search_dice():
+        calls.append("CD25")
+        return DATA_SOURCE_NAME_DICE, b""
+
+    # when (操作):
+    first = await _search_with_cache(DATA_SOURCE_NAME_DICE, "CD25", fake_search_dice)
+    second = await _search_with_cache(DATA_SOURCE_NAME_DICE, "CD25", fake_search_dice)
+
+    # then (期待する結果):
+    assert first == second == (DATA_SOURCE_NAME_DICE, b"")
+    assert calls == ["CD25"]
+    entry = cache.get_entry(DATA_SOURCE_NAME_DICE, "CD25")
+    assert entry.expires_at <= time.time() + CACHE_NEGATIVE_TTL_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_search_biogps_not_blocked_by_prefetch(tmp_path, monkeypatch):
+    # テスト項目: 正常系: タブで選択されたデータセットの検索は、他のデータセットの先読みの完了を待たない
+    # given (前提条件):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(search, "get_cache", lambda: cache)
+    monkeypatch.setattr(search, "BIOGPS_PREFETCH_CONCURRENCY", 1)
+    monkeypatch.setattr(search, "_biogps_prefetch_semaphores", {})
+    first, selected = (d["dataset_id"] for d in BIOGPS_SUPPORT_DATASETS[:2])
+    release = asyncio.Event()
+
+    async def fake_get_session():
+        return None
+
+    async def fake_search_biogps(session, dataset_id: str, ncbi_gene_id: str):
+        if dataset_id == first:
+            await release.wait()  # slow response of other dataset
+        return DATA_SOURCE_NAME_BIOGPS, dataset_id.encode()
+
+    monkeypatch.setattr(search, "get_session", fake_get_session)
+    monkeypatch.setattr(search, "search_biogps", fake_search_biogps)
+    prefetch = asyncio.create_task(search._prefetch_biogps(["3559"]))
+    await asyncio.sleep(0.01)
+
+    # when (操作):
+    data, _ = await asyncio.wait_for(search._search_biogps(selected, "3559"), 1)
+
+    # then (期待する結果):
+    assert data[DATA_SOURCE_NAME_BIOGPS] == selected.encode()
+
+    release.set()
+    await prefetch
+
+
+@pytest.mark.asyncio
+async def test_search_with_cache_unusable_cache(tmp_path, monkeypatch):
+    # テスト項目: 異常系: キャッシュファイルを開けない場合でも、検索は失敗しない
+    # given (前提条件):
+    (tmp_path / "notadir").write_text("")
+    cache = ResultCache(path=str(tmp_path / "notadir" / "sub" / "cache.sqlite3"))
+    monkeypatch.setattr(search, "get_cache", lambda: cache)
+
+    async def fake_search_dice():
+        return DATA_SOURCE_NAME_DICE, b"IL2RA,1.0\n"
+
+    # when (操作):
+    result = await _search_with_cache(DATA_SOURCE_NAME_DICE, "IL2RA", fake_search_dice)
+
+    # then (期待する結果):
+    assert result == (DATA_SOURCE_NAME_DICE, b"IL2RA,1.0\n")
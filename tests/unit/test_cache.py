@@ -0,0 +1,183 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from app.cache import ResultCache, normalize_query
+from app.constants import DATA_SOURCE_NAME_DICE, DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
+from app.errors import CacheError
+
+
+@pytest.fixture
+def cache(tmp_path) -> ResultCache:
+    return ResultCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+
+
+@pytest.mark.parametrize(
+    "input, expected",
+    [
+        ("IL2RA", "IL2RA"),
+        ("  IL2RA \n", "IL2RA"),
+        ("lymphocyte   activation", "lymphocyte activation"),
+    ],
+)
+def test_normalize_query(input: str, expected: str):
+    actual = normalize_query(input)
+
+    assert actual == expected
+
+
+@pytest.mark.parametrize(
+    "source, value",
+    [
+        (DATA_SOURCE_NAME_DICE, b'"T cell, CD4, TH1",7.92,15.79\n'),
+        (DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, [{"Gene": "IL2RA", "Gene synonym": []}]),
+    ],
+)
+def test_cache_set_and_get(cache: ResultCache, source: str, value):
+    # テスト項目: 正常系: キャッシュに保存した値を正規化されたクエリで取得できる
+    # given (前提条件):
+    cache.set(source, "IL2RA", value)
+
+    # when (操作):
+    actual = cache.get(source, " IL2RA ")
+
+    # then (期待する結果):
+    assert actual == value
+
+
+def test_cache_miss_on_other_source(cache: ResultCache):
+    # テスト項目: 正常系: データソースが異なる場合はキャッシュにヒットしない
+    # given (前提条件):
+    cache.set(DATA_SOURCE_NAME_DICE, "IL2RA", b"data")
+
+    # when (操作):
+    actual = cache.get(DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, "IL2RA")
+
+    # then (期待する結果):
+    assert actual is None
+
+
+def test_cache_expired(cache: ResultCache):
+    # テスト項目: 正常系: TTL を過ぎたエントリは取得できない
+    # given (前提条件):
+    cache.set(DATA_SOURCE_NAME_DICE, "IL2RA", b"data", ttl_seconds=0.01)
+    time.sleep(0.02)
+
+    # when (操作):
+    actual = cache.get(DATA_SOURCE_NAME_DICE, "IL2RA")
+
+    # then (期待する結果):
+    assert actual is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    # テスト項目: 正常系: 合計サイズが上限を超えたとき、最も長く使われていないエントリから削除される
+    # given (前提条件):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), max_bytes=2500)
+    value = os.urandom(1024)  # incompressible data (about 1 KB)
+    cache.set(DATA_SOURCE_NAME_DICE, "A", value)
+    cache.set(DATA_SOURCE_NAME_DICE, "B", value)
+    cache.get(DATA_SOURCE_NAME_DICE, "A")  # "B" becomes least recently used
+
+    # when (操作):
+    cache.set(DATA_SOURCE_NAME_DICE, "C", value)
+
+    # then (期待する結果):
+    assert cache.get(DATA_SOURCE_NAME_DICE, "A") == value
+    assert cache.get(DATA_SOURCE_NAME_DICE, "B") is None
+    assert cache.get(DATA_SOURCE_NAME_DICE, "C") == value
+
+
+def test_cache_sums_sizes_only_on_sync(tmp_path):
+    # テスト項目: 正常系: 合計サイズはプロセス内で追跡され、書込み毎にキャッシュファイル全体のサイズを集計しない
+    # given (前提条件):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), sync_writes=100)
+    statements: list[str] = []
+    cache._connect().set_trace_callback(statements.append)
+
+    # when (操作):
+    for i in range(10):
+        cache.set(DATA_SOURCE_NAME_DICE, f"gene{i}", b"data")
+
+    # then (期待する結果): only the first write syncs the total size with the file
+    assert sum("SUM(size)" in s for s in statements) == 1
+
+
+def test_cache_corrupt_entry(cache: ResultCache):
+    # テスト項目: 異常系: 壊れたエントリは CacheError にならずキャッシュミスとして扱われ、削除される
+    # given (前提条件):
+    cache.set(DATA_SOURCE_NAME_DICE, "IL2RA", b"data")
+    cache._connect().execute("UPDATE results SET value = ?", (b"broken",))
+
+    # when (操作):
+    entry = cache.get_entry(DATA_SOURCE_NAME_DICE, "IL2RA")
+
+    # then (期待する結果):
+    assert entry is None
+    (count,) = cache._connect().execute("SELECT COUNT(*) FROM results").fetchone()
+    assert count == 0
+
+
+def test_cache_unusable_path(tmp_path):
+    # テスト項目: 異常系: キャッシュファイルのパスにディレクトリを作成できない場合、CacheError が raise される
+    # given (前提条件):
+    (tmp_path / "notadir").write_text("")
+    cache = ResultCache(path=str(tmp_path / "notadir" / "sub" / "cache.sqlite3"))
+
+    # when (操作), then (期待する結果):
+    with pytest.raises(CacheError):
+        cache.get_entry(DATA_SOURCE_NAME_DICE, "IL2RA")
+    with pytest.raises(CacheError):
+        cache.set(DATA_SOURCE_NAME_DICE, "IL2RA", b"data")
+
+
+def test_cache_entry_stale_with_validators(cache: ResultCache):
+    # テスト項目: 正常系: TTL を過ぎたエントリも検証子 (ETag, Last-Modified) と共に stale として取得でき、touch で再び fresh になる
+    # given (前提条件):
+    cache.set(
+        DATA_SOURCE_NAME_DICE,
+        "IL2RA",
+        b"data",
+        ttl_seconds=0.01,
+        etag='"abc"',
+        last_modified="Wed, 21 Oct 2015 07:28:00 GMT",
+    )
+    time.sleep(0.02)
+
+    # when (操作):
+    entry = cache.get_entry(DATA_SOURCE_NAME_DICE, "IL2RA")
+
+    # then (期待する結果):
+    assert entry.value == b"data"
+    assert not entry.fresh
+    assert entry.etag == '"abc"'
+    assert entry.last_modified == "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    # when (操作):
+    cache.touch(DATA_SOURCE_NAME_DICE, "IL2RA")
+
+    # then (期待する結果):
+    assert cache.get_entry(DATA_SOURCE_NAME_DICE, "IL2RA").fresh
+    assert cache.get(DATA_SOURCE_NAME_DICE, "IL2RA") == b"data"
+
+
+def test_cache_migrates_old_schema(tmp_path):
+    # テスト項目: 正常系: 検証子のカラムがない古いキャッシュファイルにカラムが追加される
+    # given (前提条件):
+    path = str(tmp_path / "cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE results (source TEXT NOT NULL, version TEXT NOT NULL, query TEXT NOT NULL, "
+        "kind TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, "
+        "expires_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (source, version, query))"
+    )
+    conn.close()
+    cache = ResultCache(path=path)
+
+    # when (操作):
+    cache.set(DATA_SOURCE_NAME_DICE, "IL2RA", b"data", etag='"abc"')
+
+    # then (期待する結果):
+    assert cache.get_entry(DATA_SOURCE_NAME_DICE, "IL2RA").etag == '"abc"'
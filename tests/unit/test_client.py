@@ -1,11 +1,49 @@
+import asyncio
+import concurrent.futures
+import threading
 from typing import Generator
 
 import aiohttp
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from aioresponses import aioresponses
+from yarl import URL
+
+import app.client as client
+from app import metrics
+from app.client import (
+    CancelToken,
+    CircuitBreaker,
+    RetryPolicy,
+    _request,
+    _request_hedged,
+    conditional_request,
+    fetch,
+    get_adaptive_timeout,
+    get_event_loop,
+    get_latency_histogram,
+    get_session,
+    iterate_sync,
+    parse_retry_after,
+    reading_response,
+    run_sync,
+)
+from app.errors import (
+    FetchClientError,
+    FetchClientResponseError,
+    FetchUnexpectedError,
+    NotModifiedError,
+    SourceUnavailableError,
+)
+from app.ratelimit import HostLimiter
 
-from app.client import fetch
-from app.errors import FetchClientError, FetchClientResponseError, FetchUnexpectedError
+
+@pytest.fixture(autouse=True)
+def reset_metrics() -> Generator[None, None, None]:
+    metrics.reset()
+    yield
+    metrics.reset()
 
 
 @pytest.fixture
@@ -82,3 +120,491 @@ async def test_fetch_unexpected_error(mock_aioresponse: aioresponses):
 
         # then (期待する結果):
         assert excinfo.exconly().startswith("app.errors.FetchUnexpectedError")
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    """record delays of retries instead of sleeping"""
+
+    delays: list[float] = []
+
+    async def fake_sleep(delay: float):
+        delays.append(delay)
+
+    monkeypatch.setattr(client.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+@pytest.mark.asyncio
+async def test_fetch_retry_transient_errors(
+    mock_aioresponse: aioresponses, sleeps: list[float]
+):
+    # テスト項目: 正常系: 一時的なエラー (503, 接続断) はリトライされ、最終的にデータを取得できる
+    # given (前提条件):
+    url = "http://example.com"
+    expected = {"key": "value"}
+    mock_aioresponse.get(url, status=503)
+    mock_aioresponse.get(url, exception=aiohttp.ServerDisconnectedError())
+    mock_aioresponse.get(url, status=200, payload=expected)
+    policy = RetryPolicy(max_attempts=3, backoff_base_seconds=1.0)
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        res = await fetch(session, url, retry_policy=policy)
+        actual = await res.json()
+
+    # then (期待する結果):
+    assert actual == expected
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1.0
+    assert 0 <= sleeps[1] <= 2.0
+
+
+@pytest.mark.asyncio
+async def test_fetch_retry_respects_retry_after(
+    mock_aioresponse: aioresponses, sleeps: list[float]
+):
+    # テスト項目: 正常系: 429 の Retry-After ヘッダーの秒数だけ待ってからリトライする
+    # given (前提条件):
+    url = "http://example.com"
+    mock_aioresponse.get(url, status=429, headers={"Retry-After": "3"})
+    mock_aioresponse.get(url, status=200, payload={})
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        _ = await fetch(session, url, retry_policy=RetryPolicy(max_attempts=2))
+
+    # then (期待する結果):
+    assert sleeps == [3.0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "status_code, policy",
+    [
+        # 500 is not retryable (DICE returns 500 when a gene is not found)
+        (500, RetryPolicy(max_attempts=3)),
+        # max attempts
+        (503, RetryPolicy(max_attempts=1)),
+        # Retry-After exceeds deadline
+        (503, RetryPolicy(max_attempts=3, deadline_seconds=5)),
+    ],
+)
+async def test_fetch_retry_give_up(
+    status_code: int,
+    policy: RetryPolicy,
+    mock_aioresponse: aioresponses,
+    sleeps: list[float],
+):
+    # テスト項目: 異常系: リトライできない場合は最初のエラーが FetchClientResponseError として raise される
+    # given (前提条件):
+    url = "http://example.com"
+    mock_aioresponse.get(url, status=status_code, headers={"Retry-After": "10"})
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        with pytest.raises(FetchClientResponseError):
+            _ = await fetch(session, url, retry_policy=policy)
+
+    # then (期待する結果):
+    assert sleeps == []
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("120", 120.0),
+        (None, None),
+        ("invalid", None),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+    ],
+)
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_get_adaptive_timeout():
+    # テスト項目: 正常系: 十分なサンプルがあればタイムアウトは p99 から計算され、なければデフォルト値
+    # given (前提条件):
+    fast = "http://fast.example.com/api"
+    slow = "http://slow.example.com/api"
+    for _ in range(100):
+        get_latency_histogram(fast).observe(0.1)
+        get_latency_histogram(slow).observe(4.0)
+
+    # when (操作), then (期待する結果):
+    assert get_adaptive_timeout(fast, 30) == 5.0  # ADAPTIVE_TIMEOUT_MIN_SECONDS
+    assert 12.0 <= get_adaptive_timeout(slow, 30) <= 15.0
+    assert get_adaptive_timeout("http://new.example.com/api", 30) == 30
+
+
+@pytest.mark.asyncio
+async def test_fetch_adaptive_timeout(mock_aioresponse: aioresponses):
+    # テスト項目: 正常系: 適応的タイムアウトは接続・読込に適用され、ボディの読込を含む全体のタイムアウトは timeout_seconds のまま
+    # given (前提条件):
+    url = "http://fast.example.com/api"
+    for _ in range(100):
+        get_latency_histogram(url).observe(0.1)
+    mock_aioresponse.get(url, status=200, payload={"key": "value"})
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        await fetch(session, url, timeout_seconds=30)
+
+    # then (期待する結果):
+    timeout = mock_aioresponse.requests[("GET", URL(url))][0].kwargs["timeout"]
+    assert timeout.sock_connect == 5.0  # ADAPTIVE_TIMEOUT_MIN_SECONDS
+    assert timeout.sock_read == 5.0
+    assert timeout.total == 30
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error",
+    [asyncio.TimeoutError(), aiohttp.ClientPayloadError("connection lost")],
+)
+async def test_reading_response_error(error: Exception):
+    # テスト項目: 異常系: レスポンスのボディの読込中のタイムアウトや切断は FetchClientError になる
+    # given (前提条件):
+    async def read():
+        raise error
+
+    # when (操作), then (期待する結果):
+    with pytest.raises(FetchClientError):
+        with reading_response("http://example.com"):
+            await read()
+
+
+@pytest.mark.asyncio
+async def test_request_holds_limiter_until_body_is_read():
+    # テスト項目: 正常系: レート制限の枠はレスポンスのボディを読み終えるまで保持される
+    # given (前提条件):
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(body=b"x" * 1024 * 1024)
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    limiter = HostLimiter("localhost", rate_per_second=100, burst=10, max_in_flight=1)
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        # when (操作):
+        res = await _request(session, "GET", str(server.make_url("/")), limiter=limiter)
+
+        # then (期待する結果):
+        assert limiter.semaphore.locked()
+        await res.read()
+        assert not limiter.semaphore.locked()
+
+
+class FakeResponse:
+    def __init__(self, name: str):
+        self.name = name
+        self.released = False
+        self.connection = None
+
+    def release(self):
+        self.released = True
+
+
+class FakeSession:
+    """answers after the given delays in order of requests"""
+
+    def __init__(self, delays: list[float]):
+        self.delays = delays
+        self.requests = 0
+        self.cancelled: list[int] = []
+
+    async def request(self, method: str, url: str, **kwargs) -> FakeResponse:
+        i = self.requests
+        self.requests += 1
+        try:
+            await asyncio.sleep(self.delays[i])
+        except asyncio.CancelledError:
+            self.cancelled.append(i)
+            raise
+
+        return FakeResponse(f"response {i}")
+
+
+@pytest.mark.asyncio
+async def test_request_hedged_slow_first_request():
+    # テスト項目: 正常系: 最初のリクエストが遅い場合、2 つ目のリクエストの結果を使い、最初のリクエストはキャンセルされる
+    # given (前提条件):
+    session = FakeSession([10.0, 0.01])
+
+    # when (操作):
+    res = await _request_hedged(session, "GET", "http://example.com", 0.05)
+    await asyncio.sleep(0)  # let the cancelled request finish
+
+    # then (期待する結果):
+    assert res.name == "response 1"
+    assert session.cancelled == [0]
+    assert metrics.get_counter("hedge_won:example.com") == 1
+
+
+@pytest.mark.asyncio
+async def test_request_hedged_fast_first_request():
+    # テスト項目: 正常系: 最初のリクエストが速い場合、2 つ目のリクエストは送られない
+    # given (前提条件):
+    session = FakeSession([0.01, 0.01])
+
+    # when (操作):
+    res = await _request_hedged(session, "GET", "http://example.com", 1.0)
+
+    # then (期待する結果):
+    assert res.name == "response 0"
+    assert session.requests == 1
+    assert metrics.get_counter("hedged:example.com") == 0
+
+
+@pytest.mark.asyncio
+async def test_request_hedged_not_while_queued_by_rate_limit():
+    # テスト項目: 正常系: レート制限の待ち時間は hedge の遅延に含まれず、待機中のリクエストは重複して送られない
+    # given (前提条件):
+    session = FakeSession([0.01, 0.01])
+    limiter = HostLimiter("example.com", rate_per_second=5, burst=1, max_in_flight=2)
+    async with limiter:
+        pass  # the next request waits about 0.2 sec for a token
+
+    # when (操作):
+    res = await _request_hedged(
+        session, "GET", "http://example.com", 0.05, limiter=limiter
+    )
+
+    # then (期待する結果):
+    assert res.name == "response 0"
+    assert session.requests == 1
+    assert metrics.get_counter("hedged:example.com") == 0
+
+
+def test_circuit_breaker_states():
+    # テスト項目: 正常系: エラー率が閾値を超えると open になり、open_seconds 後に half-open でプローブし、成功すると closed に戻る
+    # given (前提条件):
+    breaker = CircuitBreaker("DICE", min_requests=4, error_rate=0.5, open_seconds=0)
+
+    # when (操作): 2 of 4 requests fail
+    for ok in [True, False, True, False]:
+        breaker.before_request()
+        breaker.record(ok)
+
+    # then (期待する結果):
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # when (操作): a probe is in flight
+    breaker.before_request()
+
+    # then (期待する結果): other requests fail fast
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(SourceUnavailableError):
+        breaker.before_request()
+
+    # when (操作): the probe succeeds
+    breaker.record(True)
+
+    # then (期待する結果):
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_probe_fails():
+    # テスト項目: 異常系: half-open のプローブが失敗すると再び open になり、リクエストは即座に失敗する
+    # given (前提条件):
+    breaker = CircuitBreaker("DICE", min_requests=1, open_seconds=0)
+    breaker.record(False)
+    breaker.before_request()
+    breaker.open_seconds = 60
+
+    # when (操作):
+    breaker.record(False)
+
+    # then (期待する結果):
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(SourceUnavailableError) as excinfo:
+        breaker.before_request()
+    assert excinfo.value.source == "DICE"
+
+
+def test_circuit_breaker_cancelled_request_before_half_open():
+    # テスト項目: 異常系: half-open になる前に送られたリクエストがキャンセルされても、プローブの枠は増えない
+    # given (前提条件):
+    breaker = CircuitBreaker("DICE", min_requests=1, open_seconds=0)
+    old = breaker.before_request()  # sent while closed
+    breaker.record(False)
+    probe = breaker.before_request()  # half-open
+
+    # when (操作): the request sent before half-open is cancelled
+    breaker.record(None, old)
+
+    # then (期待する結果): the probe is still in flight
+    assert old is None
+    with pytest.raises(SourceUnavailableError):
+        breaker.before_request()
+
+    # when (操作): the probe is cancelled
+    breaker.record(None, probe)
+
+    # then (期待する結果): another probe can be sent
+    assert breaker.before_request() is not None
+    assert breaker.probes == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_fails_fast_while_circuit_open(
+    mock_aioresponse: aioresponses, monkeypatch
+):
+    # テスト項目: 異常系: データソースが落ちている間はリクエストを送らずに SourceUnavailableError が raise される
+    # given (前提条件):
+    url = "http://example.com"
+    breaker = CircuitBreaker("test", min_requests=2, open_seconds=60)
+    monkeypatch.setattr(client, "CIRCUIT_BREAKERS", {"test": {}})
+    monkeypatch.setattr(client, "_circuit_breakers", {"test": breaker})
+    mock_aioresponse.get(url, status=503, repeat=True)
+
+    async with aiohttp.ClientSession() as session:
+        for _ in range(2):
+            with pytest.raises(FetchClientResponseError):
+                _ = await fetch(session, url, source="test")
+
+        # when (操作), then (期待する結果):
+        with pytest.raises(SourceUnavailableError):
+            _ = await fetch(session, url, source="test")
+
+    assert len(mock_aioresponse.requests[("GET", URL(url))]) == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_conditional_request(mock_aioresponse: aioresponses):
+    # テスト項目: 正常系: conditional_request 内では検証子が送られ、レスポンスの検証子が記録される
+    # given (前提条件):
+    url = "http://example.com"
+    mock_aioresponse.get(
+        url,
+        status=200,
+        payload={},
+        headers={"ETag": '"v2"', "Last-Modified": "Thu, 22 Oct 2015 07:28:00 GMT"},
+    )
+
+    # when (操作):
+    async with aiohttp.ClientSession() as session:
+        with conditional_request('"v1"', "Wed, 21 Oct 2015 07:28:00 GMT") as cond:
+            _ = await fetch(session, url)
+
+    # then (期待する結果):
+    request = mock_aioresponse.requests[("GET", URL(url))][0]
+    assert request.kwargs["headers"]["If-None-Match"] == '"v1"'
+    assert (
+        request.kwargs["headers"]["If-Modified-Since"]
+        == "Wed, 21 Oct 2015 07:28:00 GMT"
+    )
+    assert cond.response_etag == '"v2"'
+    assert cond.response_last_modified == "Thu, 22 Oct 2015 07:28:00 GMT"
+
+
+@pytest.mark.asyncio
+async def test_fetch_not_modified(mock_aioresponse: aioresponses):
+    # テスト項目: 正常系: conditional_request 内で HTTP 304 が返ると NotModifiedError が raise される
+    # given (前提条件):
+    url = "http://example.com"
+    mock_aioresponse.get(url, status=304)
+
+    # when (操作), then (期待する結果):
+    async with aiohttp.ClientSession() as session:
+        with conditional_request('"v1"'):
+            with pytest.raises(NotModifiedError):
+                _ = await fetch(session, url)
+
+
+def test_run_sync_reuses_background_event_loop():
+    # テスト項目: 正常系: run_sync は毎回同じバックグラウンドのイベントループでコルーチンを実行する
+    # given (前提条件):
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    # when (操作):
+    first = run_sync(current_loop())
+    second = run_sync(current_loop())
+
+    # then (期待する結果):
+    assert first is second
+    assert first is get_event_loop()
+    assert first.is_running()
+
+
+def test_get_session_returns_pooled_session():
+    # テスト項目: 正常系: 同じイベントループ上では get_session は同じ ClientSession を返す
+    # given (前提条件):
+    async def sessions():
+        return await get_session(), await get_session()
+
+    # when (操作):
+    first, second = run_sync(sessions())
+
+    # then (期待する結果):
+    assert first is second
+    assert not first.closed
+    assert first.connector.limit_per_host > 0
+
+
+class SlowStream:
+    """async iterator yielding 1, then waiting forever until it's closed"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    async def stream(self):
+        try:
+            yield 1
+            await asyncio.sleep(3600)
+            yield 2
+        finally:
+            self.closed.set()
+
+
+def test_iterate_sync_cancelled_by_token():
+    # テスト項目: 正常系: トークンがキャンセルされると、待機中のステップがキャンセルされ、イテレーションが終了する
+    # given (前提条件):
+    token = CancelToken()
+    slow = SlowStream()
+    timer = threading.Timer(0.05, token.cancel)
+
+    # when (操作):
+    timer.start()
+    actual = list(iterate_sync(slow.stream(), token=token))
+
+    # then (期待する結果):
+    assert actual == [1]
+    assert token.cancelled
+    assert slow.closed.wait(1)
+
+
+def test_iterate_sync_stops_when_on_wait_raises():
+    # テスト項目: 正常系: 待機中に呼ばれる on_wait が例外を送出すると、非同期イテレータが閉じられる
+    # given (前提条件):
+    slow = SlowStream()
+    waits = []
+
+    def on_wait():
+        waits.append(1)
+        if len(waits) == 3:
+            raise RuntimeError("superseded")
+
+    # when (操作):
+    actual = []
+    with pytest.raises(RuntimeError):
+        for item in iterate_sync(slow.stream(), on_wait=on_wait, poll_interval=0.01):
+            actual.append(item)
+
+    # then (期待する結果):
+    assert actual == [1]
+    assert len(waits) == 3
+    assert slow.closed.wait(1)
+
+
+def test_run_sync_cancelled_token():
+    # テスト項目: 異常系: キャンセル済みのトークンを渡すと、コルーチンはキャンセルされ CancelledError を送出する
+    # given (前提条件):
+    token = CancelToken()
+    token.cancel()
+
+    # when (操作), then (期待する結果):
+    with pytest.raises(concurrent.futures.CancelledError):
+        run_sync(asyncio.sleep(3600), token=token)
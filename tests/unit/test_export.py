@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+from app.constants import (
+    DATA_SOURCE_NAME_BIOGPS,
+    DATA_SOURCE_NAME_DICE,
+    DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS,
+    DATA_SOURCE_NAME_MYGENEINFO,
+)
+from app.export import (
+    ChunkedTableWriter,
+    tidy_batch_result,
+    tidy_biogps,
+    tidy_dice,
+    tidy_hpa,
+)
+from app.search.batch import BatchSearchResult
+from app.search.human_protein_atlas import COLUMNS_RNA_EXPRESSION
+
+SAMPLE_HPA_PATH = "sample/human_protein_atlas/api_response/response_query_IL2RA.json"
+SAMPLE_HPA_PATH_CD25 = (
+    "sample/human_protein_atlas/api_response/response_query_CD25.json"
+)
+SAMPLE_DICE_PATH = "sample/dice/download/IL2RA_Expression_data.csv"
+SAMPLE_BIOGPS_PATH = "sample/biogps/download/IL2RA_GeneAtlas-U133A-gcrma.csv"
+
+
+def test_tidy_hpa():
+    # テスト項目: 正常系: 遺伝子のレコードのみから組織数分の行が作成され、ヒットした他の遺伝子の行は作成されない
+    # given (前提条件):
+    with open(SAMPLE_HPA_PATH) as f:
+        records = json.load(f)
+    assert len(records) > 1  # IL2RA, IL15RA
+
+    # when (操作):
+    rows = tidy_hpa("IL2RA", records)
+
+    # then (期待する結果):
+    assert len(rows) == len(COLUMNS_RNA_EXPRESSION)
+    gene, source, _, probeset, tissue, value = rows[0]
+    assert gene == "IL2RA"
+    assert source == DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS
+    assert probeset is None
+    assert tissue == "Adipose tissue"
+    assert value == float(records[0]["Tissue RNA - adipose tissue [nTPM]"])
+
+
+def test_tidy_dice():
+    # テスト項目: 正常系: DICE の細胞種・レプリケートごとに 1 行が作成される
+    # given (前提条件):
+    with open(SAMPLE_DICE_PATH, "rb") as f:
+        data = f.read()
+
+    # when (操作):
+    rows = tidy_dice("IL2RA", data)
+
+    # then (期待する結果):
+    assert rows[0][:2] == ("IL2RA", DATA_SOURCE_NAME_DICE)
+    assert rows[0][4:] == ("T cell, CD4, TH1", 7.92476322913)
+    assert len({r[4] for r in rows}) == 15
+
+
+def test_tidy_biogps():
+    # テスト項目: 正常系: BioGPS のサンプル・probeset ごとに 1 行が作成される
+    # given (前提条件):
+    with open(SAMPLE_BIOGPS_PATH, "rb") as f:
+        data = f.read()
+
+    # when (操作):
+    rows = tidy_biogps("IL2RA", "GSE1133", data)
+
+    # then (期待する結果):
+    assert rows[:2] == [
+        (
+            "IL2RA",
+            DATA_SOURCE_NAME_BIOGPS,
+            "GSE1133",
+            "206341_at",
+            "Yeast (background).1",
+            -1.108,
+        ),
+        (
+            "IL2RA",
+            DATA_SOURCE_NAME_BIOGPS,
+            "GSE1133",
+            "211269_s_at",
+            "Yeast (background).1",
+            2.248,
+        ),
+    ]
+
+
+def test_tidy_batch_result_hpa_synonym():
+    # テスト項目: 正常系: 別名で検索した HPA の結果は、別名に一致する遺伝子の行のみになる
+    # given (前提条件):
+    with open(SAMPLE_HPA_PATH_CD25) as f:
+        records = json.load(f)  # 19 genes
+    result = BatchSearchResult("CD25", DATA_SOURCE_NAME_HUMAN_PROTEIN_ATLAS, records)
+
+    # when (操作):
+    rows = tidy_batch_result(result)
+
+    # then (期待する結果):
+    assert len(rows) == len(COLUMNS_RNA_EXPRESSION)
+    assert {row[0] for row in rows} == {"CD25"}
+    assert rows[0][5] == float(records[0]["Tissue RNA - adipose tissue [nTPM]"])
+
+
+@pytest.mark.parametrize(
+    "result",
+    [
+        BatchSearchResult(
+            "IL2RA", DATA_SOURCE_NAME_MYGENEINFO, {"gene-anotations": []}
+        ),
+        BatchSearchResult("IL2RA", DATA_SOURCE_NAME_DICE, None, Exception("error")),
+        BatchSearchResult("IL2RA", DATA_SOURCE_NAME_DICE, b""),
+    ],
+)
+def test_tidy_batch_result_without_expression_data(result: BatchSearchResult):
+    actual = tidy_batch_result(result)
+
+    assert actual == []
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_chunked_table_writer(tmp_path, fmt: str):
+    # テスト項目: 正常系: チャンクごとに書き込んだ行をすべて読み込める
+    # given (前提条件):
+    pa = pytest.importorskip("pyarrow")
+    path = str(tmp_path / f"expression.{fmt}")
+    with open(SAMPLE_DICE_PATH, "rb") as f:
+        rows = tidy_dice("IL2RA", f.read())
+
+    # when (操作):
+    with ChunkedTableWriter(path, fmt, chunk_size=100) as writer:
+        writer.write(rows)
+
+    # then (期待する結果):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+    else:
+        table = pa.ipc.open_file(path).read_all()
+    assert table.num_rows == len(rows)
+    assert table.column("tissue")[0].as_py() == "T cell, CD4, TH1"
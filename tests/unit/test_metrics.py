@@ -0,0 +1,41 @@
+import pytest
+
+from app.metrics import HISTOGRAM_DECAY_COUNT, LatencyHistogram
+
+
+def test_latency_histogram_quantile():
+    # テスト項目: 正常系: 分位点はバケットの上限で近似され、真の値の 1.25 倍以内に収まる
+    # given (前提条件):
+    histogram = LatencyHistogram()
+    latencies = [0.1] * 95 + [2.0] * 5
+
+    # when (操作):
+    for latency in latencies:
+        histogram.observe(latency)
+
+    # then (期待する結果):
+    assert 0.1 <= histogram.quantile(0.5) <= 0.1 * 1.25
+    assert 0.1 <= histogram.quantile(0.95) <= 0.1 * 1.25
+    assert 2.0 <= histogram.quantile(0.99) <= 2.0 * 1.25
+    assert histogram.samples == 100
+
+
+def test_latency_histogram_empty():
+    # テスト項目: 正常系: サンプルがない場合、分位点は None
+    assert LatencyHistogram().quantile(0.99) is None
+
+
+def test_latency_histogram_decay():
+    # テスト項目: 正常系: サンプル数が多くなると古いサンプルの重みが減り、最近のレイテンシに追従する
+    # given (前提条件):
+    histogram = LatencyHistogram()
+    for _ in range(HISTOGRAM_DECAY_COUNT):
+        histogram.observe(10.0)
+
+    # when (操作):
+    for _ in range(HISTOGRAM_DECAY_COUNT * 2):
+        histogram.observe(0.1)
+
+    # then (期待する結果):
+    assert histogram.quantile(0.5) == pytest.approx(0.1, rel=0.25)
+    assert histogram.samples == HISTOGRAM_DECAY_COUNT * 3
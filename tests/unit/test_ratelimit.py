@@ -0,0 +1,71 @@
+import asyncio
+import time
+from typing import Generator
+
+import pytest
+
+from app import metrics
+from app.constants import DATA_SOURCE_NAME_DICE
+from app.ratelimit import HostLimiter, TokenBucket, get_host_limiter
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics() -> Generator[None, None, None]:
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_rate():
+    # テスト項目: 正常系: バーストを超えたリクエストはレートに従って待たされる
+    # given (前提条件):
+    bucket = TokenBucket(rate_per_second=50, burst=2)
+
+    # when (操作):
+    start = time.monotonic()
+    for _ in range(5):
+        await bucket.acquire()
+    elapsed = time.monotonic() - start
+
+    # then (期待する結果): 2 requests in burst and 3 requests at 50 per second
+    assert 3 / 50 * 0.9 <= elapsed < 0.5
+
+
+@pytest.mark.asyncio
+async def test_host_limiter_max_in_flight():
+    # テスト項目: 正常系: 同時に実行されるリクエスト数は max_in_flight を超えず、待ち時間がメトリクスに記録される
+    # given (前提条件):
+    limiter = HostLimiter(
+        "example.com", rate_per_second=1000, burst=100, max_in_flight=2
+    )
+    in_flight = 0
+    max_in_flight = 0
+
+    async def request():
+        nonlocal in_flight, max_in_flight
+        async with limiter:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    # when (操作):
+    await asyncio.gather(*[request() for _ in range(6)])
+
+    # then (期待する結果):
+    assert max_in_flight == 2
+    assert metrics.get_histogram("queue_wait:example.com").samples == 6
+    assert metrics.get_histogram("queue_wait:example.com").quantile(0.99) >= 0.02
+
+
+@pytest.mark.asyncio
+async def test_get_host_limiter():
+    # テスト項目: 正常系: 同じホストには同じ limiter が使われ、制限のないデータソースには None が返る
+    # when (操作):
+    first = get_host_limiter(DATA_SOURCE_NAME_DICE, "dice-database.org")
+    second = get_host_limiter(DATA_SOURCE_NAME_DICE, "dice-database.org")
+
+    # then (期待する結果):
+    assert first is second
+    assert get_host_limiter(None, "example.com") is None
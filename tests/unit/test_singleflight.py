@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+class Counter:
+    def __init__(self, delay: float = 0.01, error: Exception = None):
+        self.calls = 0
+        self.cancelled = False
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self) -> dict:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+        if self.error is not None:
+            raise self.error
+        return {"calls": self.calls}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesce():
+    # テスト項目: 正常系: 同じキーの同時呼び出しは 1 回だけ実行され、全員が同じ結果を受け取る
+    # given (前提条件):
+    group = SingleFlight("test")
+    func = Counter()
+
+    # when (操作):
+    results = await asyncio.gather(*[group.do("IL2RA", func) for _ in range(5)])
+
+    # then (期待する結果):
+    assert func.calls == 1
+    assert all(r is results[0] for r in results)
+    assert group.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_different_keys_and_sequential_calls():
+    # テスト項目: 正常系: 異なるキー、または完了後の呼び出しは別々に実行される
+    # given (前提条件):
+    group = SingleFlight("test")
+    func = Counter()
+
+    # when (操作):
+    await asyncio.gather(group.do("IL2RA", func), group.do("CD25", func))
+    await group.do("IL2RA", func)
+
+    # then (期待する結果):
+    assert func.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_exception():
+    # テスト項目: 異常系: 実行中の呼び出しの例外は全員に送出される
+    # given (前提条件):
+    group = SingleFlight("test")
+    func = Counter(error=ValueError("DICE is down"))
+
+    # when (操作):
+    results = await asyncio.gather(
+        *[group.do("IL2RA", func) for _ in range(3)], return_exceptions=True
+    )
+
+    # then (期待する結果):
+    assert func.calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancel():
+    # テスト項目: 正常系: 一部の待機者がキャンセルされても共有の呼び出しは続き、全員がキャンセルされると中止される
+    # given (前提条件):
+    group = SingleFlight("test")
+    func = Counter(delay=0.05)
+    first = asyncio.create_task(group.do("IL2RA", func))
+    second = asyncio.create_task(group.do("IL2RA", func))
+    await asyncio.sleep(0.01)
+
+    # when (操作):
+    first.cancel()
+    result = await second
+
+    # then (期待する結果):
+    assert result == {"calls": 1}
+    assert not func.cancelled
+
+    # when (操作): all waiters are cancelled
+    third = asyncio.create_task(group.do("CD25", func))
+    await asyncio.sleep(0.01)
+    third.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await third
+    await asyncio.sleep(0)
+
+    # then (期待する結果):
+    assert func.cancelled
+
+
+@pytest.mark.asyncio
+async def test_single_flight_call_after_cancel():
+    # テスト項目: 正常系: 全員がキャンセルされた直後の同じキーの呼び出しは、中止中の呼び出しに合流せず新たに実行される
+    # given (前提条件):
+    group = SingleFlight("test")
+    func = Counter(delay=0.01)
+    first = asyncio.create_task(group.do("IL2RA", func))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+
+    # when (操作):
+    result = await group.do("IL2RA", func)
+
+    # then (期待する結果):
+    assert result == {"calls": 2}
+    assert first.cancelled()